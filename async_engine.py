@@ -0,0 +1,259 @@
+import asyncio
+import collections
+from typing import Iterator
+import common_lib
+import outbound
+import chat_log
+from chat_log import Category
+
+try:
+    import resource # absent sous Windows
+except ImportError:
+    resource = None
+
+
+# Adapte un transport asyncio à l'interface "socket" utilisée par common_lib et le serveur :
+# les écritures sont mises dans le tampon du transport, vidé par la boucle sans jamais bloquer.
+# Ce tampon est la file d'envoi bornée de la connexion (voir outbound.OutboundState).
+class AsyncConnection:
+    def __init__(self, transport: asyncio.Transport, limits: outbound.OutboundLimits):
+        self.transport = transport
+        self.outbound = outbound.OutboundState(limits)
+        # la boucle appelle pause_writing()/resume_writing() du protocole en franchissant ces seuils
+        transport.set_write_buffer_limits(high=limits.high_watermark, low=limits.low_watermark)
+        self.writing_paused = False
+        # flux en cours (ex. messages manqués) et trames arrivées après lui, envoyées dans l'ordre
+        self.stream: Iterator[tuple[bytes, ...]] = None
+        self.pending: collections.deque = collections.deque()
+        self.pending_bytes = 0
+
+
+    def send(self, data: bytes) -> int:
+        return self.sendmsg((data,))
+
+
+    def sendall(self, data: bytes) -> None:
+        self.sendmsg((data,))
+
+
+    # écriture vectorisée d'une trame (en-tête, message) dans le tampon du transport
+    def sendmsg(self, buffers) -> int:
+        size = sum(len(buffer) for buffer in buffers)
+        if self.transport.is_closing():
+            raise ConnectionError("connexion fermée")
+
+        if not self.outbound.admit():
+            if self.outbound.should_evict():
+                self.abort(evicted=True)
+            return size
+
+        if self.stream is not None or self.pending:
+            self.pending.append((buffers, size))
+            self.pending_bytes += size
+            self.outbound.update(self.pending_bytes)
+        else:
+            self.transport.writelines(buffers)
+            self.outbound.update(self.transport.get_write_buffer_size())
+        return size
+
+
+    # envoie un flux de trames produit à la demande, au rythme où le client les lit
+    def send_stream(self, frames: Iterator[tuple[bytes, ...]]) -> None:
+        if self.stream is not None or self.pending:
+            self.pending.append((frames, None))
+        else:
+            self.stream = iter(frames)
+            self.pump()
+
+
+    # écrit la suite du flux puis les trames en attente, tant que le tampon du transport n'est pas plein
+    def pump(self) -> None:
+        while not self.writing_paused and not self.transport.is_closing():
+            if self.stream is not None:
+                frame = next(self.stream, None)
+                if frame is None:
+                    self.stream = None
+                    continue
+                self.transport.writelines(frame)
+            elif self.pending:
+                buffers, size = self.pending.popleft()
+                if size is None:
+                    self.stream = iter(buffers)
+                else:
+                    self.pending_bytes -= size
+                    self.transport.writelines(buffers)
+            else:
+                break
+
+        streaming = self.stream is not None or self.pending
+        self.outbound.update(self.pending_bytes if streaming else self.transport.get_write_buffer_size())
+
+
+    # abandonne les flux en cours (connexion perdue)
+    def drop_streams(self) -> None:
+        for frames in [self.stream] + [buffers for buffers, size in self.pending if size is None]:
+            close = getattr(frames, 'close', None)
+            if close:
+                close()
+        self.stream = None
+        self.pending.clear()
+        self.pending_bytes = 0
+
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+    def abort(self, evicted: bool = False) -> None:
+        if evicted and not self.transport.is_closing():
+            outbound.OutboundState.total_evicted += 1
+        self.transport.abort()
+
+
+    def getpeername(self):
+        return self.transport.get_extra_info('peername')
+
+
+
+# Un protocole par connexion : la boucle lit directement dans le tampon du FrameReader
+# (BufferedProtocol, équivalent de recv_into), qui découpe le flux en trames
+class ChatProtocol(asyncio.BufferedProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.connection: AsyncConnection = None
+        self.reader = common_lib.FrameReader(server.max_frame_size)
+        self.admitted = False
+        self.throttled = False # lecture suspendue (client au-delà de son débit)
+
+
+    def connection_made(self, transport: asyncio.Transport):
+        # trop de connexions : refus immédiat, sans créer de client
+        if not self.server.admit_connection():
+            transport.write(self.server.server_full_frame)
+            transport.abort()
+            return
+        self.admitted = True
+
+        self.connection = AsyncConnection(transport, self.server.outbound_limits)
+        chat_log.info(Category.conn, "Connected with %s", self.connection.getpeername())
+        self.server.on_client_connected(self.connection)
+
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        try:
+            return self.reader.get_buffer(sizehint)
+        except common_lib.FrameTooLarge as e:
+            # taille annoncée hors limite : on coupe avant d'allouer quoi que ce soit
+            chat_log.warning(Category.net, "Erreur lors de la reception d'un message : %s", e)
+            self.connection.abort()
+            return bytearray(4096) # la boucle exige un tampon, même pour ignorer la suite
+
+
+    def buffer_updated(self, nbytes: int):
+        self.reader.buffer_updated(nbytes)
+        self.handle_frames()
+
+
+    def handle_frames(self):
+        try:
+            for frame in self.reader.frames():
+                msg = common_lib.decode_full_message(frame)
+                common_lib.show_message(msg, "MESSAGE RECEIVED")
+                delay = self.server.charge(self.connection, len(frame), msg)
+                self.server.handle_message(msg, self.connection)
+                if delay > 0:
+                    # client trop rapide : on cesse de le lire, les trames déjà reçues attendent dans le lecteur
+                    self.throttle(delay)
+                    return
+        except Exception as e:
+            # même comportement que le moteur threadé : on coupe le client fautif
+            chat_log.error(Category.server, "Erreur lors du traitement d'un message : %s", e)
+            self.connection.abort()
+
+
+    def throttle(self, delay: float):
+        self.throttled = True
+        self.connection.transport.pause_reading()
+        asyncio.get_running_loop().call_later(delay, self.resume_reading)
+
+
+    def resume_reading(self):
+        if self.connection.transport.is_closing():
+            return
+        self.throttled = False
+        self.handle_frames()
+        if not self.throttled:
+            self.connection.transport.resume_reading()
+
+
+    # contre-pression : le tampon d'envoi a dépassé high_watermark / est redescendu sous low_watermark
+    def pause_writing(self):
+        self.connection.writing_paused = True
+        if self.connection.stream is None and not self.connection.pending:
+            self.connection.outbound.update(self.connection.transport.get_write_buffer_size())
+
+
+    def resume_writing(self):
+        self.connection.writing_paused = False
+        self.connection.pump()
+
+
+    def connection_lost(self, exc):
+        if not self.admitted:
+            return
+        self.connection.drop_streams()
+        self.server.on_connection_lost(self.connection)
+        self.server.connection_closed()
+
+
+
+# Moteur mono-thread : toutes les connexions sont servies par une seule boucle d'événements
+class AsyncServerEngine:
+    def __init__(self, server):
+        self.server = server
+        self.loop: asyncio.AbstractEventLoop = None
+        self.stopping: asyncio.Event = None
+
+
+    def run(self):
+        raise_open_files_limit()
+        asyncio.run(self.serve())
+
+
+    # peut être appelée depuis n'importe quel thread
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        listener = await loop.create_server(
+            lambda: ChatProtocol(self.server),
+            self.server.host, self.server.port,
+            backlog=self.server.backlog,
+            reuse_address=True
+        )
+        self.stopping = asyncio.Event()
+        self.loop = loop
+
+        # port réel (utile avec port=0 : port éphémère choisi par le système)
+        self.server.on_ready(listener.sockets[0].getsockname()[:2])
+
+        async with listener:
+            await self.stopping.wait()
+            self.server.close_connections()
+        self.loop = None
+
+
+# Chaque connexion consomme un descripteur de fichier : on monte la limite souple au maximum autorisé
+def raise_open_files_limit():
+    if resource is None:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
@@ -0,0 +1,83 @@
+# Coût d'un broadcast selon la taille du groupe :
+#   - avant : un common_lib.send_message par membre (formatage + json + encode + affichage debug à chaque fois)
+#   - après : la trame est encodée une fois (common_lib.encode_frame) puis écrite sur chaque socket
+#
+# Usage : python3 benchmarks/bench_broadcast.py [--sizes 1 10 100 1000] [--rounds 20]
+import argparse
+import contextlib
+import io
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import common_lib
+from common_lib import EntryForFormatedMessage
+
+
+ENTRIES = {EntryForFormatedMessage.content: "x" * 200}
+
+
+def make_group(size: int) -> list[tuple[socket.socket, socket.socket]]:
+    pairs = []
+    for _ in range(size):
+        sender_side, receiver_side = socket.socketpair()
+        receiver_side.setblocking(False)
+        pairs.append((sender_side, receiver_side))
+    return pairs
+
+
+# vide les sockets de réception pour ne jamais bloquer l'envoi
+def drain(pairs):
+    for _, receiver_side in pairs:
+        try:
+            while receiver_side.recv(1 << 16):
+                pass
+        except BlockingIOError:
+            pass
+
+
+def broadcast_before(pairs):
+    for sender_side, _ in pairs:
+        common_lib.send_message(sender_side, "alice", "group", ENTRIES)
+
+
+def broadcast_after(pairs):
+    frame = common_lib.encode_frame("alice", "group", ENTRIES)
+    for sender_side, _ in pairs:
+        common_lib.send_frame(sender_side, frame)
+
+
+def measure(broadcast, pairs, rounds: int) -> float:
+    elapsed = 0.0
+    # l'affichage debug fait partie du coût mesuré, mais on ne le garde pas à l'écran
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            start = time.perf_counter()
+            broadcast(pairs)
+            elapsed += time.perf_counter() - start
+            drain(pairs)
+    return elapsed / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'membres':>8} | {'avant (ms)':>11} | {'après (ms)':>11} | {'gain':>6}")
+    for size in args.sizes:
+        pairs = make_group(size)
+        before = measure(broadcast_before, pairs, args.rounds)
+        after = measure(broadcast_after, pairs, args.rounds)
+        print(f"{size:>8} | {before * 1000:>11.3f} | {after * 1000:>11.3f} | {before / after:>5.1f}x")
+
+        for sender_side, receiver_side in pairs:
+            sender_side.close()
+            receiver_side.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Taille et débit d'encodage/décodage des trames, JSON (format historique) contre binaire (bin1).
+# Les messages testés reprennent les trames les plus fréquentes du protocole.
+#
+# Usage : python3 benchmarks/bench_codec.py [--count 50000]
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import common_lib
+from common_lib import EntryForFormatedMessage, ServerAction, ClientAction
+
+
+CIPHERTEXT = os.urandom(24 + 16 + 120) # nonce + MAC + message de 120 octets
+RSA_MODULUS = os.urandom(256).hex()    # clé publique 2048 bits en hexadécimal
+
+
+def messages(protocol: str) -> dict[str, dict]:
+    # en JSON le chiffré circule en base64, en binaire en octets bruts
+    content = CIPHERTEXT if protocol == common_lib.PROTOCOL_BINARY else base64.b64encode(CIPHERTEXT).decode()
+    return {
+        "chat": {
+            EntryForFormatedMessage.sender: "alice",
+            EntryForFormatedMessage.target: "L3B",
+            EntryForFormatedMessage.content: content,
+        },
+        "requestKey": {
+            EntryForFormatedMessage.sender: "server",
+            EntryForFormatedMessage.target: "",
+            EntryForFormatedMessage.action: ServerAction.requestKey,
+            EntryForFormatedMessage.groupName: "L3B",
+            EntryForFormatedMessage.keyRequester: ("bob", ("10001", RSA_MODULUS)),
+        },
+        "shareGroupKey": {
+            EntryForFormatedMessage.sender: "alice",
+            EntryForFormatedMessage.target: "server",
+            EntryForFormatedMessage.action: ClientAction.shareGroupKey,
+            EntryForFormatedMessage.groupName: "L3B",
+            EntryForFormatedMessage.groupKey: ("bob", RSA_MODULUS),
+        },
+        "shareGroups(100)": {
+            EntryForFormatedMessage.sender: "server",
+            EntryForFormatedMessage.target: "",
+            EntryForFormatedMessage.action: ServerAction.shareGroups,
+            EntryForFormatedMessage.groupsList: [f"groupe-{i}" for i in range(100)],
+        },
+    }
+
+
+def measure(msg: dict, protocol: str, count: int) -> tuple[int, float, float]:
+    encoded = common_lib.encode_full_message(msg, protocol)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        common_lib.encode_full_message(msg, protocol)
+    encode_rate = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        decoded = common_lib.decode_full_message(encoded)
+    decode_rate = count / (time.perf_counter() - start)
+
+    # le client JSON doit encore décoder le base64 et la repr de la liste des groupes
+    if protocol == common_lib.PROTOCOL_JSON:
+        start = time.perf_counter()
+        for _ in range(count):
+            decoded = common_lib.decode_full_message(encoded)
+            if EntryForFormatedMessage.content in decoded:
+                base64.b64decode(decoded[EntryForFormatedMessage.content])
+            if EntryForFormatedMessage.groupsList in decoded:
+                common_lib.parse_groups_list(decoded[EntryForFormatedMessage.groupsList])
+        decode_rate = count / (time.perf_counter() - start)
+
+    return len(encoded), encode_rate, decode_rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'trame':>17} | {'format':>6} | {'octets':>6} | {'encodage/s':>11} | {'décodage/s':>11}")
+    for protocol in (common_lib.PROTOCOL_JSON, common_lib.PROTOCOL_BINARY):
+        for name, msg in messages(protocol).items():
+            # la liste des groupes est très coûteuse à relire en JSON : moins d'itérations
+            count = args.count // 20 if name.startswith("shareGroups") else args.count
+            size, encode_rate, decode_rate = measure(msg, protocol, count)
+            print(f"{name:>17} | {protocol:>6} | {size:>6} | {encode_rate:>11,.0f} | {decode_rate:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
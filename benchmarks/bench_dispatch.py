@@ -0,0 +1,55 @@
+# Coût de l'aiguillage des messages reçus par le serveur (handle_message) :
+#   - direct : appel de la méthode de l'action, sans table ni mesure (plancher)
+#   - table + mesure : recherche dans server_socket.handlers, chronométrage et histogramme par action
+#   - + profileur : la même chose pendant qu'un profil par échantillonnage tourne (toutes les 5 ms)
+# L'action mesurée (ackMessages d'un client inconnu) ne fait presque rien : l'écart est le surcoût fixe par message.
+#
+# Usage : python3 benchmarks/bench_dispatch.py [--messages 200000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import serveur
+from common_lib import ClientAction, EntryForFormatedMessage
+from offline_store import OfflineStore
+from sampling_profiler import SamplingProfiler
+
+
+def bench(call, message: dict, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        call(message)
+    return (time.perf_counter() - start) / count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    server = serveur.server_socket(port=0, offline_store=OfflineStore(os.path.join(directory, 'store')),
+                                   profiler=SamplingProfiler(os.path.join(directory, 'profiles')))
+    message = {
+        EntryForFormatedMessage.sender: "inconnu", EntryForFormatedMessage.target: "server",
+        EntryForFormatedMessage.action: ClientAction.ackMessages, EntryForFormatedMessage.lastSeqs: {}
+    }
+
+    direct = bench(server.on_ack_messages, message, args.messages)
+    dispatched = bench(server.handle_message, message, args.messages)
+    server.profiler.start(60)
+    profiled = bench(server.handle_message, message, args.messages)
+    server.offline_store.close()
+
+    print(f"{'':>16} | {'ns/message':>10}")
+    print(f"{'direct':>16} | {direct:>10.0f}")
+    print(f"{'table + mesure':>16} | {dispatched:>10.0f}")
+    print(f"{'+ profileur':>16} | {profiled:>10.0f}")
+    print(server.handler_metrics.summary())
+
+
+if __name__ == "__main__":
+    main()
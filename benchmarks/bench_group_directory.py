@@ -0,0 +1,71 @@
+# Création de G groupes avec C clients connectés : coût de la mise à jour de la liste des groupes.
+#   - avant : à chaque création, la liste complète (repr python dans le JSON) est encodée pour chaque client,
+#             puis relue par chacun avec ast.literal_eval : O(G²·C)
+#   - après : seul le changement (groupsChanged) est encodé une fois et lu par chaque client : O(G·C)
+# Les temps comptent l'encodage côté serveur et le décodage côté clients, sans réseau.
+#
+# Usage : python3 benchmarks/bench_group_directory.py [--groups 100 300] [--clients 100]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import common_lib
+from common_lib import ServerAction, EntryForFormatedMessage
+from group_directory import GroupDirectory
+
+
+def bench_full_list(groups: int, clients: int) -> tuple[float, int]:
+    names = []
+    sent = 0
+    start = time.perf_counter()
+    for i in range(groups):
+        names.append(f"groupe-{i}")
+        for _ in range(clients):
+            frame = common_lib.encode_frame("server", "", {
+                EntryForFormatedMessage.action: ServerAction.shareGroups,
+                EntryForFormatedMessage.groupsList: list(names)
+            })
+            sent += len(frame[1])
+            msg = common_lib.decode_full_message(frame[1])
+            common_lib.parse_groups_list(msg[EntryForFormatedMessage.groupsList])
+    return time.perf_counter() - start, sent
+
+
+def bench_delta(groups: int, clients: int, protocol: str) -> tuple[float, int]:
+    directory = GroupDirectory()
+    sent = 0
+    start = time.perf_counter()
+    for i in range(groups):
+        version = directory.add(f"groupe-{i}")
+        frame = common_lib.encode_frame("server", "", {
+            EntryForFormatedMessage.action: ServerAction.groupsChanged,
+            EntryForFormatedMessage.groupsVersion: version,
+            EntryForFormatedMessage.groupsAdded: [f"groupe-{i}"],
+            EntryForFormatedMessage.groupsRemoved: []
+        }, protocol)
+        for _ in range(clients):
+            sent += len(frame[1])
+            common_lib.decode_full_message(frame[1])
+    return time.perf_counter() - start, sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--clients", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients connectés")
+    print(f"{'groupes':>8} | {'liste complète':>20} | {'changements json':>20} | {'changements bin1':>20}")
+    for groups in args.groups:
+        results = [bench_full_list(groups, args.clients),
+                   bench_delta(groups, args.clients, common_lib.PROTOCOL_JSON),
+                   bench_delta(groups, args.clients, common_lib.PROTOCOL_BINARY)]
+        cells = [f"{seconds * 1000:>8.1f} ms {sent / 1e6:>6.1f} Mo" for seconds, sent in results]
+        print(f"{groups:>8} | " + " | ".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
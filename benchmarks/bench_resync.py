@@ -0,0 +1,73 @@
+# Reprise après reconnexion : coût pour rattraper les `gap` derniers messages d'un groupe,
+# selon la taille du journal déjà sur disque.
+#   - écart : le client annonce sa dernière séquence (lastSeqs), seul l'écart est relu
+#   - tout : sans séquence, il faudrait renvoyer tout le journal pour être sûr de ne rien perdre
+# Mesure aussi le coût ajouté à chaque broadcast par l'écriture dans le journal.
+#
+# Usage : python3 benchmarks/bench_resync.py [--history 10000 100000] [--gap 100] [--clients 1000]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import common_lib
+from common_lib import EntryForFormatedMessage
+from offline_store import OfflineStore
+
+
+GROUP = "g"
+
+
+def frame(seq: int) -> bytes:
+    return common_lib.encode_full_message({
+        EntryForFormatedMessage.sender: "alice", EntryForFormatedMessage.target: GROUP,
+        EntryForFormatedMessage.content: os.urandom(120), EntryForFormatedMessage.seq: seq
+    }, common_lib.PROTOCOL_BINARY)
+
+
+def replay(store: OfflineStore, from_seq: int) -> int:
+    count = 0
+    for page in store.open_reader(GROUP, from_seq).pages():
+        count += len(page)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--gap", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=1000, help="clients qui se reconnectent ensemble")
+    args = parser.parse_args()
+
+    print(f"{args.clients} reconnexions, {args.gap} messages manqués chacune")
+    print(f"{'journal':>8} | {'append µs/msg':>13} | {'écart ms':>9} | {'tout ms/client':>14}")
+    for history in args.history:
+        directory = tempfile.mkdtemp()
+        try:
+            store = OfflineStore(directory)
+            payload = frame(1)
+            start = time.perf_counter()
+            for _ in range(history):
+                store.append(GROUP, payload)
+            append = (time.perf_counter() - start) / history * 1e6
+
+            last = store.last_seq(GROUP)
+            start = time.perf_counter()
+            for _ in range(args.clients):
+                replay(store, last - args.gap + 1)
+            gap = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            replay(store, 1)
+            full = (time.perf_counter() - start) * 1000
+            store.close()
+        finally:
+            shutil.rmtree(directory)
+        print(f"{history:>8} | {append:>13.2f} | {gap:>9.1f} | {full:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
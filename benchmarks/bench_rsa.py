@@ -0,0 +1,49 @@
+# Opérations avec la clé privée RSA : exponentiation complète pow(c, d, n) contre CRT (rsa_exp_crt),
+# pour le déchiffrement d'une clé de groupe et pour la signature.
+#
+# Usage : python3 benchmarks/bench_rsa.py [--bits 1024 2048 4096] [--count 50]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rsa
+
+
+def rate(function, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bits", type=int, nargs="+", default=[1024, 2048, 4096])
+    parser.add_argument("--count", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'bits':>5} | {'opération':>12} | {'pow(c,d,n)/s':>12} | {'CRT/s':>9} | {'gain':>5}")
+    for bits in args.bits:
+        (e, n), private_key = rsa.gen_rsa_keypair(bits)
+        group_key = os.urandom(32)
+        cipher = rsa.rsa_enc(group_key, e, n)
+        message = b"x" * 200
+
+        assert rsa.rsa_dec(cipher, private_key.d, n) == rsa.rsa_dec_crt(cipher, private_key) == group_key
+        assert rsa.rsa_verify(message, rsa.rsa_sign(message, private_key), e, n)
+
+        count = max(1, args.count * 1024 // bits)
+        plain = rate(lambda: rsa.rsa_dec(cipher, private_key.d, n), count)
+        crt = rate(lambda: rsa.rsa_dec_crt(cipher, private_key), count)
+        print(f"{bits:>5} | {'déchiffrement':>12} | {plain:>12,.0f} | {crt:>9,.0f} | {crt / plain:>4.1f}x")
+
+        digest = int.from_bytes(os.urandom(32), 'big')
+        plain = rate(lambda: rsa.rsa_exp(digest, private_key.d, n), count)
+        crt = rate(lambda: rsa.rsa_sign(message, private_key), count)
+        print(f"{bits:>5} | {'signature':>12} | {plain:>12,.0f} | {crt:>9,.0f} | {crt / plain:>4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Chiffrement symétrique des messages (secret_box), en messages par seconde sur un cœur, par taille de message :
+# - base64  : chemin historique en JSON (texte -> SecretBox.encrypt -> base64), et l'inverse
+# - raw     : octets bruts du format bin1 (encrypt_raw / decrypt_raw)
+# - into    : chiffrement dans un tampon préalloué réutilisé (encrypt_into), déchiffrement decrypt_bytes
+# - many    : lots de --batch messages (encrypt_many / decrypt_many)
+#
+# Usage : python3 benchmarks/bench_secret_box.py [--sizes 16 128 1024 16384] [--count 20000] [--batch 64]
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import secret_box
+
+
+def rate(function, count: int, per_call: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(count // per_call):
+        function()
+    return (count // per_call) * per_call / (time.perf_counter() - start)
+
+
+# l'ancien chemin, avant l'accès direct à libsodium : copies du nonce et du chiffré, base64
+def legacy_encrypt(box, msg: str) -> str:
+    return base64.b64encode(bytes(box.encrypt(msg.encode()))).decode('utf-8')
+
+
+def legacy_decrypt(box, enc_msg: str) -> str:
+    data = base64.b64decode(enc_msg)
+    return box.decrypt(data[box.NONCE_SIZE:], data[:box.NONCE_SIZE]).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 128, 1024, 16384])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    box, _ = secret_box.secret_box_gen()
+    print(f"{'taille':>6} | {'':>10} | {'base64/s':>10} | {'raw/s':>10} | {'into/s':>10} | {'many/s':>10} | {'gain':>5}")
+    for size in args.sizes:
+        text = "x" * size
+        data = text.encode()
+        count = max(args.batch, args.count * 128 // max(size, 128))
+        buffer = bytearray(size + secret_box.OVERHEAD)
+        batch = [data] * args.batch
+
+        old = rate(lambda: legacy_encrypt(box, text), count)
+        raw = rate(lambda: secret_box.encrypt_raw(box, text), count)
+        into = rate(lambda: secret_box.encrypt_into(box, data, buffer), count)
+        many = rate(lambda: secret_box.encrypt_many(box, batch), count, args.batch)
+        print(f"{size:>6} | {'chiffrer':>10} | {old:>10,.0f} | {raw:>10,.0f} | {into:>10,.0f} | {many:>10,.0f} | {max(into, many) / old:>4.1f}x")
+
+        encoded = legacy_encrypt(box, text)
+        cipher = secret_box.encrypt_bytes(box, data)
+        ciphers = [cipher] * args.batch
+        assert legacy_decrypt(box, encoded) == secret_box.decrypt(box, encoded) == secret_box.decrypt_raw(box, cipher) == text
+
+        old = rate(lambda: legacy_decrypt(box, encoded), count)
+        raw = rate(lambda: secret_box.decrypt_raw(box, cipher), count)
+        into = rate(lambda: secret_box.decrypt_bytes(box, cipher), count)
+        many = rate(lambda: secret_box.decrypt_many(box, ciphers), count, args.batch)
+        print(f"{size:>6} | {'déchiffrer':>10} | {old:>10,.0f} | {raw:>10,.0f} | {into:>10,.0f} | {many:>10,.0f} | {max(into, many) / old:>4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
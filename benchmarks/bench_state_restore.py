@@ -0,0 +1,83 @@
+# Redémarrage à chaud : coût de l'instantané de l'état du serveur (comptes, groupes, messages manqués)
+# et de sa relecture, pour N comptes avec des clés RSA de 2048 bits (512 caractères hexadécimaux).
+#   - capture : pause du serveur pendant la copie des colonnes (le reste se fait dans un thread)
+#   - écriture : encodage + écriture du fichier, en arrière-plan
+#   - journal : coût ajouté à chaque modification (un write() par enregistrement)
+#   - relecture : instantané puis journal, jusqu'aux objets Client / Group prêts à l'emploi
+#
+# Usage : python3 benchmarks/bench_state_restore.py [--clients 10000 100000] [--group-size 20] [--wal 10000]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import server_state
+from server_state import ServerState
+from registry import Group, ClientRegistry
+
+
+def populate(count: int, group_size: int) -> tuple[ClientRegistry, dict[str, Group]]:
+    clients = ClientRegistry()
+    accounts = [server_state.offline_client(f"user-{i}", ('10001', os.urandom(256).hex())) for i in range(count)]
+    for client in accounts:
+        clients.add(client)
+    groups = {}
+    for start in range(0, count, group_size):
+        name = f"groupe-{start // group_size}"
+        group = groups[name] = Group(name)
+        for client in accounts[start:start + group_size]:
+            group.add(client)
+            client.acked[name] = 1000
+    for client in accounts[::10]:
+        client.missed_since[next(iter(client.groups))] = 1001
+    return clients, groups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--group-size", type=int, default=20)
+    parser.add_argument("--wal", type=int, default=10000, help="modifications journalisées après l'instantané")
+    args = parser.parse_args()
+
+    print(f"{'comptes':>8} | {'capture ms':>10} | {'écriture ms':>11} | {'taille Mo':>9} | {'journal µs':>10} | {'relecture ms':>12}")
+    for count in args.clients:
+        directory = tempfile.mkdtemp()
+        try:
+            clients, groups = populate(count, args.group_size)
+            state = ServerState(directory)
+            state.restore(ClientRegistry(), {})
+
+            start = time.perf_counter()
+            columns = server_state.capture(clients, groups)
+            capture = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            state.write_snapshot(columns, 1, len(groups))
+            write = (time.perf_counter() - start) * 1000
+            size = os.path.getsize(state.snapshot_path)
+
+            state.generation = 1
+            state.wal.close()
+            state.open_wal()
+            start = time.perf_counter()
+            for i in range(args.wal):
+                state.log(server_state.OP_MEMBER_TO_END, f"groupe-{i % len(groups)}", f"user-{i % count}")
+            wal = (time.perf_counter() - start) / args.wal * 1e6
+            state.close()
+
+            restored = ClientRegistry()
+            start = time.perf_counter()
+            ServerState(directory).restore(restored, {})
+            restore = (time.perf_counter() - start) * 1000
+            assert len(restored) == count
+        finally:
+            shutil.rmtree(directory)
+        print(f"{count:>8} | {capture:>10.1f} | {write:>11.1f} | {size / 1e6:>9.1f} | {wal:>10.2f} | {restore:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Détection des connexions silencieuses : coût d'un tick avec une échéance par connexion dans la roue
+# (timer_wheel.TimerWheel), contre le parcours de toutes les connexions à chaque tick.
+# Les clients parlent régulièrement : à son échéance, une connexion en reprend simplement une nouvelle
+# (comme server_socket.check_alive). La roue ne touche que les connexions dont l'échéance tombe,
+# le parcours les regarde toutes.
+#
+# Usage : python3 benchmarks/bench_timer_wheel.py [--connections 1000 10000 100000] [--ticks 200]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timer_wheel import TimerWheel
+
+
+TICK = 0.25    # secondes entre deux ticks
+INTERVAL = 15  # secondes de silence avant un ping
+
+
+class Connection:
+    def __init__(self, last_seen: float):
+        self.connected = True
+        self.last_seen = last_seen
+
+
+def bench_wheel(connections: list[Connection], ticks: int) -> float:
+    wheel = TimerWheel(tick=TICK)
+    wheel.origin = 0.0
+    clock = [0.0]
+
+    def check(connection: Connection):
+        now = clock[0]
+        connection.last_seen = now - 1.0 # le client a parlé il y a peu
+        wheel.schedule(INTERVAL - (now - connection.last_seen), check, connection)
+
+    for connection in connections:
+        wheel.schedule(INTERVAL + connection.last_seen, check, connection)
+
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        clock[0] = tick * TICK
+        wheel.advance(clock[0])
+    return (time.perf_counter() - start) / ticks
+
+
+def bench_scan(connections: list[Connection], ticks: int) -> float:
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        now = tick * TICK
+        for connection in connections:
+            if connection.connected and now - connection.last_seen >= INTERVAL:
+                connection.last_seen = now - 1.0
+    return (time.perf_counter() - start) / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"tick {TICK} s, ping après {INTERVAL} s de silence")
+    print(f"{'connexions':>10} | {'roue ms/tick':>12} | {'parcours ms/tick':>16}")
+    for count in args.connections:
+        wheel = bench_wheel([Connection(random.uniform(-INTERVAL, 0)) for _ in range(count)], args.ticks) * 1000
+        scan = bench_scan([Connection(random.uniform(-INTERVAL, 0)) for _ in range(count)], args.ticks) * 1000
+        print(f"{count:>10} | {wheel:>12.3f} | {scan:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
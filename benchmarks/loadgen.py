@@ -0,0 +1,395 @@
+# Générateur de charge sans interface : N clients répartis dans M groupes parlent au vrai serveur
+# avec le vrai protocole (requestConnection, requestAddGroup, requestJoinGroup -> requestKey/shareGroupKey,
+# messages chiffrés avec secret_box). Chaque message transporte son instant d'envoi dans le texte chiffré,
+# chaque membre qui le reçoit mesure la latence de bout en bout.
+#
+# Mesures : débit (envois et livraisons par seconde), latence de livraison p50/p99/p999,
+# latence d'entrée dans un groupe (échange de clé), RSS du serveur (lu dans /proc, Linux).
+#
+# Usage :
+#   python3 benchmarks/loadgen.py --clients 200 --groups 20 --rate 2 --size 200 --duration 10
+#   python3 benchmarks/loadgen.py --engine threaded --protocol json
+#   python3 benchmarks/loadgen.py --external --port 5555 --server-pid 1234  # serveur déjà lancé
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import common_lib
+import rsa
+import secret_box
+from async_engine import raise_open_files_limit
+from common_lib import EntryForFormatedMessage, ServerAction, ClientAction
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'serveur.py')
+
+
+# Un client simulé : une connexion asyncio, une tâche de lecture qui traite les messages du serveur
+class Bot:
+    def __init__(self, run: 'LoadRun', index: int, nickname: str, keypair):
+        self.run = run
+        self.index = index
+        self.nickname = nickname
+        self.keypair = keypair
+        self.protocol = common_lib.PROTOCOL_JSON
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+        self.boxes: dict = {}   # groupe -> (secret_box, clé)
+        self.group: str = None
+        self.waiters: dict[str, asyncio.Future] = {}
+        self.task: asyncio.Task = None
+
+
+    def send(self, target: str, entries: dict) -> None:
+        header, body = common_lib.encode_frame(self.nickname, target, entries, self.protocol)
+        self.writer.write(header + body)
+
+
+    def expect(self, action: str) -> asyncio.Future:
+        future = self.waiters[action] = asyncio.get_running_loop().create_future()
+        return future
+
+
+    def resolve(self, action: str, value = None) -> None:
+        future = self.waiters.pop(action, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+
+    async def connect(self, host: str, port: int, protocol: str) -> None:
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        temp = await self.read()
+        temp_nickname = temp[EntryForFormatedMessage.nickname]
+
+        request = {
+            EntryForFormatedMessage.action: ClientAction.requestConnection,
+            EntryForFormatedMessage.nickname: self.nickname,
+            EntryForFormatedMessage.publicKey: rsa.int_rsa_key_to_hex(self.keypair[0]),
+        }
+        if protocol in temp.get(EntryForFormatedMessage.protocols, []):
+            request[EntryForFormatedMessage.protocol] = protocol
+
+        header, body = common_lib.encode_frame(temp_nickname, 'server', request)
+        self.writer.write(header + body)
+        accept = await self.read()
+        if accept[EntryForFormatedMessage.action] != ServerAction.acceptConnection:
+            raise ConnectionError(f"{self.nickname} refusé : {accept}")
+        self.protocol = accept.get(EntryForFormatedMessage.protocol, common_lib.PROTOCOL_JSON)
+        self.task = asyncio.create_task(self.listen())
+
+
+    async def read(self) -> dict:
+        header = await self.reader.readexactly(4)
+        body = await self.reader.readexactly(int.from_bytes(header, 'big'))
+        return common_lib.decode_full_message(body)
+
+
+    async def listen(self) -> None:
+        try:
+            while True:
+                self.dispatch(await self.read())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+
+    def dispatch(self, message: dict) -> None:
+        sender = message[EntryForFormatedMessage.sender]
+        if sender != 'server':
+            self.on_content(sender, message)
+            return
+
+        action = message[EntryForFormatedMessage.action]
+        match action:
+            case ServerAction.joinGroup:
+                group_name = message[EntryForFormatedMessage.groupName]
+                cipher_group_key = message.get(EntryForFormatedMessage.groupKey)
+                if cipher_group_key:
+                    private_key = self.keypair[1]
+                    group_key = rsa.rsa_dec_crt(cipher_group_key, private_key)
+                    self.boxes[group_name] = (secret_box.secret_box_gen_by_key(group_key), group_key)
+                else:
+                    self.boxes[group_name] = secret_box.secret_box_gen()
+                self.group = group_name
+                self.resolve(ServerAction.joinGroup)
+
+            case ServerAction.requestKey:
+                # ce client est membre du groupe : il chiffre la clé pour chaque demandeur du lot
+                group_name = message[EntryForFormatedMessage.groupName]
+                group_key = self.boxes[group_name][1]
+                group_keys = []
+                for request_id, nickname, public_key in message[EntryForFormatedMessage.keyRequesters]:
+                    int_public_key = rsa.hex_rsa_key_to_int(public_key)
+                    group_keys.append((request_id, rsa.rsa_enc(group_key, *int_public_key)))
+                self.send('server', {
+                    EntryForFormatedMessage.action: ClientAction.shareGroupKey,
+                    EntryForFormatedMessage.groupName: group_name,
+                    EntryForFormatedMessage.groupKeys: group_keys,
+                })
+                self.run.key_requests += 1
+
+            case ServerAction.error:
+                self.run.errors += 1
+                self.resolve(ServerAction.joinGroup, message)
+
+
+    def on_content(self, sender: str, message: dict) -> None:
+        target = message[EntryForFormatedMessage.target]
+        content = message[EntryForFormatedMessage.content]
+        box = self.boxes[target][0]
+        if isinstance(content, bytes):
+            plain = secret_box.decrypt_raw(box, content)
+        else:
+            plain = secret_box.decrypt(box, content)
+
+        sent_at = float(plain.split(' ', 1)[0])
+        if sender == self.nickname:
+            self.run.echoes += 1
+        else:
+            self.run.latencies.append(time.perf_counter() - sent_at)
+
+
+    async def join(self, create: bool) -> float:
+        joined = self.expect(ServerAction.joinGroup)
+        start = time.perf_counter()
+        action = ClientAction.requestAddGroup if create else ClientAction.requestJoinGroup
+        self.send('server', {
+            EntryForFormatedMessage.action: action,
+            EntryForFormatedMessage.groupName: self.run.group_name(self),
+        })
+        error = await joined
+        if error is not None:
+            raise RuntimeError(f"{self.nickname} n'a pas pu rejoindre le groupe : {error}")
+        return time.perf_counter() - start
+
+
+    # envoie `rate` messages par seconde pendant `duration` secondes, à intervalles réguliers
+    async def talk(self, rate: float, size: int, duration: float) -> None:
+        box = self.boxes[self.group][0]
+        interval = 1 / rate
+        padding = 'x' * size
+        start = time.perf_counter()
+        next_send = start + random.random() * interval
+        while next_send < start + duration:
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+            plain = f"{time.perf_counter():.9f} {padding}"
+            if self.protocol == common_lib.PROTOCOL_BINARY:
+                content = secret_box.encrypt_raw(box, plain)
+            else:
+                content = secret_box.encrypt(box, plain)
+            self.send(self.group, {EntryForFormatedMessage.content: content})
+            self.run.sent += 1
+            self.run.expected += self.run.group_sizes[self.group] - 1
+            next_send += interval
+            await self.writer.drain()
+
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.prefix = args.prefix or f"lg{os.getpid()}-"
+        self.bots: list[Bot] = []
+        self.group_sizes: dict[str, int] = {}
+        self.latencies: list[float] = []
+        self.join_latencies: list[float] = []
+        self.create_latencies: list[float] = []
+        self.sent = 0
+        self.expected = 0
+        self.echoes = 0
+        self.errors = 0
+        self.key_requests = 0
+
+
+    def group_name(self, bot: Bot) -> str:
+        return f"{self.prefix}g{bot.index % self.args.groups}"
+
+
+    async def connect_all(self, keypairs) -> None:
+        args = self.args
+        limit = asyncio.Semaphore(args.connect_concurrency)
+
+        async def connect(i: int):
+            async with limit:
+                bot = self.bots[i]
+                await bot.connect(args.host, args.port, args.protocol)
+
+        self.bots = [Bot(self, i, f"{self.prefix}{i}", keypairs[i % len(keypairs)]) for i in range(args.clients)]
+        await asyncio.gather(*(connect(i) for i in range(args.clients)))
+
+
+    async def join_all(self) -> None:
+        args = self.args
+        creators = self.bots[:args.groups]
+        joiners = self.bots[args.groups:]
+        for bot in self.bots:
+            group = self.group_name(bot)
+            self.group_sizes[group] = self.group_sizes.get(group, 0) + 1
+
+        # d'abord les créateurs (ils deviennent admin), puis les autres passent par l'échange de clé
+        self.create_latencies = await asyncio.gather(*(bot.join(create=True) for bot in creators))
+
+        limit = asyncio.Semaphore(args.join_concurrency)
+        async def join(bot: Bot):
+            async with limit:
+                return await bot.join(create=False)
+        self.join_latencies = await asyncio.gather(*(join(bot) for bot in joiners))
+
+
+    async def talk_all(self) -> float:
+        args = self.args
+        start = time.perf_counter()
+        await asyncio.gather(*(bot.talk(args.rate, args.size, args.duration) for bot in self.bots))
+
+        # laisse arriver les derniers messages
+        deadline = time.perf_counter() + args.drain
+        while len(self.latencies) < self.expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        return time.perf_counter() - start
+
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def latency_line(name: str, values: list[float]) -> str:
+    ms = [value * 1000 for value in values]
+    return (f"{name:<18} n={len(ms):<8} p50={percentile(ms, 50):8.2f} ms  p99={percentile(ms, 99):8.2f} ms"
+            f"  p999={percentile(ms, 99.9):8.2f} ms  max={max(ms, default=float('nan')):8.2f} ms")
+
+
+# mémoire résidente d'un processus (Linux) : (actuelle, maximale) en Mo
+def server_rss(pid: int) -> tuple[float, float]:
+    if not pid:
+        return (float('nan'), float('nan'))
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return (values.get('VmRSS', float('nan')), values.get('VmHWM', float('nan')))
+
+
+def start_server(args) -> subprocess.Popen:
+    command = [sys.executable, SERVER_SCRIPT, '--host', args.host, '--port', str(args.port),
+               '--engine', args.engine, '--store-dir', args.store_dir]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+                              env={**os.environ, 'CHAT_LOG': '*=warning'})
+
+    # attend que le serveur accepte les connexions
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage.")
+        try:
+            socket.create_connection((args.host, args.port), timeout=0.2).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Le serveur ne répond pas.")
+
+
+async def run(args, server_pid: int) -> None:
+    load = LoadRun(args)
+
+    # la génération RSA est lente en Python : un petit lot de paires de clés est partagé entre les clients
+    start = time.perf_counter()
+    keypairs = [rsa.gen_rsa_keypair(args.rsa_bits) for _ in range(min(args.clients, args.key_pool))]
+    print(f"{len(keypairs)} paires de clés RSA {args.rsa_bits} bits en {time.perf_counter() - start:.2f} s")
+    print(f"RSS serveur au repos      : {server_rss(server_pid)[0]:8.1f} Mo")
+
+    start = time.perf_counter()
+    await load.connect_all(keypairs)
+    print(f"{args.clients} connexions en {time.perf_counter() - start:.2f} s"
+          f" (format {load.bots[0].protocol}) | RSS serveur : {server_rss(server_pid)[0]:.1f} Mo")
+
+    start = time.perf_counter()
+    await load.join_all()
+    print(f"{args.groups} groupes, {len(load.join_latencies)} entrées par échange de clé ({load.key_requests} requestKey)"
+          f" en {time.perf_counter() - start:.2f} s"
+          f" | RSS serveur : {server_rss(server_pid)[0]:.1f} Mo")
+
+    elapsed = await load.talk_all()
+    rss, peak = server_rss(server_pid)
+
+    delivered = len(load.latencies)
+    print()
+    print(f"messages envoyés   : {load.sent} ({load.sent / elapsed:,.0f}/s), {args.size} octets de texte")
+    print(f"livraisons         : {delivered}/{load.expected} ({delivered / elapsed:,.0f}/s),"
+          f" {load.expected - delivered} manquantes, {load.errors} erreurs")
+    print(latency_line("livraison", load.latencies))
+    print(latency_line("création de groupe", load.create_latencies))
+    print(latency_line("entrée (clé)", load.join_latencies))
+    print(f"RSS serveur        : {rss:.1f} Mo (max {peak:.1f} Mo)")
+
+    await asyncio.gather(*(bot.close() for bot in load.bots))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charge de bout en bout contre serveur.py")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1.0, help="messages par seconde et par client")
+    parser.add_argument("--size", type=int, default=200, help="taille du texte de chaque message (octets)")
+    parser.add_argument("--duration", type=float, default=10.0, help="durée de la phase d'envoi (secondes)")
+    parser.add_argument("--drain", type=float, default=5.0, help="attente maximale des derniers messages (secondes)")
+    parser.add_argument("--protocol", choices=common_lib.SUPPORTED_PROTOCOLS, default=common_lib.PROTOCOL_BINARY)
+    parser.add_argument("--host", default=common_lib.HOST)
+    parser.add_argument("--port", type=int, default=5600)
+    parser.add_argument("--engine", default="asyncio", help="moteur du serveur lancé par le script")
+    parser.add_argument("--store-dir", default=None, help="dossier des messages hors ligne du serveur lancé (temporaire par défaut)")
+    parser.add_argument("--external", action="store_true", help="utiliser un serveur déjà lancé")
+    parser.add_argument("--server-pid", type=int, default=0, help="pid du serveur externe, pour lire sa mémoire")
+    parser.add_argument("--prefix", default=None, help="préfixe des pseudos et des groupes")
+    parser.add_argument("--rsa-bits", type=int, default=512)
+    parser.add_argument("--key-pool", type=int, default=8, help="nombre de paires de clés RSA partagées")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--join-concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.groups > args.clients:
+        parser.error("--groups ne peut pas dépasser --clients")
+
+    raise_open_files_limit()
+
+    server = None
+    server_pid = args.server_pid
+    if not args.external:
+        store_dir = tempfile.TemporaryDirectory(prefix='loadgen-store-')
+        args.store_dir = args.store_dir or store_dir.name
+        server = start_server(args)
+        server_pid = server.pid
+    try:
+        asyncio.run(run(args, server_pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
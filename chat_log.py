@@ -0,0 +1,153 @@
+import atexit
+import collections
+import os
+import sys
+import threading
+import time
+
+
+# Journalisation par niveaux et par catégories, écrite par un thread de fond.
+# Un appel dont le niveau est désactivé ne formate rien : le message n'est formaté
+# (fmt % args) que par le thread d'écriture, et seulement s'il a été retenu.
+#
+# Configuration : variable d'environnement CHAT_LOG, ou option --log du serveur, par exemple
+#   CHAT_LOG="net=debug/100,clients=debug,*=warning"
+# -> trames affichées 1 fois sur 100, liste des clients affichée, le reste à partir de warning.
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+LEVEL_NAMES = {level: name.upper() for name, level in LEVELS.items()}
+
+
+class Category:
+    net = "net"           # trames envoyées et reçues
+    conn = "conn"         # connexions / déconnexions
+    clients = "clients"   # état des clients du serveur
+    groups = "groups"     # groupes, partage des clés
+    server = "server"
+    client = "client"     # côté application cliente
+
+
+class Logger:
+    def __init__(self, stream = None, capacity: int = 8192, level: int = INFO):
+        self.stream = stream
+        self.default_level = level
+        self.levels: dict[str, int] = {}    # niveau minimal par catégorie
+        self.sampling: dict[str, int] = {}  # catégorie -> on garde 1 message sur N
+        self.counters: dict[str, int] = {}
+        # tampon circulaire : s'il est plein, les plus anciens messages sont perdus (et comptés)
+        self.ring: collections.deque = collections.deque(maxlen=capacity)
+        self.dropped = 0
+        self.wakeup = threading.Event()
+        self.writer: threading.Thread = None
+        self.lock = threading.Lock()
+
+
+    def enabled(self, category: str, level: int) -> bool:
+        return level >= self.levels.get(category, self.default_level)
+
+
+    def log(self, category: str, level: int, fmt: str, *args) -> None:
+        if level < self.levels.get(category, self.default_level):
+            return
+
+        every = self.sampling.get(category)
+        if every:
+            count = self.counters[category] = self.counters.get(category, 0) + 1
+            if count % every:
+                return
+
+        if len(self.ring) == self.ring.maxlen:
+            self.dropped += 1
+        self.ring.append((time.time(), category, level, fmt, args))
+
+        if self.writer is None:
+            self.start_writer()
+        self.wakeup.set()
+
+
+    # "net=debug/100,clients=debug,*=warning"
+    def configure(self, spec: str) -> None:
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            category, _, setting = item.partition('=')
+            level_name, _, every = setting.partition('/')
+            level = LEVELS[level_name.strip().lower()]
+
+            if category == '*':
+                self.default_level = level
+            else:
+                self.levels[category] = level
+                if every:
+                    self.sampling[category] = int(every)
+
+
+    def start_writer(self) -> None:
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_loop, daemon=True)
+                self.writer.start()
+
+
+    def write_loop(self) -> None:
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            self.flush()
+
+
+    # formate et écrit tout ce qui est en attente, en une seule écriture
+    def flush(self) -> None:
+        lines = []
+        while self.ring:
+            try:
+                timestamp, category, level, fmt, args = self.ring.popleft()
+            except IndexError:
+                break
+            try:
+                text = fmt % args if args else fmt
+            except Exception as e:
+                text = f"{fmt!r} {args!r} (formatage impossible : {e})"
+            clock = time.strftime('%H:%M:%S', time.localtime(timestamp))
+            lines.append(f"{clock} {LEVEL_NAMES.get(level, level)} [{category}] {text}\n")
+
+        if self.dropped:
+            lines.append(f"... {self.dropped} messages perdus (tampon de journalisation plein)\n")
+            self.dropped = 0
+
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write(''.join(lines))
+            stream.flush()
+
+
+
+logger = Logger()
+logger.configure(os.environ.get('CHAT_LOG', ''))
+atexit.register(logger.flush)
+
+
+def enabled(category: str, level: int) -> bool:
+    return logger.enabled(category, level)
+
+
+def configure(spec: str) -> None:
+    logger.configure(spec)
+
+
+def debug(category: str, fmt: str, *args) -> None:
+    logger.log(category, DEBUG, fmt, *args)
+
+
+def info(category: str, fmt: str, *args) -> None:
+    logger.log(category, INFO, fmt, *args)
+
+
+def warning(category: str, fmt: str, *args) -> None:
+    logger.log(category, WARNING, fmt, *args)
+
+
+def error(category: str, fmt: str, *args) -> None:
+    logger.log(category, ERROR, fmt, *args)
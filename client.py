@@ -1,339 +1,79 @@
-import socket
-import threading
 import tkinter as tk
-from common_lib import ServerAction, ClientAction, EntryForFormatedMessage, ErrorType
-import common_lib
-import ast #use to transform str sembling as python type list to an atual list: "['default', 'more']" -> list['default', 'more']
-from typing import Optional
-import rsa 
-import secret_box
+import tkinter.font
+import tkinter.filedialog
+import tkinter.messagebox
+import collections
+import time
+import chat_log
+from chat_log import Category
+from client_network import ClientNetwork
+from keystore import KeyStore
 import os # for os.path.exists()
 
 
 
-class ClientNetwork:
-    def __init__(self, ui: Optional['ClientUi'], host = common_lib.HOST, port = common_lib.PORT):
-        self.host = host
-        self.port = port
-        self.nickname = None
-        self.rsa_keypair = None
-        self.ui = ui
-        self.socket: socket.socket = None
-        self.groups: dict = {}
-        self.actual_group: str = None
-        self.receive_thread: threading.Thread = None  
-        self.listen_messages = True
-        # fonction de rappel à ajouter depuis la classe parente ClientUi
-        self._display_callback = None
-
-        self.connect_to_server()
-
-
-    @property
-    def display_callback(self):
-        return self._display_callback
+# File d'événements entre le thread réseau et tkinter, qui ne doit être appelé que depuis son thread.
+# ClientNetwork poste (post) depuis son thread ; la boucle de tkinter vide la file par lots via after(),
+# sans dépasser un budget de temps par image. Dans un lot, les messages consécutifs sont affichés
+# en un seul rendu et les rafraîchissements répétés (liste des groupes, saisie) ne sont faits qu'une fois.
+class UiDispatcher:
+    FRAME_MS = 16       # intervalle entre deux lots
+    BUDGET = 0.008      # temps maximal passé par lot (secondes)
+    COALESCED = ('on_groups_updated', 'on_own_message') # ne dépendent que de l'état courant
 
+    def __init__(self, ui: 'ClientUi'):
+        self.ui = ui
+        self.events: collections.deque = collections.deque() # append/popleft sûrs entre threads
 
-    @display_callback.setter
-    def display_callback(self, callback):
-        if not callable(callback):
-            raise ValueError("display_callback doit être une fonction.")
-        self._display_callback = callback
 
+    def post(self, event: str, *args):
+        self.events.append((event, args))
 
-    def show_groups(self):
-        print("\n" + "="*20)
-        print(f"{'GROUPS':^20}")
-        print("= "*10)
-        for name, dictionary in self.groups.items():
-            print(f"{name}:\n" + "\n".join([f"  {key}:\n{value}" for key, value in dictionary.items()]))
-        print("="*20 + '\n')
 
+    def start(self):
+        self.ui.after(self.FRAME_MS, self.drain)
 
-    def connect_to_server(self):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
+    def drain(self):
         try:
-            self.socket.connect((self.host, self.port))
-
-            # lancer le thread de reception des messages
-            self.receive_thread = threading.Thread(target=self.receive_messages)
-            self.receive_thread.start()
-
-        except Exception:
-            self.disconnect()
-            print("Le server n'est pas ouvert.")
-            exit()
-
-
-    def log_in(self, nickname: str):
-        self.rsa_keypair = rsa.gen_rsa_keypair(512)
-
-        public_key = self.rsa_keypair[0]
-        hex_public_key = rsa.int_rsa_key_to_hex(public_key)
-
-        requestConnection = {
-            EntryForFormatedMessage.action: ClientAction.requestConnection,
-            EntryForFormatedMessage.nickname: nickname,
-            EntryForFormatedMessage.publicKey: hex_public_key
-        }
-        self.send_message(requestConnection)
-
-
-    def disconnect(self):
-        self.listen_messages = False
-        if self.socket:
-            self.socket.close()
-        print("Network closed.")
+            alive = self.run_batch()
+        except Exception as e:
+            # une erreur d'affichage ne doit pas arrêter le traitement des événements suivants
+            chat_log.error(Category.client, "Erreur lors de la mise à jour de l'interface : %s", e)
+            alive = True
+        if alive:
+            self.ui.after(self.FRAME_MS, self.drain)
+
+
+    # renvoie False une fois la fenêtre détruite
+    def run_batch(self) -> bool:
+        deadline = time.perf_counter() + self.BUDGET
+        messages = []
+        deferred = []
+        while self.events and time.perf_counter() < deadline:
+            event, args = self.events.popleft()
+            if event == 'on_message':
+                messages.append(args)
+                continue
+
+            if messages:
+                self.ui.on_messages(messages)
+                messages = []
+            if event in self.COALESCED:
+                if event not in deferred:
+                    deferred.append(event)
+                continue
+            getattr(self.ui, event)(*args)
+            if event == 'on_disconnected':
+                return False
+
+        if messages:
+            self.ui.on_messages(messages)
+        for event in deferred:
+            getattr(self.ui, event)()
+        return True
 
 
-    def requestDisconnection(self):
-        request = {
-            EntryForFormatedMessage.action: ClientAction.requestDisconnection,
-        }
-        self.send_message(request)
-
-
-    def sharePublicKey(self):
-        public_key = self.rsa_keypair[0]
-        hexkey = rsa.int_rsa_key_to_hex(public_key)
-
-        request = {
-            EntryForFormatedMessage.action: ClientAction.sharePublicKey,
-            EntryForFormatedMessage.public_key: hexkey
-        }
-        self.send_message(request)
-
-
-    def joinGroup(self, groupName):
-        request = {
-            EntryForFormatedMessage.action: ClientAction.requestJoinGroup,
-            EntryForFormatedMessage.groupName: groupName
-        }
-        self.send_message(request)
-
-
-    def leaveGroup(self, groupName):
-        request = {
-            EntryForFormatedMessage.action: ClientAction.requestLeaveGroup,
-            EntryForFormatedMessage.groupName: groupName
-        }
-        self.send_message(request)
-
-
-    def addGroup(self, groupName):
-        if groupName in self.groups:
-            print(f"Le groupe {groupName} existe déjà.")
-            return
-
-        # ajouter le groupe avec None, en attendant une confirmation du serveur
-        self.groups[groupName] = None
-
-        request = {
-            EntryForFormatedMessage.action: ClientAction.requestAddGroup,
-            EntryForFormatedMessage.groupName: groupName
-        }
-        self.send_message(request)
-
-    def get_group_box(self, groupName: str):
-        group_box = self.groups.get(groupName, {}).get("group_box", None)
-        
-        if group_box is None:
-            print(f"Clé du groupe {groupName} introuvable.")
-        return group_box
-
-    def encrypt_msg(self, msg: str, group_name: str):
-        group_box = self.get_group_box(group_name)
-        return secret_box.encrypt(group_box, msg)
-        
-    def decrypt_msg(self, msg: str, group_name: str):
-        group_box = self.get_group_box(group_name)
-        return secret_box.decrypt(group_box, msg)
-         
-    def send_message(self, entries: dict = {}, target = "server"): 
-        if target != "server" and self.actual_group:
-            enc_msg = self.encrypt_msg(entries['content'], self.actual_group)
-            entries['content'] = enc_msg
-        
-        common_lib.send_message(self.socket, self.nickname, target, entries)
-    
-
-    def receive_messages(self):
-        while self.listen_messages:
-            try:
-                message: dict = common_lib.receive_message(self.socket)
-                sender = message[EntryForFormatedMessage.sender]
-                target = message[EntryForFormatedMessage.target]
-
-                if sender == "server":
-                    self.handle_message_from_server(message)
-                    continue
-
-                content = message[EntryForFormatedMessage.content]
-
-                if target == self.actual_group:
-                    dec_msg = self.decrypt_msg(content, self.actual_group)
-                    reformated_message = {
-                        'sender': sender,
-                        'content': dec_msg
-                    }
-                    self.groups[target]['messages'].append(reformated_message)
-                    print(f"message déchiffré : {dec_msg}")
-                    content = dec_msg
-
-                # déléguer l'affichage d'un message dans une fonction de rappel
-                if self.display_callback:
-                    self.display_callback(content, sender)
-
-                #clear entry of the TextingPage
-                if sender == self.nickname:
-                    self.ui.frames[TextingPage].clear_entry()
-
-            except Exception as e:
-                print(f"Erreur lors de la reception d'un message : {e}")
-                self.disconnect()
-                break
-
-
-    def handle_message_from_server(self, message: dict):
-        action = message[EntryForFormatedMessage.action]
-
-        match action:
-            case ServerAction.info:
-                content = message[EntryForFormatedMessage.content]
-                group = message[EntryForFormatedMessage.target]
-
-                if group == self.actual_group:
-                    self.display_callback(content)
-
-            case ServerAction.error:
-                self.handle_error(message)
-            
-            case ServerAction.acceptConnection:
-                #get confirmed nickName
-                new_name = message[EntryForFormatedMessage.nickname]
-                self.nickname = new_name
-                self.ui.nickname = new_name
-
-                #get groups
-                groups = message[EntryForFormatedMessage.groupsList]
-                groups = ast.literal_eval(groups)
-                for group in groups:
-                    self.groups[group] = {}
-
-                #switch interface
-                self.ui.show_frame(LandingPage)
-
-            #TODO: Fait les mêmes choses que la connection classic
-            # car on ne traite pas encore les message en attentes
-            case ServerAction.acceptReconnection:
-                #get confirmed nickName
-                new_name = message[EntryForFormatedMessage.nickname]
-                self.nickname = new_name
-                self.ui.nickname = new_name
-
-                #get groups
-                groups = message[EntryForFormatedMessage.groupsList]
-                groups = ast.literal_eval(groups)
-                for group in groups:
-                    self.groups[group] = {}
-
-                #switch interface
-                self.ui.show_frame(LandingPage)
-
-            case ServerAction.giveTempNickname:
-                tempNickname = message[EntryForFormatedMessage.nickname]
-                self.nickname = tempNickname
-
-            case ServerAction.joinGroup:
-                groupName = message[EntryForFormatedMessage.groupName]
-                cipher_group_key = message.get(EntryForFormatedMessage.groupKey)
-
-                # cas où le serveur répond à une requête de création de groupe.
-                if not cipher_group_key:
-                    # créer une clé pour le nouveau groupe
-                    
-                    group_box, new_group_key = secret_box.secret_box_gen()
-                    self.groups[groupName] = {
-                        'group_box' : group_box,
-                        'group_key': new_group_key,
-                        'messages': []
-                    }
-                # Cas où le serveur répond à une demande pour rejoindre un groupe existant.
-                else :
-                    private_key = self.rsa_keypair[1]
-
-                    group_key = rsa.rsa_dec(cipher_group_key, private_key[0], private_key[1])
-                    group_box = secret_box.secret_box_gen_by_key(group_key)
-
-                    self.groups[groupName] = {
-                        'group_box' : group_box,
-                        'group_key': group_key,
-                        'messages': []
-                    }                    
-
-                
-                self.actual_group = groupName
-                print(f"Join group [{groupName}]")
-                self.ui.show_frame(TextingPage)
-
-                self.show_groups()
-            
-            case ServerAction.leaveGroup:
-                groupName = message[EntryForFormatedMessage.groupName]
-                self.groups[groupName] = {}
-                self.ui.show_frame(LandingPage)
-
-            case ServerAction.shareGroups:
-                groups = message[EntryForFormatedMessage.groupsList]
-                groups = ast.literal_eval(groups)
-                for group in groups:
-                    if group in self.groups.keys():
-                        continue
-                    self.groups[group] = {}
-                if self.ui.current_ui == "groupChoice_ui":
-                    self.ui.groupChoice_ui()
-
-                self.ui.frames[LandingPage].update_convo_buttons()
-
-            case ServerAction.requestKey:
-                group_name = message[EntryForFormatedMessage.groupName]
-                nickname, public_key = message[EntryForFormatedMessage.keyRequester]
-
-                int_public_key = rsa.hex_rsa_key_to_int(public_key)
-                group_key = self.groups[group_name]['group_key']
-              
-                # envoyer la clé de groupe au serveur
-                hex_cipher_groupkey = rsa.rsa_enc(group_key, int_public_key[0], int_public_key[1])
-
-                self.send_message({
-                    EntryForFormatedMessage.action: ClientAction.shareGroupKey,
-                    EntryForFormatedMessage.groupName: group_name,
-                    EntryForFormatedMessage.groupKey: (nickname, hex_cipher_groupkey)
-                })
-
-            case ServerAction.disconnect:
-                self.disconnect()
-                self.listen_messages = False
-                self.ui.destroy()
-
-            case _:
-                print(f"Server tried this action: [{action}], but as no effect, because is undefined.")
-
-
-    def handle_error(self, message: dict):
-            errorType = message[EntryForFormatedMessage.errorType]
-            match errorType:
-                case ErrorType.nicknameTaken:
-                    print("Nom déjà utilisé")
-                    #must be shown to the user, on the Connection interface
-                case ErrorType.alreadyConnected:
-                    print("Vous êtes déjà connecté ailleurs")
-                    #must be shown to the user, on the Connection interface
-                case ErrorType.groupNameTaken:
-                    group_name = message[EntryForFormatedMessage.groupName]
-                    print(f"Le groupe {group_name} existe déjà.")
-
 
 class ClientUi(tk.Tk):
     TITLE = "P8 Mini Chat"
@@ -360,9 +100,15 @@ class ClientUi(tk.Tk):
 
 
         self.protocol("WM_DELETE_WINDOW", lambda: self.on_closing())
-        self.start_network_connection()
+        self.dispatcher = UiDispatcher(self)
+        try:
+            self.start_network_connection()
+        except ConnectionError:
+            self.destroy()
+            raise
         self.open_window()
         self.show_frame(LoginPage)
+        self.dispatcher.start()
 
 
     def open_window(self):
@@ -424,7 +170,7 @@ class ClientUi(tk.Tk):
     def try_to_join_group(self, groupName: str):
         print(f'Try to join "{groupName}"')
         print(self.network_client.groups)
-        has_key = self.network_client.groups[groupName].get('key')
+        has_key = (self.network_client.groups.get(groupName) or {}).get('key')
         #switch window
         if has_key:
             self.network_client.actual_group = groupName
@@ -451,11 +197,59 @@ class ClientUi(tk.Tk):
 
 
     def start_network_connection(self):
-        self.network_client = ClientNetwork(self)
+        # le client réseau ne touche jamais tkinter : il poste ses événements au dispatcher
+        keystore = KeyStore("keys")
+        keystore.prepare() # paire d'avance générée pendant que l'utilisateur choisit son pseudo
+        self.network_client = ClientNetwork(self.dispatcher, history_dir="history", keystore=keystore)
 
         # self.network_client.display_callback = self.display_messages
 
 
+    # appelées dans le thread de tkinter par UiDispatcher
+    def on_logged_in(self, nickname: str):
+        self.nickname = nickname
+        self.show_frame(LandingPage)
+
+
+    def on_group_joined(self, group_name: str):
+        self.show_frame(TextingPage)
+
+
+    def on_group_left(self, group_name: str):
+        self.show_frame(LandingPage)
+
+
+    def on_groups_updated(self):
+        self.frames[LandingPage].update_convo_buttons()
+
+
+    def on_groups_changed(self, added: list[str], removed: list[str]):
+        self.frames[LandingPage].change_convo_buttons(added, removed)
+
+
+    def on_own_message(self):
+        self.frames[TextingPage].clear_entry()
+
+
+    def on_disconnected(self):
+        self.destroy()
+
+
+    def on_messages(self, messages: list[tuple]):
+        self.frames[TextingPage].display_messages(messages)
+
+
+    def on_file_offer(self, group_name: str, sender: str, file_id: str, name: str, size: int):
+        self.on_messages([(group_name, None, 'server', f"{sender} propose le fichier {name} ({size} octets)")])
+        if tkinter.messagebox.askyesno(self.TITLE, f"{sender} propose le fichier {name} ({size} octets).\nLe recevoir ?"):
+            self.network_client.accept_file(file_id)
+
+
+    def on_file_received(self, file_id: str, path: str):
+        group_name = self.network_client.offers[file_id][0]
+        self.on_messages([(group_name, None, 'server', f"Fichier reçu : {path}")])
+
+
     def send_message(self, message):
         if (message):
             self.network_client.send_message({'content': message}, self.network_client.actual_group)
@@ -548,6 +342,119 @@ class ThemedFrame(tk.Frame):
         button.configure(image=button.images[button.state])
 
 
+# Historique de conversation virtualisé : les messages chargés restent dans self.messages,
+# mais un seul tk.Text n'affiche que les lignes visibles. Ajouter un message, défiler ou
+# changer de thème coûte la même chose à 10 messages qu'à 100 000.
+class TranscriptView(tk.Frame):
+    def __init__(self, parent: tk.Widget, colors: dict):
+        super().__init__(parent)
+        self.messages: list[str] = []
+        self.top = 0            # index du premier message affiché
+        self.follow = True      # collé au dernier message tant que l'utilisateur ne remonte pas
+        self.rows = 1           # nombre de messages qui tiennent dans la zone
+        self.load_older = None  # fonction qui renvoie les messages précédant le premier affiché
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.text = tk.Text(
+            self, font=("Montserrat", 12), wrap="word", state="disabled",
+            relief="flat", highlightthickness=0, padx=10, pady=5, spacing1=5, spacing3=5, cursor="arrow"
+        )
+        self.text.grid(column=0, row=0, sticky="nsew")
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.grid(column=1, row=0, sticky="ns")
+
+        self.text.bind("<Configure>", lambda e: self.resize(e.height))
+        self.text.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1) or "break")
+        self.text.bind("<Button-4>", lambda e: self.scroll(-1) or "break")
+        self.text.bind("<Button-5>", lambda e: self.scroll(1) or "break")
+        self.set_colors(colors)
+
+
+    def set_colors(self, colors: dict):
+        self.configure(bg=colors["bg"])
+        self.text.configure(bg=colors["bg"], fg=colors["fg"])
+
+
+    def append(self, line: str):
+        self.extend((line,))
+
+
+    # ajoute plusieurs messages en un seul rendu
+    def extend(self, lines):
+        self.messages.extend(lines)
+        if self.follow:
+            self.top = max(0, len(self.messages) - self.rows)
+            self.render()
+        else:
+            self.update_scrollbar()
+
+
+    def clear(self):
+        self.messages = []
+        self.top = 0
+        self.follow = True
+        self.render()
+
+
+    def resize(self, height: int):
+        line_height = tk.font.Font(font=self.text.cget("font")).metrics("linespace") + 10 # + spacing1 + spacing3
+        self.rows = max(1, height // line_height)
+        if self.follow:
+            self.top = max(0, len(self.messages) - self.rows)
+        self.render()
+
+
+    def scroll(self, delta: int):
+        # au-dessus du premier message chargé : on demande la page précédente de l'historique
+        if self.top + delta < 0 and self.load_older is not None:
+            self.prepend(self.load_older())
+        self.scroll_to(self.top + delta)
+
+
+    def prepend(self, lines: list[str]):
+        if lines:
+            self.messages[0:0] = lines
+            self.top += len(lines)
+
+
+    def scroll_to(self, top: int):
+        last_top = max(0, len(self.messages) - self.rows)
+        self.top = min(max(0, top), last_top)
+        self.follow = self.top >= last_top
+        self.render()
+
+
+    def on_scrollbar(self, command: str, value: str, units: str = None):
+        if command == "moveto":
+            self.scroll_to(int(float(value) * len(self.messages)))
+        elif units == "pages":
+            self.scroll(int(value) * self.rows)
+        else:
+            self.scroll(int(value))
+
+
+    # réécrit uniquement les lignes visibles
+    def render(self):
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(self.messages[self.top:self.top + self.rows]))
+        self.text.configure(state="disabled")
+        if self.follow:
+            # un long message peut occuper plusieurs lignes : on garde la fin visible
+            self.text.see("end")
+        self.update_scrollbar()
+
+
+    def update_scrollbar(self):
+        total = len(self.messages)
+        if total <= self.rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+
+
+
 # Page de connexion
 class LoginPage(ThemedFrame):
     def __init__(self, parent: tk.Frame, controller: ClientUi):
@@ -665,6 +572,9 @@ class LandingPage(ThemedFrame):
         # create as many buttons as groupe conversations 
         self.convo_buttons = tk.Label(self, text="aled", bg="red")
         self.convo_buttons.grid(column=1, row=2)
+        # un bouton par groupe, créé ou détruit seulement quand l'annuaire change
+        self.group_buttons: dict[str, tk.Button] = {}
+        self.next_button_row = 0
 
         # Exemple de Peoplechat_button (Redirection vers les pages de convo)
         # peoplechat_button = tk.Button(self, relief="flat", bd=0, bg="#317874", activebackground="#317874", highlightbackground="#317874", command=lambda: [print("Affiche les discussions privées"),controller.show_frame(TextingPage)])
@@ -679,16 +589,23 @@ class LandingPage(ThemedFrame):
         # tk.Label(self, text="Exemple d'affichage de convo", bg="#E2D0F8", fg="black", font=("Montserrat", 12, "normal")).grid(column=1, row=2)
 
 
+    # resynchronise les boutons avec la liste des groupes connus, sans recréer ceux qui existent déjà
     def update_convo_buttons(self):
-        # remove present buttons
-        for layout in self.convo_buttons.winfo_children():
-            # TODO VAL ?? remove from self.button_images ?
-            layout.destroy()
+        groups = tuple(self.controller.network_client.groups)
+        known = set(groups)
+        self.change_convo_buttons(groups, [name for name in self.group_buttons if name not in known])
 
-        groups = self.controller.network_client.groups.keys()
 
-        # recreate buttons
-        for i, groupName in enumerate(groups):
+    # ajoute et retire seulement les boutons des groupes créés ou supprimés
+    def change_convo_buttons(self, added, removed):
+        for groupName in removed:
+            btn = self.group_buttons.pop(groupName, None)
+            if btn is not None:
+                btn.destroy()
+
+        for groupName in added:
+            if groupName in self.group_buttons:
+                continue
             btn = tk.Button(self.convo_buttons, text=groupName, relief="flat", bd=0, bg="#317874", activebackground="#317874", highlightbackground="#317874", command = lambda name = groupName: self.controller.try_to_join_group(name))
             # self.add_button_image(
             #     btn,
@@ -696,7 +613,9 @@ class LandingPage(ThemedFrame):
             #     light_image_path="assets/frame1/groupchat_button_clair.png",
             #     dark_image_path="assets/frame1/groupchat_button_sombre.png"
             # )
-            btn.grid(column=0, row=i)
+            btn.grid(column=0, row=self.next_button_row)
+            self.next_button_row += 1
+            self.group_buttons[groupName] = btn
             # tk.Label(self.convo_buttons, text=groupeName, bg="#E2D0F8", fg="black", font=("Montserrat", 12, "normal")).grid(column=0, row=i)
 
 
@@ -762,7 +681,9 @@ class TextingPage(ThemedFrame):
     def __init__(self, parent: tk.Frame, controller: ClientUi):
         super().__init__(parent, controller)
         self.network_client = controller.network_client
-        self.network_client.display_callback = self.display_message
+        self.group: str = None
+        self.oldest_id: int = None # plus ancien message chargé depuis l'historique
+        self.newest_id = 0         # plus récent message affiché
 
         # Configuration de la grille
         self.grid_columnconfigure(0, weight=1)  # Colonne gauche (groupes)
@@ -809,24 +730,10 @@ class TextingPage(ThemedFrame):
         )
         self.group_label.grid(column=1, row=0, pady=10, padx=10, sticky="ew")
 
-        # Cadre pour les messages avec un canvas (zone défilante)
-        message_frame_container = tk.Frame(self, bg=self.controller.colors[self.controller.theme]["bg"])
-        message_frame_container.grid(column=1, row=1, sticky="nsew", pady=10, padx=10)
-        message_frame_container.grid_rowconfigure(0, weight=1)
-        message_frame_container.grid_columnconfigure(0, weight=1)
-
-        self.message_canvas = tk.Canvas(
-            message_frame_container, bg=self.controller.colors[self.controller.theme]["bg"], highlightthickness=0
-        )
-        self.message_canvas.grid(column=0, row=0, sticky="nsew")
-
-        self.message_scrollbar = tk.Frame(self.message_canvas)
-        self.message_canvas.create_window((0, 0), window=self.message_scrollbar, anchor="nw")
-
-        self.message_scrollbar.bind(
-            "<Configure>",
-            lambda event: self.message_canvas.configure(scrollregion=self.message_canvas.bbox("all"))
-        )
+        # Zone des messages : seules les lignes visibles sont affichées (voir TranscriptView)
+        self.transcript = TranscriptView(self, self.controller.colors[self.controller.theme])
+        self.transcript.load_older = self.load_older
+        self.transcript.grid(column=1, row=1, sticky="nsew", pady=10, padx=10)
 
         # Champ de saisie pour les messages
         self.entry_message = tk.Entry(
@@ -844,6 +751,14 @@ class TextingPage(ThemedFrame):
         )
         send_button.grid(column=1, row=3, sticky="ew", padx=10, pady=10)
 
+        # Bouton d'envoi de fichier
+        file_button = tk.Button(
+            self, text="Fichier...", command=self.send_file,
+            bg=self.controller.colors[self.controller.theme]["button"],
+            fg=self.controller.colors[self.controller.theme]["fg"]
+        )
+        file_button.grid(column=0, row=3, sticky="ew", padx=10, pady=10)
+
 
     def init_binds(self):
         self.entry_message.focus()
@@ -854,23 +769,37 @@ class TextingPage(ThemedFrame):
         self.entry_message.delete(0, tk.END)
 
 
-    def display_message(self, content: str, sender = 'server'):
-        # Affiche un message reçu dans la zone des messages.
-        message_label = tk.Label(
-            self.message_scrollbar,
-            text=f"{sender}: {content}",
-            font=("Montserrat", 12),
-            anchor="w",
-            justify="left",
-            wraplength=500,
-            bg=self.controller.colors[self.controller.theme]["bg"],
-            fg=self.controller.colors[self.controller.theme]["fg"]
-        )
-        message_label.pack(fill="x", padx=10, pady=5)
+    # une rafale de messages reçus (groupe, id, expéditeur, texte) : un seul rendu.
+    # Les messages déjà chargés depuis l'historique (id <= newest_id) ne sont pas répétés.
+    def display_messages(self, messages: list[tuple]):
+        lines = []
+        for group, id, sender, content in messages:
+            if group != self.group or (id is not None and id <= self.newest_id):
+                continue
+            if id is not None:
+                self.newest_id = id
+            lines.append(f"{sender}: {content}")
+        if lines:
+            self.transcript.extend(lines)
+
+
+    # appelée par la zone des messages quand l'utilisateur remonte au-delà du premier message chargé
+    def load_older(self) -> list[str]:
+        if self.group is None or self.oldest_id is None:
+            return []
+        page = self.network_client.older_messages(self.group, self.oldest_id)
+        if not page:
+            self.oldest_id = None # début de la conversation
+            return []
+        self.oldest_id = page[0][0]
+        return [f"{sender}: {content}" for _, sender, content in page]
+
 
-        # Scroll automatiquement vers le bas
-        self.message_canvas.update_idletasks()
-        self.message_canvas.yview_moveto(1.0)
+    def update_theme(self):
+        super().update_theme()
+        # appelée aussi par ThemedFrame.__init__, avant la création de la zone des messages
+        if hasattr(self, 'transcript'):
+            self.transcript.set_colors(self.controller.colors[self.controller.theme])
 
 
     def send_message(self):
@@ -891,15 +820,39 @@ class TextingPage(ThemedFrame):
         # self.entry_message.delete(0, "end")
 
 
+    def send_file(self):
+        if not self.network_client.actual_group:
+            return
+        path = tkinter.filedialog.askopenfilename(parent=self)
+        if path:
+            self.network_client.send_file(path)
+
+
     def update_group(self, group_name: str):
         # Met à jour le nom du groupe actif.
         self.group_label.config(text=f"Conversation : {group_name}")
+        if group_name == self.group:
+            return
+
+        # affiche tout de suite les derniers messages du groupe (gardés en mémoire)
+        self.group = group_name
+        recent = self.network_client.recent_messages(group_name) if group_name else []
+        self.oldest_id = recent[0][0] if recent else None
+        self.newest_id = recent[-1][0] if recent else 0
+        self.transcript.clear()
+        self.transcript.extend(f"{sender}: {content}" for _, sender, content in recent)
 
 
 
-client_ui = ClientUi()
-client_ui.mainloop()
-print("Prog end.\nPlease, Press Ctrl+C...")
+def main():
+    try:
+        client_ui = ClientUi()
+    except ConnectionError as e:
+        chat_log.error(Category.client, "%s", e)
+        return 1
+    client_ui.mainloop()
+    return 0
 
-# !!! ici, le thread "receive_message" n'a pas été arrếté (trop chiant -_-'')
 
+if __name__ == "__main__":
+    raise SystemExit(main())
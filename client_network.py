@@ -0,0 +1,710 @@
+import base64
+import socket
+import threading
+import time
+from common_lib import ServerAction, ClientAction, EntryForFormatedMessage, ErrorType
+import common_lib
+import chat_log
+from chat_log import Category
+import rsa 
+import secret_box
+import os
+from history_store import HistoryStore
+from keystore import KeyStore
+from file_transfer import Upload, Download
+from sequences import GroupSequences
+
+
+
+# Partie réseau du client, sans tkinter : utilisable seule (benchmarks, tests, autre interface).
+# L'interface éventuelle reçoit ses événements par ui.post(événement, *args), depuis le thread réseau :
+# on_logged_in, on_group_joined, on_group_left, on_groups_updated, on_groups_changed, on_own_message,
+# on_file_offer, on_file_received et on_disconnected.
+# C'est à elle de les traiter dans son propre thread (voir UiDispatcher dans client.py).
+class ClientNetwork:
+    FILE_STALL_TIMEOUT = 5.0 # secondes sans morceau reçu avant de redemander la suite d'un fichier
+    ACK_DELAY = 0.5          # les accusés de réception des messages arrivés entre-temps partent ensemble
+    GROUPS_PAGE = 256        # groupes demandés par page de l'annuaire
+
+    def __init__(self, ui = None, host = common_lib.HOST, port = common_lib.PORT, history_dir: str = None, keystore: KeyStore = None,
+                 downloads_dir: str = "downloads"):
+        self.host = host
+        self.port = port
+        self.nickname = None
+        self.rsa_keypair = None
+        self.ui = ui
+        self.socket: socket.socket = None
+        self.groups: dict = {}
+        self.groups_version = 0 # version de l'annuaire des groupes connue (voir GroupDirectory côté serveur)
+        # groupe -> boîte de chiffrement, pour ne pas parcourir self.groups à chaque message
+        self.boxes: dict = {}
+        self.actual_group: str = None
+        self.receive_thread: threading.Thread = None  
+        self.listen_messages = True
+        # format des trames envoyées, négocié avec le serveur à la connexion
+        self.protocol = common_lib.PROTOCOL_JSON
+        self.server_protocols: list[str] = []
+        # historique des conversations : en mémoire tant que le pseudo n'est pas connu
+        self.history_dir = history_dir
+        self.history = HistoryStore()
+        self.history_name: str = None
+        # séquences reçues par groupe : doublons écartés, accusés cumulatifs, reprise à la reconnexion
+        self.sequences = GroupSequences()
+        self.ack_scheduled = False
+        # paires RSA : relues sur disque ou générées d'avance dans un autre processus
+        self.keystore = keystore or KeyStore(directory=None)
+        # fichiers proposés par ce client, proposés par les autres (id -> (groupe, expéditeur, nom, taille,
+        # taille des morceaux)) et en cours de réception
+        self.downloads_dir = downloads_dir
+        self.uploads: dict[str, Upload] = {}
+        self.offers: dict[str, tuple] = {}
+        self.downloads: dict[str, Download] = {}
+        self.files_lock = threading.Lock()
+        # le thread réseau (morceaux de fichier, clés) et l'interface écrivent sur le même socket
+        self.send_lock = threading.Lock()
+        # fonction de rappel à ajouter depuis la classe parente ClientUi
+        self._display_callback = None
+
+        self.connect_to_server()
+
+
+    # prévient l'interface (si elle existe) : sans ui, le client réseau s'utilise seul
+    def notify_ui(self, event: str, *args):
+        if self.ui is not None:
+            self.ui.post(event, *args)
+
+
+    @property
+    def display_callback(self):
+        return self._display_callback
+
+
+    @display_callback.setter
+    def display_callback(self, callback):
+        if not callable(callback):
+            raise ValueError("display_callback doit être une fonction.")
+        self._display_callback = callback
+
+
+    def show_groups(self):
+        if not chat_log.enabled(Category.client, chat_log.DEBUG):
+            return
+        lines = [f"{name}:\n" + "\n".join([f"  {key}:\n{value}" for key, value in dictionary.items()]) for name, dictionary in self.groups.items()]
+        chat_log.debug(Category.client, "GROUPS\n%s", "\n".join(lines))
+
+
+    def connect_to_server(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        try:
+            self.socket.connect((self.host, self.port))
+
+            # lancer le thread de reception des messages
+            self.receive_thread = threading.Thread(target=self.receive_messages, daemon=True)
+            self.receive_thread.start()
+
+        except OSError as e:
+            self.disconnect()
+            chat_log.error(Category.client, "Le server n'est pas ouvert.")
+            raise ConnectionError(f"Connexion impossible à {self.host}:{self.port}") from e
+
+
+    # ne bloque pas : la demande de connexion part dès que la paire de clés est prête
+    def log_in(self, nickname: str):
+        self.keystore.keypair_for(nickname, lambda keypair: self.request_connection(nickname, keypair))
+
+
+    def request_connection(self, nickname: str, keypair: rsa.RsaKeypair):
+        self.rsa_keypair = keypair
+        # l'historique du pseudo donne les dernières séquences reçues avant la déconnexion
+        self.open_history(nickname)
+
+        public_key = self.rsa_keypair[0]
+        hex_public_key = rsa.int_rsa_key_to_hex(public_key)
+
+        requestConnection = {
+            EntryForFormatedMessage.action: ClientAction.requestConnection,
+            EntryForFormatedMessage.nickname: nickname,
+            EntryForFormatedMessage.publicKey: hex_public_key,
+            # seuls les groupes dont on a encore la clé sont rejoués : le reste serait illisible
+            EntryForFormatedMessage.lastSeqs: {group: seq for group, seq in self.sequences.snapshot().items() if group in self.boxes},
+            EntryForFormatedMessage.groupsVersion: self.groups_version,
+            # le serveur ne demandera la clé d'un groupe qu'aux membres qui l'ont
+            EntryForFormatedMessage.heldKeys: list(self.boxes)
+        }
+        # demander le format binaire si le serveur le propose
+        if common_lib.PROTOCOL_BINARY in self.server_protocols:
+            requestConnection[EntryForFormatedMessage.protocol] = common_lib.PROTOCOL_BINARY
+        self.send_message(requestConnection)
+
+
+    def disconnect(self):
+        self.listen_messages = False
+        self.history.save_seqs(self.sequences.take_changes())
+        self.keystore.close()
+        # les fichiers partiels restent sur le disque pour une reprise
+        with self.files_lock:
+            for download in self.downloads.values():
+                download.close()
+            self.downloads.clear()
+        if self.socket:
+            self.socket.close()
+        chat_log.info(Category.client, "Network closed.")
+
+
+    def requestDisconnection(self):
+        request = {
+            EntryForFormatedMessage.action: ClientAction.requestDisconnection,
+        }
+        self.send_message(request)
+
+
+    def sharePublicKey(self):
+        public_key = self.rsa_keypair[0]
+        hexkey = rsa.int_rsa_key_to_hex(public_key)
+
+        request = {
+            EntryForFormatedMessage.action: ClientAction.sharePublicKey,
+            EntryForFormatedMessage.public_key: hexkey
+        }
+        self.send_message(request)
+
+
+    def joinGroup(self, groupName):
+        request = {
+            EntryForFormatedMessage.action: ClientAction.requestJoinGroup,
+            EntryForFormatedMessage.groupName: groupName
+        }
+        self.send_message(request)
+
+
+    def leaveGroup(self, groupName):
+        request = {
+            EntryForFormatedMessage.action: ClientAction.requestLeaveGroup,
+            EntryForFormatedMessage.groupName: groupName
+        }
+        self.send_message(request)
+
+
+    def addGroup(self, groupName):
+        if groupName in self.groups:
+            print(f"Le groupe {groupName} existe déjà.")
+            return
+
+        # ajouter le groupe avec None, en attendant une confirmation du serveur
+        self.groups[groupName] = None
+
+        request = {
+            EntryForFormatedMessage.action: ClientAction.requestAddGroup,
+            EntryForFormatedMessage.groupName: groupName
+        }
+        self.send_message(request)
+
+    def get_group_box(self, groupName: str):
+        group_box = self.boxes.get(groupName)
+
+        if group_box is None:
+            chat_log.warning(Category.client, "Clé du groupe %s introuvable.", groupName)
+        return group_box
+
+    def forget_group_key(self, groupName: str):
+        self.groups[groupName] = {}
+        self.boxes.pop(groupName, None)
+        self.history.forget_group_key(groupName)
+
+
+    def set_group_key(self, groupName: str, group_key: bytes):
+        group_box = secret_box.secret_box_gen_by_key(group_key)
+        self.groups[groupName] = {
+            'group_box' : group_box,
+            'group_key': group_key,
+        }
+        self.boxes[groupName] = group_box
+
+
+    # clé de groupe chiffrée avec notre clé publique (RSA sans remplissage : les zéros de tête sont remis)
+    def decrypt_group_key(self, cipher: str) -> bytes:
+        return rsa.rsa_dec_crt(cipher, self.rsa_keypair[1]).rjust(secret_box.KEY_SIZE, b'\0')
+
+
+    # la clé publique qui protège les clés de groupe gardées dans l'historique
+    def key_owner(self) -> str:
+        return rsa.int_rsa_key_to_hex(self.rsa_keypair[0])[1]
+
+
+    # garde la clé du groupe dans l'historique, chiffrée pour soi-même
+    def save_group_key(self, groupName: str, group_key: bytes):
+        e, n = self.rsa_keypair[0]
+        self.history.save_group_key(groupName, self.key_owner(), rsa.rsa_enc(group_key, e, n))
+
+
+    # clés des groupes gardées par un lancement précédent, pour la paire de clés actuelle
+    def load_group_keys(self):
+        for group, cipher in self.history.group_keys(self.key_owner()).items():
+            if group not in self.boxes:
+                self.set_group_key(group, self.decrypt_group_key(cipher))
+
+
+    # un fichier d'historique par pseudo, dans history_dir (sinon l'historique reste en mémoire)
+    def open_history(self, nickname: str):
+        if self.history_dir is None or nickname == self.history_name:
+            return
+        os.makedirs(self.history_dir, exist_ok=True)
+        path = os.path.join(self.history_dir, f"{nickname.encode('utf-8').hex()}.sqlite3")
+        self.history.close()
+        self.history = HistoryStore(path)
+        self.history_name = nickname
+        self.sequences = GroupSequences(self.history.last_seqs())
+        if self.rsa_keypair is not None:
+            self.load_group_keys()
+
+
+    # derniers messages d'un groupe (id, expéditeur, texte), sans accès disque la plupart du temps
+    def recent_messages(self, group_name: str) -> list[tuple[int, str, str]]:
+        return self.history.recent(group_name, lambda cipher: self.decrypt_msg(cipher, group_name))
+
+
+    # messages plus anciens que before_id, relus depuis le disque
+    def older_messages(self, group_name: str, before_id: int, limit: int = 100) -> list[tuple[int, str, str]]:
+        return self.history.page(group_name, before_id, limit, lambda cipher: self.decrypt_msg(cipher, group_name))
+
+    # en format binaire, le chiffré circule en octets bruts (sans base64)
+    def encrypt_msg(self, msg: str, group_name: str):
+        group_box = self.get_group_box(group_name)
+        if self.protocol == common_lib.PROTOCOL_BINARY:
+            return secret_box.encrypt_raw(group_box, msg)
+        return secret_box.encrypt(group_box, msg)
+        
+    def decrypt_msg(self, msg: str | bytes, group_name: str):
+        group_box = self.get_group_box(group_name)
+        if isinstance(msg, bytes):
+            return secret_box.decrypt_raw(group_box, msg)
+        return secret_box.decrypt(group_box, msg)
+         
+    # None si le message ne peut pas être déchiffré
+    def decrypt_group_msg(self, msg: str | bytes, group_name: str) -> str | None:
+        group_box = self.boxes.get(group_name)
+        if group_box is None:
+            return None
+        try:
+            if isinstance(msg, bytes):
+                return secret_box.decrypt_raw(group_box, msg)
+            return secret_box.decrypt(group_box, msg)
+        except Exception:
+            return None
+
+
+    def send_message(self, entries: dict = {}, target = "server"): 
+        if target != "server" and self.actual_group:
+            enc_msg = self.encrypt_msg(entries['content'], self.actual_group)
+            entries['content'] = enc_msg
+
+        with self.send_lock:
+            common_lib.send_message(self.socket, self.nickname, target, entries, self.protocol)
+    
+
+    def receive_messages(self):
+        while self.listen_messages:
+            try:
+                message: dict = common_lib.receive_message(self.socket)
+                sender = message[EntryForFormatedMessage.sender]
+                target = message[EntryForFormatedMessage.target]
+
+                # message d'un groupe : déjà reçu (en direct puis rejoué à la reconnexion) il est ignoré
+                seq = message.get(EntryForFormatedMessage.seq)
+
+                if sender == "server":
+                    if seq is not None and target:
+                        if not self.sequences.accept(target, seq):
+                            continue
+                        self.schedule_ack()
+                    self.handle_message_from_server(message)
+                    continue
+
+                content = message[EntryForFormatedMessage.content]
+
+                # un message illisible (clé du groupe absente ou différente) n'est ni compté ni acquitté :
+                # le serveur le garde pour un prochain rejeu
+                dec_msg = self.decrypt_group_msg(content, target)
+                if dec_msg is None:
+                    chat_log.warning(Category.client, "Message illisible du groupe %s (séquence %s) ignoré.", target, seq)
+                    continue
+                if seq is not None:
+                    if not self.sequences.accept(target, seq):
+                        continue
+                    self.schedule_ack()
+
+                # tout message déchiffré est gardé dans l'historique
+                id = self.history.append(target, sender, dec_msg, content, self.sequences.get(target))
+                content = dec_msg
+
+                # déléguer l'affichage d'un message dans une fonction de rappel
+                if self.display_callback:
+                    self.display_callback(content, sender)
+                self.notify_ui('on_message', target, id, sender, content)
+
+                #clear entry of the TextingPage
+                if sender == self.nickname:
+                    self.notify_ui('on_own_message')
+
+            except Exception as e:
+                chat_log.warning(Category.client, "Erreur lors de la reception d'un message : %s", e)
+                self.disconnect()
+                break
+
+
+    def handle_message_from_server(self, message: dict):
+        action = message[EntryForFormatedMessage.action]
+
+        match action:
+            case ServerAction.info:
+                content = message[EntryForFormatedMessage.content]
+                group = message[EntryForFormatedMessage.target]
+
+                if group == self.actual_group and self.display_callback:
+                    self.display_callback(content)
+                self.notify_ui('on_message', group, None, 'server', content)
+
+            case ServerAction.error:
+                self.handle_error(message)
+            
+            case ServerAction.acceptConnection:
+                #get confirmed nickName
+                new_name = message[EntryForFormatedMessage.nickname]
+                self.nickname = new_name
+                self.protocol = message.get(EntryForFormatedMessage.protocol, common_lib.PROTOCOL_JSON)
+                self.open_history(new_name)
+
+                #get groups (première page, les suivantes sont demandées au fil de l'eau)
+                self.receive_groups_page(message)
+
+                #switch interface
+                self.notify_ui('on_logged_in', new_name)
+
+            # les clés de groupe sont gardées d'une connexion à l'autre ; les messages manqués suivent : le serveur indique d'où repart chaque groupe
+            case ServerAction.acceptReconnection:
+                #get confirmed nickName
+                new_name = message[EntryForFormatedMessage.nickname]
+                self.nickname = new_name
+                self.protocol = message.get(EntryForFormatedMessage.protocol, common_lib.PROTOCOL_JSON)
+                self.open_history(new_name)
+
+                #get groups (première page, les suivantes sont demandées au fil de l'eau)
+                self.receive_groups_page(message)
+                for group, last in message.get(EntryForFormatedMessage.lastSeqs, {}).items():
+                    self.sequences.reset(group, last)
+
+                #switch interface
+                self.notify_ui('on_logged_in', new_name)
+
+            case ServerAction.giveTempNickname:
+                tempNickname = message[EntryForFormatedMessage.nickname]
+                self.nickname = tempNickname
+                self.server_protocols = message.get(EntryForFormatedMessage.protocols, [])
+
+            case ServerAction.joinGroup:
+                groupName = message[EntryForFormatedMessage.groupName]
+                cipher_group_key = message.get(EntryForFormatedMessage.groupKey)
+
+                # cas où le serveur répond à une requête de création de groupe.
+                if not cipher_group_key:
+                    # créer une clé pour le nouveau groupe
+                    _, group_key = secret_box.secret_box_gen()
+                # Cas où le serveur répond à une demande pour rejoindre un groupe existant.
+                else :
+                    group_key = self.decrypt_group_key(cipher_group_key)
+
+                self.set_group_key(groupName, group_key)
+                self.save_group_key(groupName, group_key)
+                # seuls les messages suivant cette séquence sont pour nous
+                seq = message.get(EntryForFormatedMessage.seq)
+                if seq is not None:
+                    self.sequences.reset(groupName, seq)
+                self.actual_group = groupName
+                chat_log.info(Category.client, "Join group [%s]", groupName)
+                self.notify_ui('on_group_joined', groupName)
+
+                self.show_groups()
+            
+            case ServerAction.leaveGroup:
+                groupName = message[EntryForFormatedMessage.groupName]
+                self.forget_group_key(groupName)
+                self.sequences.forget(groupName)
+                self.history.forget_seq(groupName)
+                self.notify_ui('on_group_left', groupName)
+
+            case ServerAction.shareGroups:
+                groups = message[EntryForFormatedMessage.groupsList]
+                groups = common_lib.parse_groups_list(groups)
+                for group in groups:
+                    if group in self.groups.keys():
+                        continue
+                    self.groups[group] = {}
+                self.notify_ui('on_groups_updated')
+
+            case ServerAction.groupsPage:
+                groups = self.receive_groups_page(message)
+                self.notify_ui('on_groups_changed', groups, [])
+
+            case ServerAction.groupsChanged:
+                added = list(message.get(EntryForFormatedMessage.groupsAdded) or ())
+                removed = list(message.get(EntryForFormatedMessage.groupsRemoved) or ())
+                for group in added:
+                    self.groups.setdefault(group, {})
+                for group in removed:
+                    self.forget_group_key(group)
+                    self.groups.pop(group, None)
+                self.groups_version = max(self.groups_version, message[EntryForFormatedMessage.groupsVersion])
+                self.notify_ui('on_groups_changed', added, removed)
+
+            case ServerAction.requestKey:
+                # plusieurs demandes peuvent arriver ensemble : une seule réponse pour toutes
+                group_name = message[EntryForFormatedMessage.groupName]
+                group_key = (self.groups.get(group_name) or {}).get('group_key')
+                if group_key is None:
+                    # clé perdue : le serveur sollicite un autre membre
+                    chat_log.warning(Category.client, "Clé du groupe %s demandée, mais introuvable.", group_name)
+                    self.send_message({
+                        EntryForFormatedMessage.action: ClientAction.shareGroupKey,
+                        EntryForFormatedMessage.groupName: group_name,
+                        EntryForFormatedMessage.groupKeys: [],
+                        EntryForFormatedMessage.errorType: ErrorType.groupKeyUnavailable
+                    })
+                    return
+
+                group_keys = []
+                for request_id, nickname, public_key in message[EntryForFormatedMessage.keyRequesters]:
+                    int_public_key = rsa.hex_rsa_key_to_int(public_key)
+                    group_keys.append((request_id, rsa.rsa_enc(group_key, int_public_key[0], int_public_key[1])))
+
+                # envoyer les clés de groupe chiffrées au serveur
+                self.send_message({
+                    EntryForFormatedMessage.action: ClientAction.shareGroupKey,
+                    EntryForFormatedMessage.groupName: group_name,
+                    EntryForFormatedMessage.groupKeys: group_keys
+                })
+
+            case ServerAction.ping:
+                self.send_message({EntryForFormatedMessage.action: ClientAction.pong})
+
+            case ServerAction.pong:
+                pass
+
+            case ServerAction.fileOffer:
+                self.handle_file_offer(message)
+
+            case ServerAction.fileChunksRequested:
+                upload = self.uploads.get(message[EntryForFormatedMessage.fileId])
+                if upload is not None:
+                    self.send_file_chunks(upload, message[EntryForFormatedMessage.nickname],
+                                          message[EntryForFormatedMessage.offset], message[EntryForFormatedMessage.count])
+
+            case ServerAction.fileChunk:
+                self.handle_file_chunk(message)
+
+            case ServerAction.disconnect:
+                self.disconnect()
+                self.listen_messages = False
+                self.notify_ui('on_disconnected')
+
+            case _:
+                chat_log.warning(Category.client, "Server tried this action: [%s], but as no effect, because is undefined.", action)
+
+
+    # une page de l'annuaire des groupes (ou toute la liste, d'un ancien serveur) ; la page suivante est
+    # demandée aussitôt, les changements survenus entre-temps arrivent par groupsChanged
+    def receive_groups_page(self, message: dict) -> list[str]:
+        groups = common_lib.parse_groups_list(message[EntryForFormatedMessage.groupsList])
+        for group in groups:
+            self.groups.setdefault(group, {})
+
+        version = message.get(EntryForFormatedMessage.groupsVersion)
+        if version is not None:
+            self.groups_version = max(self.groups_version, version)
+        cursor = message.get(EntryForFormatedMessage.offset)
+        if cursor is not None:
+            self.send_message({
+                EntryForFormatedMessage.action: ClientAction.requestGroups,
+                EntryForFormatedMessage.offset: cursor,
+                EntryForFormatedMessage.count: self.GROUPS_PAGE
+            })
+        return groups
+
+
+    # accusé de réception cumulatif : la dernière séquence reçue sans trou de chaque groupe qui a avancé,
+    # envoyé au plus une fois par ACK_DELAY quel que soit le nombre de messages reçus
+    def schedule_ack(self):
+        if self.ack_scheduled:
+            return
+        self.ack_scheduled = True
+        timer = threading.Timer(self.ACK_DELAY, self.send_acks)
+        timer.daemon = True
+        timer.start()
+
+
+    def send_acks(self):
+        self.ack_scheduled = False
+        changes = self.sequences.take_changes()
+        if not changes or not self.listen_messages:
+            return
+        self.history.save_seqs(changes)
+        self.send_message({
+            EntryForFormatedMessage.action: ClientAction.ackMessages,
+            EntryForFormatedMessage.lastSeqs: changes
+        })
+
+
+    # Fichiers : le fichier est proposé au groupe, puis chaque membre intéressé vient chercher les morceaux
+    # chiffrés avec la clé du groupe, quelques-uns à la fois. Ni l'expéditeur, ni le serveur, ni le destinataire
+    # ne gardent le fichier en mémoire.
+    def send_file(self, path: str, group_name: str = None) -> str:
+        group_name = group_name or self.actual_group
+        if self.get_group_box(group_name) is None:
+            raise ValueError(f"Clé du groupe {group_name} introuvable.")
+
+        upload = Upload(os.urandom(16).hex(), path, group_name)
+        self.uploads[upload.id] = upload
+        self.send_message({
+            EntryForFormatedMessage.action: ClientAction.offerFile,
+            EntryForFormatedMessage.groupName: group_name,
+            EntryForFormatedMessage.fileId: upload.id,
+            EntryForFormatedMessage.fileSize: upload.size,
+            EntryForFormatedMessage.chunkSize: upload.chunk_size,
+            EntryForFormatedMessage.content: self.encrypt_msg(os.path.basename(path), group_name)
+        })
+        return upload.id
+
+
+    # commence, ou reprend, la réception d'un fichier proposé ; renvoie le chemin du fichier une fois reçu
+    def accept_file(self, file_id: str) -> str:
+        group_name, owner, name, size, chunk_size = self.offers[file_id]
+        os.makedirs(self.downloads_dir, exist_ok=True)
+        path = os.path.join(self.downloads_dir, name)
+
+        with self.files_lock:
+            if file_id in self.downloads:
+                return path
+            download = self.downloads[file_id] = Download(file_id, path, size, chunk_size)
+        self.continue_download(download)
+        self.watch_download(download)
+        return path
+
+
+    def handle_file_offer(self, message: dict):
+        group_name = message[EntryForFormatedMessage.groupName]
+        file_id = message[EntryForFormatedMessage.fileId]
+        if self.boxes.get(group_name) is None:
+            chat_log.warning(Category.client, "Fichier proposé au groupe %s, dont la clé est inconnue.", group_name)
+            return
+
+        # le nom vient d'un autre client : jamais de chemin, seulement un nom de fichier
+        name = os.path.basename(self.decrypt_msg(message[EntryForFormatedMessage.content], group_name).replace('\\', '/'))
+        if name in ('', '.', '..'):
+            name = file_id
+        owner = message[EntryForFormatedMessage.nickname]
+        size = message[EntryForFormatedMessage.fileSize]
+        self.offers[file_id] = (group_name, owner, name, size, message[EntryForFormatedMessage.chunkSize])
+        self.notify_ui('on_file_offer', group_name, owner, file_id, name, size)
+
+
+    # les morceaux sont lus et chiffrés un par un, chacun envoyé avant de lire le suivant
+    def send_file_chunks(self, upload: Upload, requester: str, offset: int, count: int):
+        group_box = self.get_group_box(upload.group_name)
+        if group_box is None:
+            return
+        for chunk_offset, cipher in upload.chunks(group_box, offset, count):
+            self.send_message({
+                EntryForFormatedMessage.action: ClientAction.shareFileChunk,
+                EntryForFormatedMessage.fileId: upload.id,
+                EntryForFormatedMessage.nickname: requester,
+                EntryForFormatedMessage.offset: chunk_offset,
+                EntryForFormatedMessage.content: cipher
+            })
+
+
+    def handle_file_chunk(self, message: dict):
+        download = self.downloads.get(message[EntryForFormatedMessage.fileId])
+        group_box = self.boxes.get(message[EntryForFormatedMessage.target])
+        if download is None or group_box is None:
+            return
+
+        content = message[EntryForFormatedMessage.content]
+        if isinstance(content, str): # reçu en JSON : base64
+            content = base64.b64decode(content)
+        try:
+            with self.files_lock:
+                download.write(group_box, message[EntryForFormatedMessage.offset], content)
+        except Exception as e:
+            # morceau ignoré : il sera redemandé faute de progrès
+            chat_log.warning(Category.client, "Morceau de fichier illisible : %s", e)
+            return
+        self.continue_download(download)
+
+
+    # demande les morceaux suivants, ou termine le fichier s'il est complet
+    def continue_download(self, download: Download):
+        with self.files_lock:
+            if self.downloads.get(download.id) is not download:
+                return
+            if download.done:
+                del self.downloads[download.id]
+                download.finish()
+                request = None
+            else:
+                request = download.next_request()
+
+        if download.done:
+            chat_log.info(Category.client, "Fichier reçu : %s", download.path)
+            self.notify_ui('on_file_received', download.id, download.path)
+        elif request is not None:
+            offset, count = request
+            self.send_message({
+                EntryForFormatedMessage.action: ClientAction.requestFileChunks,
+                EntryForFormatedMessage.fileId: download.id,
+                EntryForFormatedMessage.offset: offset,
+                EntryForFormatedMessage.count: count
+            })
+
+
+    # des morceaux peuvent être perdus en route (client lent dont les trames sont jetées par le serveur) :
+    # sans progrès pendant FILE_STALL_TIMEOUT, la réception repart du dernier morceau écrit
+    def watch_download(self, download: Download):
+        timer = threading.Timer(self.FILE_STALL_TIMEOUT, self.check_download, (download,))
+        timer.daemon = True
+        timer.start()
+
+
+    def check_download(self, download: Download):
+        if not self.listen_messages or self.downloads.get(download.id) is not download:
+            return
+        with self.files_lock:
+            if time.monotonic() - download.last_progress >= self.FILE_STALL_TIMEOUT:
+                download.restart()
+        self.continue_download(download)
+        self.watch_download(download)
+
+
+    def handle_error(self, message: dict):
+            errorType = message[EntryForFormatedMessage.errorType]
+            match errorType:
+                case ErrorType.nicknameTaken:
+                    print("Nom déjà utilisé")
+                    #must be shown to the user, on the Connection interface
+                case ErrorType.alreadyConnected:
+                    print("Vous êtes déjà connecté ailleurs")
+                    #must be shown to the user, on the Connection interface
+                case ErrorType.groupNameTaken:
+                    group_name = message[EntryForFormatedMessage.groupName]
+                    print(f"Le groupe {group_name} existe déjà.")
+                case ErrorType.joinTimeout:
+                    group_name = message[EntryForFormatedMessage.groupName]
+                    print(f"Aucun membre du groupe {group_name} n'a transmis la clé.")
+                case ErrorType.serverFull:
+                    print("Le serveur est complet, réessayez plus tard.")
+                case ErrorType.fileUnavailable:
+                    # le fichier partiel est gardé : accept_file reprendra plus tard où il s'est arrêté
+                    with self.files_lock:
+                        download = self.downloads.pop(message[EntryForFormatedMessage.fileId], None)
+                    if download is not None:
+                        download.close()
+                        print(f"Fichier {os.path.basename(download.path)} indisponible pour le moment.")
@@ -1,8 +1,18 @@
+import ast
+import base64
 import json
 import socket
+import struct
+import weakref
+import chat_log
+from chat_log import Category
 
 HOST = 'localhost'
 PORT = 5555
+BACKLOG = 1024 # connexions en attente d'accept() côté serveur
+MAX_FRAME_SIZE = 1 << 20 # taille maximale d'une trame reçue (octets)
+FILE_CHUNK_SIZE = 64 << 10 # morceaux d'un fichier échangé : une trame chacun, loin de MAX_FRAME_SIZE
+FILE_WINDOW = 8 # morceaux d'un fichier en route au plus vers un même destinataire
 
 class ServerAction:
     error = "error"
@@ -15,6 +25,13 @@ class ServerAction:
     shareGroups = "shareGroups" #give the existing groups to the client
     requestKey = "requestKey" # Envoyer une demande à l'administrateur pour la clé de groupe
     disconnect = "disconnect"
+    fileOffer = "fileOffer"     # un membre propose un fichier au groupe
+    fileChunksRequested = "fileChunksRequested" # un membre demande des morceaux du fichier que l'on propose
+    fileChunk = "fileChunk"     # un morceau chiffré du fichier demandé
+    ping = "ping"               # connexion silencieuse : le client doit répondre pong
+    pong = "pong"
+    groupsChanged = "groupsChanged" # groupes ajoutés et supprimés de l'annuaire depuis la version précédente
+    groupsPage = "groupsPage"   # une page de la liste des groupes (réponse à requestGroups)
 # To perform an action, the server must send a message as the sender,
 # which the "content" must followed the format:
 # => "action:::content of the action"
@@ -28,6 +45,13 @@ class ClientAction:
     requestAddGroup = "requestAddGroup"
     requestLeaveGroup = "requestLeaveGroup"
     requestDisconnection = "requestDisconnection"
+    offerFile = "offerFile"     # proposer un fichier au groupe
+    requestFileChunks = "requestFileChunks" # demander les morceaux suivants d'un fichier proposé
+    shareFileChunk = "shareFileChunk" # envoyer un morceau demandé, pour un seul destinataire
+    ping = "ping"               # mêmes noms que côté serveur
+    pong = "pong"
+    ackMessages = "ackMessages" # dernière séquence reçue sans trou, par groupe (accusé cumulatif)
+    requestGroups = "requestGroups" # page suivante de la liste des groupes (offset : curseur, count : taille)
 
 
 class EntryForFormatedMessage:
@@ -42,6 +66,21 @@ class EntryForFormatedMessage:
     groupsList = 'groupsList'  #a list a group
     groupName = 'groupName'    #name of a specific group
     groupKey = 'groupKey'    # clé de chiffrement de groupe
+    protocols = 'protocols'  # formats de trame acceptés par le serveur (envoyé avec giveTempNickname)
+    protocol = 'protocol'    # format choisi par le client (requestConnection) et confirmé par le serveur
+    keyRequesters = 'keyRequesters' # requestKey : [(numéro de la demande, pseudo, clé publique), ...]
+    groupKeys = 'groupKeys'  # shareGroupKey : [(numéro de la demande, clé de groupe chiffrée), ...]
+    fileId = 'fileId'        # identifiant d'un fichier proposé (hexadécimal, choisi par l'expéditeur)
+    fileSize = 'fileSize'    # taille du fichier en clair (octets)
+    chunkSize = 'chunkSize'  # taille des morceaux en clair (octets)
+    offset = 'offset'        # position du premier morceau demandé ou envoyé (octets)
+    count = 'count'          # nombre de morceaux demandés
+    seq = 'seq'              # numéro de séquence d'un message dans son groupe (croissant, attribué par le serveur)
+    lastSeqs = 'lastSeqs'    # {groupe: dernière séquence reçue sans trou} : reconnexion et accusés de réception
+    groupsVersion = 'groupsVersion' # version de l'annuaire des groupes (requestConnection : le client sait lire les pages et les changements)
+    groupsAdded = 'groupsAdded'     # groupsChanged : noms des groupes créés
+    groupsRemoved = 'groupsRemoved' # groupsChanged : noms des groupes supprimés
+    heldKeys = 'heldKeys'    # requestConnection : groupes dont le client a encore la clé
 
 
 class ErrorType:
@@ -50,18 +89,264 @@ class ErrorType:
     groupNameTaken = "groupNameTaken"
     emptyGroup = "emptyGroup"
     alreadyInGroup = "alreadyInGroup" # si l'utilisateur est déjà dans le groupe ciblé
+    joinTimeout = "joinTimeout" # aucun membre du groupe n'a fourni la clé à temps
+    fileUnavailable = "fileUnavailable" # fichier inconnu, ou expéditeur déconnecté
+    serverFull = "serverFull"   # trop de connexions ouvertes : la connexion est refusée
+    groupKeyUnavailable = "groupKeyUnavailable" # shareGroupKey : le membre sollicité n'a pas la clé du groupe
 
 
-def encode_full_message(msg: dict) -> bytes:
-    dictToStr = json.dumps(msg)
+# Formats de trame. Le JSON reste le format par défaut et de repli ;
+# le format binaire est négocié à la connexion (voir giveTempNickname / requestConnection).
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "bin1"
+SUPPORTED_PROTOCOLS = [PROTOCOL_BINARY, PROTOCOL_JSON]
+
+
+def encode_full_message(msg: dict, protocol: str = PROTOCOL_JSON) -> bytes:
+    if protocol == PROTOCOL_BINARY:
+        return encode_binary_message(msg)
+
+    # format historique : la liste des groupes circule en repr python
+    groups = msg.get(EntryForFormatedMessage.groupsList)
+    if isinstance(groups, list):
+        msg = dict(msg)
+        msg[EntryForFormatedMessage.groupsList] = f"{groups}"
+
+    dictToStr = json.dumps(msg, default=json_default)
     return dictToStr.encode('utf-8')
 
 
+# Le format est reconnu au premier octet : '{' pour le JSON, numéro de version pour le binaire
 def decode_full_message(msg: bytes) -> dict:
-    bytesToStr = msg.decode('utf-8')
+    if msg[:1] == BINARY_VERSION:
+        return decode_binary_message(msg)
+
+    bytesToStr = bytes(msg).decode('utf-8')
     return json.loads(bytesToStr)
 
 
+# les octets bruts (chiffrés venant d'un client binaire) passent en base64 dans le JSON
+def json_default(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('utf-8')
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+# groupsList : repr python (JSON) ou vraie liste (binaire)
+def parse_groups_list(groups) -> list:
+    if isinstance(groups, str):
+        return ast.literal_eval(groups)
+    return list(groups)
+
+
+# Format binaire, version 1 :
+#   [version][nombre d'entrées] puis pour chaque entrée [code de la clé][valeur typée]
+# Les clés, les actions et les types d'erreur sont des codes sur un octet ;
+# le contenu chiffré et les clés RSA/de groupe circulent en octets bruts.
+BINARY_VERSION = b'\x01'
+
+# L'ordre de ces tables fixe les codes : on ne fait qu'ajouter à la fin.
+BINARY_KEYS = (
+    EntryForFormatedMessage.sender, EntryForFormatedMessage.target, EntryForFormatedMessage.content,
+    EntryForFormatedMessage.action, EntryForFormatedMessage.errorType, EntryForFormatedMessage.nickname,
+    EntryForFormatedMessage.publicKey, EntryForFormatedMessage.keyRequester, EntryForFormatedMessage.groupsList,
+    EntryForFormatedMessage.groupName, EntryForFormatedMessage.groupKey, EntryForFormatedMessage.protocols,
+    EntryForFormatedMessage.protocol, EntryForFormatedMessage.keyRequesters, EntryForFormatedMessage.groupKeys,
+    EntryForFormatedMessage.fileId, EntryForFormatedMessage.fileSize, EntryForFormatedMessage.chunkSize,
+    EntryForFormatedMessage.offset, EntryForFormatedMessage.count,
+    EntryForFormatedMessage.seq, EntryForFormatedMessage.lastSeqs,
+    EntryForFormatedMessage.groupsVersion, EntryForFormatedMessage.groupsAdded, EntryForFormatedMessage.groupsRemoved,
+    EntryForFormatedMessage.heldKeys,
+)
+BINARY_ATOMS = (
+    "server", "",
+    ServerAction.error, ServerAction.acceptConnection, ServerAction.acceptReconnection, ServerAction.info,
+    ServerAction.giveTempNickname, ServerAction.joinGroup, ServerAction.leaveGroup, ServerAction.shareGroups,
+    ServerAction.requestKey, ServerAction.disconnect,
+    ClientAction.requestConnection, ClientAction.sharePublicKey, ClientAction.shareGroupKey,
+    ClientAction.requestJoinGroup, ClientAction.requestAddGroup, ClientAction.requestLeaveGroup,
+    ClientAction.requestDisconnection,
+    ErrorType.nicknameTaken, ErrorType.alreadyConnected, ErrorType.groupNameTaken, ErrorType.emptyGroup,
+    ErrorType.alreadyInGroup,
+    PROTOCOL_JSON, PROTOCOL_BINARY,
+    ErrorType.joinTimeout,
+    ServerAction.fileOffer, ServerAction.fileChunksRequested, ServerAction.fileChunk,
+    ClientAction.offerFile, ClientAction.requestFileChunks, ClientAction.shareFileChunk,
+    ErrorType.fileUnavailable,
+    ErrorType.serverFull,
+    ServerAction.ping, ServerAction.pong, # aussi ClientAction.ping / ClientAction.pong
+    ClientAction.ackMessages,
+    ServerAction.groupsChanged, ServerAction.groupsPage, ClientAction.requestGroups,
+    ErrorType.groupKeyUnavailable,
+)
+# valeurs contenant des clés en hexadécimal : transportées en octets bruts
+BINARY_HEX_KEYS = {EntryForFormatedMessage.publicKey, EntryForFormatedMessage.keyRequester, EntryForFormatedMessage.groupKey,
+                   EntryForFormatedMessage.keyRequesters, EntryForFormatedMessage.groupKeys, EntryForFormatedMessage.fileId}
+
+KEY_CODES = {key: code for code, key in enumerate(BINARY_KEYS)}
+ATOM_CODES = {atom: code for code, atom in enumerate(BINARY_ATOMS)}
+UNKNOWN_KEY = 0xFF
+
+T_NONE, T_TRUE, T_FALSE, T_INT, T_FLOAT, T_STR, T_BYTES, T_ATOM, T_HEX, T_HEX_ODD, T_LIST, T_DICT = range(12)
+
+U8 = struct.Struct('>B')
+U16 = struct.Struct('>H')
+U32 = struct.Struct('>I')
+FLOAT = struct.Struct('>d')
+HEADER = struct.Struct('>cB')
+
+
+def encode_binary_message(msg: dict) -> bytes:
+    parts = [HEADER.pack(BINARY_VERSION, len(msg))]
+    append = parts.append
+    for key, value in msg.items():
+        code = KEY_CODES.get(key)
+        if code is None:
+            append(U8.pack(UNKNOWN_KEY))
+            encode_binary_value(key, parts, False)
+        else:
+            append(U8.pack(code))
+        encode_binary_value(value, parts, key in BINARY_HEX_KEYS)
+    return b''.join(parts)
+
+
+# longueur sur 1 octet si < 255, sinon 0xFF suivi de 4 octets
+def encode_lenght(lenght: int, parts: list):
+    if lenght < 0xFF:
+        parts.append(U8.pack(lenght))
+    else:
+        parts.append(b'\xff' + U32.pack(lenght))
+
+
+def encode_binary_value(value, parts: list, hex_values: bool):
+    if isinstance(value, str):
+        atom = ATOM_CODES.get(value)
+        if atom is not None:
+            parts.append(bytes((T_ATOM, atom)))
+            return
+        raw = hex_to_bytes(value) if hex_values else None
+        if raw is not None:
+            # nombre impair de chiffres : un zéro est ajouté devant, retiré au décodage
+            parts.append(bytes((T_HEX_ODD if len(value) % 2 else T_HEX,)))
+            encode_lenght(len(raw), parts)
+            parts.append(raw)
+            return
+        raw = value.encode('utf-8')
+        parts.append(bytes((T_STR,)))
+        encode_lenght(len(raw), parts)
+        parts.append(raw)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        parts.append(bytes((T_BYTES,)))
+        encode_lenght(len(value), parts)
+        parts.append(value)
+    elif value is None:
+        parts.append(bytes((T_NONE,)))
+    elif value is True:
+        parts.append(bytes((T_TRUE,)))
+    elif value is False:
+        parts.append(bytes((T_FALSE,)))
+    elif isinstance(value, int):
+        raw = value.to_bytes((value.bit_length() + 8) // 8, 'big', signed=True)
+        parts.append(bytes((T_INT, len(raw))))
+        parts.append(raw)
+    elif isinstance(value, float):
+        parts.append(bytes((T_FLOAT,)))
+        parts.append(FLOAT.pack(value))
+    elif isinstance(value, (list, tuple)):
+        parts.append(bytes((T_LIST,)))
+        encode_lenght(len(value), parts)
+        for item in value:
+            encode_binary_value(item, parts, hex_values)
+    elif isinstance(value, dict):
+        parts.append(bytes((T_DICT,)))
+        encode_lenght(len(value), parts)
+        for key, item in value.items():
+            encode_binary_value(key, parts, False)
+            encode_binary_value(item, parts, hex_values)
+    else:
+        raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+# hexadécimal en minuscules (format de rsa.int_rsa_key_to_hex) -> octets, ou None si l'aller-retour
+# ne redonnerait pas exactement la même chaîne (majuscules, espaces, pas de l'hexadécimal...)
+def hex_to_bytes(value: str) -> bytes | None:
+    odd = len(value) % 2
+    try:
+        raw = bytes.fromhex('0' + value if odd else value)
+    except ValueError:
+        return None
+    if not raw or len(raw) * 2 != len(value) + odd or value.lower() != value:
+        return None
+    return raw
+
+
+def decode_binary_message(msg: bytes) -> dict:
+    data = memoryview(msg)
+    count = data[1]
+    offset = 2
+    message = {}
+    for _ in range(count):
+        code = data[offset]
+        offset += 1
+        if code == UNKNOWN_KEY:
+            key, offset = decode_binary_value(data, offset)
+        else:
+            key = BINARY_KEYS[code]
+        message[key], offset = decode_binary_value(data, offset)
+    return message
+
+
+def decode_lenght(data: memoryview, offset: int) -> tuple[int, int]:
+    lenght = data[offset]
+    if lenght < 0xFF:
+        return lenght, offset + 1
+    return U32.unpack_from(data, offset + 1)[0], offset + 5
+
+
+def decode_binary_value(data: memoryview, offset: int):
+    tag = data[offset]
+    offset += 1
+
+    if tag == T_ATOM:
+        return BINARY_ATOMS[data[offset]], offset + 1
+    if tag == T_STR:
+        lenght, offset = decode_lenght(data, offset)
+        return str(data[offset:offset + lenght], 'utf-8'), offset + lenght
+    if tag == T_BYTES:
+        lenght, offset = decode_lenght(data, offset)
+        return bytes(data[offset:offset + lenght]), offset + lenght
+    if tag == T_HEX or tag == T_HEX_ODD:
+        lenght, offset = decode_lenght(data, offset)
+        value = data[offset:offset + lenght].hex()
+        return (value[1:] if tag == T_HEX_ODD else value), offset + lenght
+    if tag == T_INT:
+        lenght = data[offset]
+        return int.from_bytes(data[offset + 1:offset + 1 + lenght], 'big', signed=True), offset + 1 + lenght
+    if tag == T_LIST:
+        lenght, offset = decode_lenght(data, offset)
+        items = []
+        for _ in range(lenght):
+            item, offset = decode_binary_value(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == T_DICT:
+        lenght, offset = decode_lenght(data, offset)
+        items = {}
+        for _ in range(lenght):
+            key, offset = decode_binary_value(data, offset)
+            items[key], offset = decode_binary_value(data, offset)
+        return items, offset
+    if tag == T_FLOAT:
+        return FLOAT.unpack_from(data, offset)[0], offset + 8
+    if tag == T_NONE:
+        return None, offset
+    if tag == T_TRUE:
+        return True, offset
+    if tag == T_FALSE:
+        return False, offset
+    raise ValueError(f"Type inconnu dans la trame binaire : {tag}")
+
+
 def formate_message(sender, target, entries: dict = {}) -> dict:
     full_message = {
         EntryForFormatedMessage.sender : sender,
@@ -76,35 +361,67 @@ def formate_message(sender, target, entries: dict = {}) -> dict:
 
 # Protocole to send a message
 # It MUST be formated BEFORE this function
-def send_message(sckt: socket.socket, sender, target, entries: dict = {}):
+def send_message(sckt: socket.socket, sender, target, entries: dict = {}, protocol: str = PROTOCOL_JSON):
     if not sckt:
         return
 
     try:
-        #formate message
-        msg_formated = formate_message(sender, target, entries)
+        #formate and encode message
+        frame = encode_frame(sender, target, entries, protocol)
+        #send the size of the message, then the message
+        write_frame(sckt, frame)
+
+    except Exception as e:
+        chat_log.warning(Category.net, "Erreur lors de l'envoi du message : %s", e)
 
-        #DEBUG show message
-        show_message(msg_formated, "SEND MESSAGE")
 
-        #encode message
-        encoded_msg = encode_full_message(msg_formated)
-        #send the size of the message
-        message_lenght = len(encoded_msg)
-        sckt.send(message_lenght.to_bytes(4, byteorder='big'))
-        #send the message
-        sckt.send(encoded_msg)
+# Encode un message une seule fois : (taille sur 4 octets, message encodé).
+# La trame est immuable et peut être envoyée telle quelle à autant de sockets que nécessaire.
+def encode_frame(sender, target, entries: dict = {}, protocol: str = PROTOCOL_JSON) -> tuple[bytes, bytes]:
+    msg_formated = formate_message(sender, target, entries)
+
+    #DEBUG show message
+    show_message(msg_formated, "SEND MESSAGE")
 
+    encoded_msg = encode_full_message(msg_formated, protocol)
+    message_lenght = len(encoded_msg)
+    return (message_lenght.to_bytes(4, byteorder='big'), encoded_msg)
+
+
+# Envoie une trame déjà encodée, en rattrapant les erreurs comme send_message
+def send_frame(sckt: socket.socket, frame: tuple[bytes, bytes]):
+    if not sckt:
+        return
+
+    try:
+        write_frame(sckt, frame)
     except Exception as e:
-        print(f"Erreur lors de l'envoi du message : {e}")
+        chat_log.warning(Category.net, "Erreur lors de l'envoi du message : %s", e)
+
+
+# Écriture vectorisée : en-tête et message partent en un seul appel système, sans les concaténer
+def write_frame(sckt: socket.socket, frame: tuple[bytes, ...]):
+    sendmsg = getattr(sckt, 'sendmsg', None)
+    if sendmsg is None: # sendmsg n'existe pas sous Windows
+        sckt.sendall(b''.join(frame))
+        return
 
+    sent = sendmsg(frame)
+    if sent < sum(len(buffer) for buffer in frame):
+        # envoi partiel : on termine avec sendall
+        sckt.sendall(b''.join(frame)[sent:])
 
-def receive_message(sckt: socket.socket) -> dict:
-    #get the size of the message
-    print("Listen message...")
-    message_lenght = int.from_bytes(sckt.recv(4), byteorder='big')
-    #get the message
-    message = decode_full_message(sckt.recv(message_lenght))
+
+def receive_message(sckt: socket.socket, reader: 'FrameReader' = None) -> dict:
+    if reader is None:
+        # un lecteur par socket : les octets déjà reçus de la trame suivante ne sont pas perdus
+        reader = frame_readers.get(sckt)
+        if reader is None:
+            reader = frame_readers[sckt] = FrameReader()
+
+    chat_log.debug(Category.net, "Listen message...")
+    #get the message, whatever the number of recv() needed
+    message = decode_full_message(reader.read_frame(sckt))
 
     #DEBUG show message
     show_message(message, "MESSAGE RECEIVED")
@@ -112,10 +429,110 @@ def receive_message(sckt: socket.socket) -> dict:
     return message
 
 
+class FrameTooLarge(ValueError):
+    pass
+
+
+# Découpe un flux TCP en trames [taille sur 4 octets][message].
+# Un recv() peut renvoyer une partie de trame comme plusieurs trames : les octets reçus
+# s'accumulent dans un tampon réutilisé d'une lecture à l'autre (recv_into, sans copie),
+# et une taille annoncée au-delà de max_frame_size est refusée avant toute allocation.
+class FrameReader:
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, buffer_size: int = 64 << 10):
+        self.max_frame_size = max_frame_size
+        self.initial_size = buffer_size
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0 # début des octets reçus non encore consommés
+        self.end = 0   # fin des octets reçus
+
+
+    # zone libre du tampon où écrire les prochains octets (recv_into, BufferedProtocol.get_buffer)
+    def get_buffer(self, sizehint: int = -1) -> memoryview:
+        if self.start == self.end:
+            self.start = self.end = 0
+            if len(self.buffer) > self.initial_size:
+                # la grosse trame est passée : on rend la mémoire
+                self.resize(self.initial_size)
+
+        needed = self.pending_frame_size()
+        if needed > len(self.buffer):
+            self.resize(max(needed, 2 * len(self.buffer)))
+        elif len(self.buffer) - self.start < needed or self.end == len(self.buffer):
+            # la trame tient dans le tampon mais pas après start : on ramène les octets restants au début
+            lenght = self.end - self.start
+            self.buffer[:lenght] = self.view[self.start:self.end]
+            self.start, self.end = 0, lenght
+
+        return self.view[self.end:]
+
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self.end += nbytes
+
+
+    # taille totale (en-tête compris) de la trame en cours de réception
+    def pending_frame_size(self) -> int:
+        if self.end - self.start < 4:
+            return 4
+        message_lenght = int.from_bytes(self.view[self.start:self.start + 4], byteorder='big')
+        if message_lenght > self.max_frame_size:
+            raise FrameTooLarge(f"Trame de {message_lenght} octets refusée (max {self.max_frame_size}).")
+        return 4 + message_lenght
+
+
+    def resize(self, size: int) -> None:
+        lenght = self.end - self.start
+        buffer = bytearray(size)
+        buffer[:lenght] = self.view[self.start:self.end]
+        self.buffer, self.view = buffer, memoryview(buffer)
+        self.start, self.end = 0, lenght
+
+
+    # trame complète suivante déjà reçue, ou None. La vue renvoyée reste valable jusqu'à la prochaine lecture.
+    def next_frame(self) -> memoryview | None:
+        frame_size = self.pending_frame_size()
+        if self.end - self.start < frame_size:
+            return None
+        frame = self.view[self.start + 4:self.start + frame_size]
+        self.start += frame_size
+        return frame
+
+
+    def frames(self):
+        frame = self.next_frame()
+        while frame is not None:
+            yield frame
+            frame = self.next_frame()
+
+
+    # lecture bloquante d'une trame complète sur un socket
+    def read_frame(self, sckt: socket.socket) -> memoryview:
+        frame = self.next_frame()
+        while frame is None:
+            nbytes = sckt.recv_into(self.get_buffer())
+            if nbytes == 0:
+                raise ConnectionError("Connexion fermée par le correspondant.")
+            self.buffer_updated(nbytes)
+            frame = self.next_frame()
+        return frame
+
+
+frame_readers: 'weakref.WeakKeyDictionary[socket.socket, FrameReader]' = weakref.WeakKeyDictionary()
+
+
+# Affichage d'une trame, seulement si la catégorie "net" est en debug (CHAT_LOG="net=debug").
+# Le texte n'est construit que par le thread d'écriture du journal.
 def show_message(msg: dict, title: str):
-    print("\n" + "="*20)
-    print(f"{title:^20}")
-    print("= "*10)
+    if chat_log.enabled(Category.net, chat_log.DEBUG):
+        chat_log.debug(Category.net, "%s", MessageDump(msg, title))
+
+
+class MessageDump:
+    def __init__(self, msg: dict, title: str):
+        self.msg = msg
+        self.title = title
 
-    print("\n".join([f"{key}: {value}" for key, value in msg.items()]))
-    print("="*20 + '\n')
+    def __str__(self) -> str:
+        lines = "\n".join([f"{key}: {value}" for key, value in self.msg.items()])
+        return f"{self.title}\n{lines}"
@@ -0,0 +1,121 @@
+import os
+import struct
+import time
+from typing import Iterator
+import common_lib
+import secret_box
+
+
+# Chaque morceau chiffré commence par sa position dans le fichier : un morceau rejoué
+# ou déplacé par le serveur ne peut pas passer pour un autre.
+CHUNK_HEADER = struct.Struct('>Q')
+
+
+# Fichier proposé par ce client : relu morceau par morceau à chaque demande, jamais chargé en entier.
+# Les tampons sont alloués une fois, la mémoire ne dépend pas de la taille du fichier.
+class Upload:
+    def __init__(self, id: str, path: str, group_name: str, chunk_size: int = common_lib.FILE_CHUNK_SIZE):
+        self.id = id
+        self.path = path
+        self.group_name = group_name
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        self.plain = bytearray(CHUNK_HEADER.size + chunk_size)
+        self.cipher = bytearray(CHUNK_HEADER.size + chunk_size + secret_box.OVERHEAD)
+
+
+    # les count morceaux à partir de offset, chiffrés tour à tour dans le même tampon :
+    # chaque morceau doit être envoyé avant de demander le suivant
+    def chunks(self, box, offset: int, count: int) -> Iterator[tuple[int, memoryview]]:
+        plain = memoryview(self.plain)
+        cipher = memoryview(self.cipher)
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            for _ in range(count):
+                lenght = file.readinto(plain[CHUNK_HEADER.size:])
+                if not lenght:
+                    break
+                CHUNK_HEADER.pack_into(self.plain, 0, offset)
+                size = secret_box.encrypt_into(box, plain[:CHUNK_HEADER.size + lenght], cipher)
+                yield offset, cipher[:size]
+                offset += lenght
+
+
+
+# Fichier en cours de réception : les morceaux sont écrits au fil de l'eau dans <chemin>.part,
+# renommé une fois le fichier complet. Une nouvelle tentative reprend à la fin du fichier partiel.
+class Download:
+    def __init__(self, id: str, path: str, size: int, chunk_size: int, window: int = common_lib.FILE_WINDOW):
+        self.id = id
+        self.path = path
+        self.part_path = path + '.part'
+        self.size = size
+        self.chunk_size = chunk_size
+        self.window = window
+
+        # reprise : seuls les morceaux complets du fichier partiel sont gardés
+        try:
+            self.received = os.path.getsize(self.part_path) // chunk_size * chunk_size
+        except FileNotFoundError:
+            self.received = 0
+        if self.received > size:
+            self.received = 0
+        self.file = open(self.part_path, 'r+b' if self.received else 'wb')
+        self.file.truncate(self.received)
+        self.file.seek(self.received)
+
+        self.requested = self.received # fin de la dernière demande
+        self.last_progress = time.monotonic()
+
+
+    @property
+    def done(self) -> bool:
+        return self.received >= self.size
+
+
+    # déchiffre et écrit le morceau s'il est celui attendu ; les autres (doublons après
+    # une nouvelle demande, morceau perdu avant eux) sont ignorés
+    def write(self, box, offset: int, cipher: bytes) -> bool:
+        if offset != self.received:
+            return False
+        plain = memoryview(secret_box.decrypt_bytes(box, cipher))
+        if len(plain) <= CHUNK_HEADER.size or CHUNK_HEADER.unpack_from(plain)[0] != offset:
+            raise ValueError("Morceau de fichier altéré.")
+        data = plain[CHUNK_HEADER.size:]
+        if len(data) > self.size - offset:
+            raise ValueError("Morceau de fichier trop long.")
+
+        self.file.write(data)
+        self.received += len(data)
+        self.last_progress = time.monotonic()
+        return True
+
+
+    # prochaine demande (position, nombre de morceaux) pour garder jusqu'à window morceaux en route,
+    # ou None si assez de morceaux sont déjà demandés. On redemande dès que la moitié est arrivée.
+    def next_request(self) -> tuple[int, int] | None:
+        if self.requested >= self.size:
+            return None
+        in_flight = -(-(self.requested - self.received) // self.chunk_size)
+        if in_flight > self.window // 2:
+            return None
+
+        remaining = -(-(self.size - self.requested) // self.chunk_size)
+        count = min(self.window - in_flight, remaining)
+        offset = self.requested
+        self.requested = min(self.size, offset + count * self.chunk_size)
+        return offset, count
+
+
+    # plus rien n'arrive (morceaux jetés en route) : la prochaine demande repart du dernier morceau reçu
+    def restart(self) -> None:
+        self.requested = self.received
+
+
+    def finish(self) -> None:
+        self.file.close()
+        os.replace(self.part_path, self.path)
+
+
+    def close(self) -> None:
+        self.file.close()
@@ -0,0 +1,68 @@
+import bisect
+import threading
+
+
+# Annuaire des groupes, versionné : chaque ajout ou suppression incrémente la version.
+# Les clients reçoivent la liste par pages à la connexion, puis seulement les changements
+# (groupsChanged), au lieu de la liste complète à chaque création de groupe.
+# Les pages sont repérées par la version d'ajout du dernier groupe reçu : une suppression
+# pendant la lecture ne décale pas les pages suivantes.
+class GroupDirectory:
+    def __init__(self, names: list[str] = ()):
+        self.version = 0
+        self.names: dict[str, int] = {}        # nom -> version de son ajout
+        self.order: list[tuple[int, str]] = [] # (version d'ajout, nom), croissant ; les supprimés y restent un temps
+        self.removed = 0                       # entrées de self.order dont le groupe n'existe plus
+        # moteur threadé : un thread par client ; le serveur le garde aussi pendant l'envoi des changements,
+        # pour que chaque client les reçoive dans l'ordre des versions
+        self.lock = threading.RLock()
+        for name in names:
+            self.add(name)
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+
+    def __iter__(self):
+        return iter(tuple(self.names))
+
+
+    def add(self, name: str) -> int:
+        with self.lock:
+            self.version += 1
+            self.names[name] = self.version
+            self.order.append((self.version, name))
+            return self.version
+
+
+    def remove(self, name: str) -> int:
+        with self.lock:
+            if self.names.pop(name, None) is None:
+                return self.version
+            self.version += 1
+            self.removed += 1
+            # les entrées supprimées sont retirées d'un coup quand elles deviennent majoritaires
+            if self.removed * 2 > len(self.order):
+                self.order = [(version, name) for version, name in self.order if self.names.get(name) == version]
+                self.removed = 0
+            return self.version
+
+
+    # (noms, curseur de la page suivante ou None, version) : au plus limit groupes ajoutés après le curseur
+    def page(self, after: int = 0, limit: int = 256) -> tuple[list[str], int | None, int]:
+        with self.lock:
+            names = []
+            index = bisect.bisect_right(self.order, after, key=lambda entry: entry[0])
+            while index < len(self.order) and len(names) < limit:
+                version, name = self.order[index]
+                if self.names.get(name) == version:
+                    names.append(name)
+                    after = version
+                index += 1
+            # s'il ne reste que des groupes supprimés, la page suivante sera vide
+            return names, after if index < len(self.order) else None, self.version
@@ -0,0 +1,92 @@
+import threading
+import time
+
+
+# Statistiques d'un type de message : appels, erreurs, temps total et maximal, histogramme des durées.
+# L'histogramme a une case par puissance de 2 de microsecondes (case i : durées < 2^i µs) :
+# enregistrer une durée coûte un bit_length() et une addition, les percentiles restent justes à un facteur 2 près.
+class ActionStats:
+    __slots__ = ('errors', 'total_ns', 'max_ns', 'buckets', 'lock')
+
+    def __init__(self, lock: threading.Lock = None):
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * 64 # assez pour toute durée en nanosecondes sur 64 bits
+        self.lock = lock
+
+
+    @property
+    def calls(self) -> int:
+        return sum(self.buckets)
+
+
+    def record(self, elapsed_ns: int) -> None:
+        if self.lock is None:
+            self.add(elapsed_ns)
+            return
+        with self.lock:
+            self.add(elapsed_ns)
+
+
+    def record_error(self) -> None:
+        if self.lock is None:
+            self.errors += 1
+            return
+        with self.lock:
+            self.errors += 1
+
+
+    def add(self, elapsed_ns: int) -> None:
+        self.total_ns += elapsed_ns
+        self.buckets[(elapsed_ns // 1000).bit_length()] += 1
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+
+    # borne supérieure (µs) de la case qui contient le percentile demandé, sans dépasser le maximum observé
+    def percentile(self, fraction: float) -> float:
+        rank = fraction * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(1 << i, round(self.max_ns / 1000, 1))
+        return 0
+
+
+    def summary(self) -> dict:
+        calls = self.calls
+        return {
+            'calls': calls,
+            'errors': self.errors,
+            'mean_us': round(self.total_ns / calls / 1000, 1) if calls else 0.0,
+            'p50_us': self.percentile(0.5),
+            'p99_us': self.percentile(0.99),
+            'max_us': round(self.max_ns / 1000, 1),
+            'total_ms': round(self.total_ns / 1e6, 1),
+        }
+
+
+
+# Temps passé par le serveur dans chaque type de message reçu (actions et messages de groupe).
+# Une ActionStats par action, créée à la première utilisation ; l'appelant la garde et y enregistre ses durées.
+# Sans threads (moteur asyncio : tous les messages sont traités par la boucle), aucun verrou sur ce chemin.
+class HandlerMetrics:
+    def __init__(self, threads: bool = True):
+        self.actions: dict[str, ActionStats] = {}
+        self.lock = threading.Lock() if threads else None # moteur threadé : un thread par client
+        self.since = time.monotonic()
+
+
+    def stats(self, action: str) -> ActionStats:
+        stats = self.actions.get(action)
+        if stats is None:
+            stats = self.actions.setdefault(action, ActionStats(self.lock))
+        return stats
+
+
+    # {action: résumé}, les actions les plus coûteuses en premier
+    def summary(self) -> dict:
+        actions = sorted(tuple(self.actions.items()), key=lambda item: item[1].total_ns, reverse=True)
+        return {action: stats.summary() for action, stats in actions}
@@ -0,0 +1,144 @@
+import collections
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+# Historique des conversations côté client.
+# - en mémoire : les `ring_size` derniers messages de chaque groupe, déjà déchiffrés (taille bornée)
+# - sur disque : tous les messages dans une base SQLite, encore chiffrés avec la clé du groupe ;
+#   les plus anciens sont relus page par page quand l'utilisateur remonte la conversation.
+#   Les clés des groupes y sont aussi, chiffrées avec la clé publique RSA de l'utilisateur : seule
+#   sa clé privée les relit, et l'historique reste lisible d'un lancement à l'autre.
+# Un message est un tuple (id, expéditeur, contenu) ; les id croissent dans l'ordre d'arrivée.
+class HistoryStore:
+    def __init__(self, path: str = ':memory:', ring_size: int = 200):
+        self.ring_size = ring_size
+        self.rings: dict[str, collections.deque] = {}
+        # écrit depuis le thread réseau, lu depuis l'interface
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            group_name TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            content BLOB NOT NULL,
+            time REAL NOT NULL)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS messages_by_group ON messages (group_name, id)')
+        # dernière séquence reçue sans trou de chaque groupe, annoncée au serveur à la reconnexion
+        self.db.execute('''CREATE TABLE IF NOT EXISTS group_seqs (
+            group_name TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL)''')
+        # clé de chaque groupe chiffrée pour owner (module n de la clé publique, en hexadécimal) :
+        # une autre paire de clés pour le même pseudo ne relit pas ces clés
+        self.db.execute('''CREATE TABLE IF NOT EXISTS group_keys (
+            group_name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            key TEXT NOT NULL)''')
+        self.db.commit()
+
+
+    # content : le message en clair (mémoire), cipher : le message chiffré tel que reçu (disque).
+    # seq : dernière séquence du groupe reçue sans trou, écrite dans la même transaction que le message
+    # (après un arrêt brutal, le message n'est ni perdu ni redemandé au serveur)
+    def append(self, group: str, sender: str, content: str, cipher: str | bytes, seq: int = None) -> int:
+        with self.lock:
+            cursor = self.db.execute(
+                'INSERT INTO messages (group_name, sender, content, time) VALUES (?, ?, ?, ?)',
+                (group, sender, cipher, time.time())
+            )
+            if seq is not None:
+                self.db.execute('INSERT OR REPLACE INTO group_seqs (group_name, seq) VALUES (?, ?)', (group, seq))
+            self.db.commit()
+            id = cursor.lastrowid
+
+            # un groupe jamais ouvert n'a pas encore d'anneau : il sera rempli depuis le disque
+            ring = self.rings.get(group)
+            if ring is not None:
+                ring.append((id, sender, content))
+            return id
+
+
+    # les derniers messages du groupe, sans accès disque sauf à la première ouverture
+    def recent(self, group: str, decrypt: Callable) -> list[tuple[int, str, str]]:
+        with self.lock:
+            ring = self.rings.get(group)
+            if ring is None:
+                ring = collections.deque(self.read_page(group, None, self.ring_size, decrypt), maxlen=self.ring_size)
+                self.rings[group] = ring
+            return list(ring)
+
+
+    # une page de messages plus anciens que before_id, du plus ancien au plus récent
+    def page(self, group: str, before_id: int, limit: int, decrypt: Callable) -> list[tuple[int, str, str]]:
+        with self.lock:
+            return self.read_page(group, before_id, limit, decrypt)
+
+
+    def read_page(self, group: str, before_id: int, limit: int, decrypt: Callable) -> list[tuple[int, str, str]]:
+        if before_id is None:
+            rows = self.db.execute(
+                'SELECT id, sender, content FROM messages WHERE group_name = ? ORDER BY id DESC LIMIT ?',
+                (group, limit)
+            ).fetchall()
+        else:
+            rows = self.db.execute(
+                'SELECT id, sender, content FROM messages WHERE group_name = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                (group, before_id, limit)
+            ).fetchall()
+
+        page = []
+        for id, sender, cipher in reversed(rows):
+            try:
+                content = decrypt(cipher)
+            except Exception:
+                # clé du groupe changée depuis (groupe recréé sous le même nom)
+                content = "[message illisible]"
+            page.append((id, sender, content))
+        return page
+
+
+    def last_seqs(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.db.execute('SELECT group_name, seq FROM group_seqs').fetchall())
+
+
+    def save_seqs(self, seqs: dict[str, int]) -> None:
+        if not seqs:
+            return
+        with self.lock:
+            self.db.executemany('INSERT OR REPLACE INTO group_seqs (group_name, seq) VALUES (?, ?)', seqs.items())
+            self.db.commit()
+
+
+    def forget_seq(self, group: str) -> None:
+        with self.lock:
+            self.db.execute('DELETE FROM group_seqs WHERE group_name = ?', (group,))
+            self.db.commit()
+
+
+    # {groupe: clé chiffrée} pour la clé publique owner
+    def group_keys(self, owner: str) -> dict[str, str]:
+        with self.lock:
+            return dict(self.db.execute('SELECT group_name, key FROM group_keys WHERE owner = ?', (owner,)).fetchall())
+
+
+    def save_group_key(self, group: str, owner: str, key: str) -> None:
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO group_keys (group_name, owner, key) VALUES (?, ?, ?)', (group, owner, key))
+            self.db.commit()
+
+
+    def forget_group_key(self, group: str) -> None:
+        with self.lock:
+            self.db.execute('DELETE FROM group_keys WHERE group_name = ?', (group,))
+            self.db.commit()
+
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,54 @@
+import itertools
+from typing import Optional
+from registry import Client
+
+
+
+# Une demande d'entrée dans un groupe, en attente de la clé du groupe.
+# Elle est identifiée par un numéro : la réponse d'un membre (shareGroupKey) cite ce numéro.
+class PendingJoin ():
+    def __init__(self, id: int, requester: Client, group_name: str):
+        self.id = id
+        self.requester = requester
+        self.group_name = group_name
+        self.attempts = 0           # nombre de sollicitations jusqu'ici
+        self.asked: dict[Client, float] = {} # membres sollicités -> instant (time.monotonic) de la demande
+
+
+
+# Demandes en attente, par numéro et par (pseudo, groupe) : un même client n'a qu'une demande par groupe
+class JoinTable ():
+    def __init__(self):
+        self.by_id: dict[int, PendingJoin] = {}
+        self.by_requester: dict[tuple[str, str], PendingJoin] = {}
+        self.ids = itertools.count(1)
+
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+
+    # None si le client a déjà une demande en cours pour ce groupe
+    def add(self, requester: Client, group_name: str) -> Optional[PendingJoin]:
+        key = (requester.nickname, group_name)
+        if key in self.by_requester:
+            return None
+        pending = PendingJoin(next(self.ids), requester, group_name)
+        self.by_id[pending.id] = pending
+        self.by_requester[key] = pending
+        return pending
+
+
+    def get(self, id: int) -> Optional[PendingJoin]:
+        return self.by_id.get(id)
+
+
+    def get_by_requester(self, nickname: str, group_name: str) -> Optional[PendingJoin]:
+        return self.by_requester.get((nickname, group_name))
+
+
+    def remove(self, pending: PendingJoin) -> None:
+        self.by_id.pop(pending.id, None)
+        key = (pending.requester.nickname, pending.group_name)
+        if self.by_requester.get(key) is pending:
+            del self.by_requester[key]
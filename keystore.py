@@ -0,0 +1,148 @@
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import threading
+from typing import Callable
+import chat_log
+from chat_log import Category
+import rsa
+
+
+# Paires de clés RSA du client.
+# - la paire d'un pseudo est gardée sur disque (<dossier>/<pseudo en hexadécimal>.key) et relue à la connexion suivante
+# - une paire d'avance (spare.key) est générée dans un processus séparé : la connexion d'un nouveau pseudo
+#   n'attend pas la recherche des nombres premiers, même en 2048 ou 3072 bits.
+#   Le processus n'est lancé qu'à la première demande (prepare ou keypair_for) : créer un KeyStore ne coûte rien,
+#   l'interface appelle prepare() dès son ouverture pour prendre de l'avance.
+# Sans dossier (directory=None), les clés ne sont gardées qu'en mémoire.
+# Les fichiers contiennent la clé privée en clair : ils sont créés lisibles par leur seul propriétaire.
+class KeyStore:
+    SPARE = 'spare'
+
+    def __init__(self, directory: str = 'keys', bits: int = 2048):
+        self.directory = directory
+        self.bits = bits
+        self.keys: dict[str, rsa.RsaKeypair] = {}
+        self.spare: concurrent.futures.Future = None
+        self.lock = threading.Lock()
+        self.pool: concurrent.futures.Executor = None
+        self.closed = False
+
+        if directory is not None:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+
+    # lance la génération d'une paire d'avance, sauf si elle existe déjà (rien une fois fermé)
+    def prepare(self) -> None:
+        with self.lock:
+            if self.spare is not None or self.closed:
+                return
+            keypair = self.read(KeyStore.SPARE)
+            if keypair is not None:
+                self.spare = concurrent.futures.Future()
+                self.spare.set_result(keypair)
+                return
+            if self.pool is None:
+                # "spawn" : le processus de génération ne copie ni les threads ni les sockets du client
+                self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+            self.spare = self.pool.submit(rsa.gen_rsa_keypair, self.bits)
+            self.spare.add_done_callback(self.on_spare_ready)
+
+
+    def on_spare_ready(self, future: concurrent.futures.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.write(KeyStore.SPARE, future.result())
+
+
+    # appelle callback(paire) dès que la paire du pseudo est disponible, sans jamais bloquer l'appelant :
+    # tout de suite si elle est connue, sinon depuis un autre thread à la fin de la génération
+    def keypair_for(self, nickname: str, callback: Callable[[rsa.RsaKeypair], None]) -> None:
+        keypair = self.keys.get(nickname) or self.read(self.file_name(nickname))
+        if keypair is not None:
+            self.keys[nickname] = keypair
+            callback(keypair)
+            return
+
+        self.prepare()
+        with self.lock:
+            future, self.spare = self.spare, None
+        if future is None:
+            chat_log.error(Category.client, "Génération de la clé RSA impossible : trousseau fermé")
+            return
+
+        def assign(future: concurrent.futures.Future):
+            try:
+                keypair = future.result()
+            except concurrent.futures.process.BrokenProcessPool as e:
+                # processus impossible à lancer (ex. script sans garde __main__) : génération dans un thread
+                chat_log.warning(Category.client, "Génération des clés dans un thread : %s", e)
+                with self.lock:
+                    if self.closed:
+                        return
+                    self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+                    retry = self.pool.submit(rsa.gen_rsa_keypair, self.bits)
+                retry.add_done_callback(assign)
+                return
+            except Exception as e:
+                chat_log.error(Category.client, "Génération de la clé RSA impossible : %s", e)
+                return
+            self.keys[nickname] = keypair
+            self.write(self.file_name(nickname), keypair)
+            self.remove(KeyStore.SPARE)
+            callback(keypair)
+            self.prepare() # la suivante, sauf si le trousseau a été fermé entre-temps
+
+        future.add_done_callback(assign)
+
+
+    def file_name(self, nickname: str) -> str:
+        return nickname.encode('utf-8').hex()
+
+
+    def read(self, name: str) -> rsa.RsaKeypair:
+        if self.directory is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{name}.key')) as file:
+                data = json.load(file)
+            private_key = rsa.RsaPrivateKey.from_primes(int(data['p'], 16), int(data['q'], 16), int(data['e'], 16))
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                chat_log.warning(Category.client, "Fichier de clé %s illisible : %s", name, e)
+            return None
+        if private_key.n.bit_length() < self.bits - 1:
+            return None # clé plus petite que la taille demandée : on en génère une nouvelle
+        return ((int(data['e'], 16), private_key.n), private_key)
+
+
+    def write(self, name: str, keypair: rsa.RsaKeypair) -> None:
+        if self.directory is None:
+            return
+        (e, _), private_key = keypair
+        data = {'e': hex(e)[2:], 'p': hex(private_key.p)[2:], 'q': hex(private_key.q)[2:]}
+
+        # écriture dans un fichier temporaire puis renommage : jamais de clé à moitié écrite
+        path = os.path.join(self.directory, f'{name}.key')
+        temp_path = path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_path, path)
+
+
+    def remove(self, name: str) -> None:
+        if self.directory is None:
+            return
+        try:
+            os.remove(os.path.join(self.directory, f'{name}.key'))
+        except FileNotFoundError:
+            pass
+
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
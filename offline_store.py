@@ -0,0 +1,458 @@
+import array
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+from typing import Iterator, Optional
+import chat_log
+from chat_log import Category
+
+
+# Chaque enregistrement : [seq sur 8 octets][horodatage (float) sur 8 octets][taille sur 4 octets]
+# [taille sur 2 octets][pseudo exclu][message]. Le pseudo exclu (souvent vide) est le membre à qui
+# le message n'a pas été diffusé en direct (ignore de broadcast) : il ne lui est pas rejoué non plus.
+RECORD_HEADER = struct.Struct('>QdIH')
+
+# dossier par défaut, aussi celui de l'option --store-dir du serveur
+DEFAULT_STORE_DIR = 'offline_store'
+
+
+# Un fichier segment, en ajout seul. L'index (position de chaque enregistrement)
+# est gardé en mémoire : 8 octets par message, reconstruit au démarrage en relisant le fichier.
+class Segment:
+    def __init__(self, path: str, first_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.offsets = array.array('Q')
+        self.size = 0
+        self.last_time = 0.0
+        self.map: mmap.mmap = None
+        self.map_size = 0
+
+
+    @property
+    def last_seq(self) -> int:
+        return self.first_seq + len(self.offsets) - 1
+
+
+    # relit un segment existant ; un enregistrement incomplet en fin de fichier (crash) est tronqué
+    def load(self) -> None:
+        with open(self.path, 'rb') as file:
+            data = file.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            seq, timestamp, lenght, excluded_lenght = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + excluded_lenght + lenght
+            if end > len(data) or seq != self.first_seq + len(self.offsets):
+                break
+            self.offsets.append(offset)
+            self.last_time = timestamp
+            offset = end
+
+        if offset < len(data):
+            with open(self.path, 'r+b') as file:
+                file.truncate(offset)
+        self.size = offset
+
+
+    # ajoute l'enregistrement à l'index et renvoie ses octets, que l'appelant écrit dans le fichier
+    def add(self, seq: int, timestamp: float, payload: bytes, excluded: bytes = b'') -> bytes:
+        self.offsets.append(self.size)
+        self.size += RECORD_HEADER.size + len(excluded) + len(payload)
+        self.last_time = timestamp
+        return RECORD_HEADER.pack(seq, timestamp, len(payload), len(excluded)) + excluded + payload
+
+
+    # lecture via mmap : seul l'enregistrement demandé est copié en mémoire ; (message, pseudo exclu)
+    def read(self, seq: int) -> tuple[bytes, bytes]:
+        if self.map_size < self.size:
+            self.close()
+            with open(self.path, 'rb') as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.map_size = len(self.map)
+
+        offset = self.offsets[seq - self.first_seq]
+        _, _, lenght, excluded_lenght = RECORD_HEADER.unpack_from(self.map, offset)
+        start = offset + RECORD_HEADER.size + excluded_lenght
+        excluded = self.map[start - excluded_lenght:start] if excluded_lenght else b''
+        return self.map[start:start + lenght], excluded
+
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.map_size = 0
+
+
+
+# Journal d'un groupe : une suite de segments, le dernier est ouvert en écriture.
+# Les messages numérotés pas encore écrits attendent dans pending (voir OfflineStore.append).
+class GroupLog:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments: list[Segment] = []
+        self.file = None
+        self.next_seq = 1
+        self.pending: list[tuple[int, float, bytes, bytes]] = [] # (séquence, horodatage, message, pseudo exclu)
+
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.seg'):
+                    segment = Segment(os.path.join(directory, name), int(name[:-4]))
+                    segment.load()
+                    self.segments.append(segment)
+        if self.segments:
+            self.next_seq = self.segments[-1].last_seq + 1
+
+
+    @property
+    def first_seq(self) -> int:
+        if self.segments:
+            return self.segments[0].first_seq
+        return self.pending[0][0] if self.pending else self.next_seq
+
+
+    # dernière séquence écrite sur disque
+    @property
+    def written_seq(self) -> int:
+        return self.segments[-1].last_seq if self.segments else self.first_seq - 1
+
+
+    @property
+    def size(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+
+    # numérote le message, sans accès disque
+    def enqueue(self, payload: bytes, excluded: bytes = b'') -> int:
+        seq = self.next_seq
+        self.pending.append((seq, time.time(), payload, excluded))
+        self.next_seq += 1
+        return seq
+
+
+    # écrit des messages numérotés à la suite : un write() par segment touché, un fsync au plus
+    def write(self, records: list[tuple[int, float, bytes, bytes]], segment_size: int, fsync: bool) -> None:
+        parts = []
+        for seq, timestamp, payload, excluded in records:
+            if not self.segments or self.segments[-1].size >= segment_size:
+                self.write_parts(parts)
+                self.roll(seq)
+            elif self.file is None:
+                # journal rechargé depuis le disque : on reprend le dernier segment
+                self.file = open(self.segments[-1].path, 'ab', buffering=0)
+            parts.append(self.segments[-1].add(seq, timestamp, payload, excluded))
+        self.write_parts(parts)
+        if fsync and self.file is not None:
+            os.fsync(self.file.fileno())
+
+
+    def write_parts(self, parts: list[bytes]) -> None:
+        if parts:
+            self.file.write(b''.join(parts))
+            parts.clear()
+
+
+    # ferme le segment actif et en ouvre un nouveau, qui commence à first_seq
+    def roll(self, first_seq: int) -> None:
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{first_seq:020d}.seg')
+        self.segments.append(Segment(path, first_seq))
+        self.file = open(path, 'ab', buffering=0)
+
+
+    # lecture sur disque, puis dans les messages pas encore écrits : [(séquence, message, pseudo exclu)]
+    def read(self, from_seq: int, until_seq: int, limit: int) -> list[tuple[int, bytes, bytes]]:
+        page = self.read_written(from_seq, min(until_seq, self.written_seq), limit)
+        seq = page[-1][0] + 1 if page else max(from_seq, self.first_seq)
+        for pending_seq, _, payload, excluded in self.pending:
+            if len(page) >= limit or pending_seq > until_seq:
+                break
+            if pending_seq >= seq:
+                page.append((pending_seq, payload, excluded))
+        return page
+
+
+    def read_written(self, from_seq: int, until_seq: int, limit: int) -> list[tuple[int, bytes, bytes]]:
+        from_seq = max(from_seq, self.first_seq)
+        page = []
+        if from_seq > until_seq:
+            return page
+
+        index = bisect.bisect_right([segment.first_seq for segment in self.segments], from_seq) - 1
+        seq = from_seq
+        while seq <= until_seq and len(page) < limit and index < len(self.segments):
+            segment = self.segments[index]
+            if seq > segment.last_seq:
+                index += 1
+                continue
+            page.append((seq, *segment.read(seq)))
+            seq += 1
+        return page
+
+
+    # supprime le plus ancien segment (jamais le segment actif)
+    def drop_oldest(self) -> bool:
+        if len(self.segments) < 2:
+            return False
+        segment = self.segments.pop(0)
+        segment.close()
+        os.remove(segment.path)
+        return True
+
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        for segment in self.segments:
+            segment.close()
+
+
+
+# Stockage sur disque des messages des groupes, rejoués aux membres qui se reconnectent.
+# Un journal par groupe, numéroté par une séquence croissante (la séquence du message dans le groupe) ;
+# chaque client retient seulement la dernière séquence reçue, ou la première qu'il a manquée hors ligne.
+# append numérote le message en mémoire et rend la main : un thread d'écriture écrit les messages
+# en attente par lots (un write() par groupe et par lot), la diffusion n'attend jamais le disque.
+# Les lectures voient aussi les messages pas encore écrits. Un arrêt brutal perd le dernier lot.
+class OfflineStore:
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, segment_size: int = 4 << 20,
+                 max_group_bytes: int = 256 << 20, max_age: float = 30 * 24 * 3600, fsync: bool = False):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_group_bytes = max_group_bytes # rétention : taille max d'un groupe sur disque
+        self.max_age = max_age                 # rétention : âge max d'un segment (secondes)
+        self.fsync = fsync
+        self.logs: dict[str, GroupLog] = {}
+        self.readers: dict[str, dict[int, int]] = {} # groupe -> {numéro du lecteur: séquence en cours}
+        self.reader_ids = itertools.count(1)
+        # lock : segments sur disque et lecteurs (tenu par le thread d'écriture pendant l'écriture d'un lot)
+        # queue_lock : numérotation et messages en attente, jamais tenu pendant un accès disque
+        # ordre de prise : lock puis queue_lock
+        self.lock = threading.RLock()
+        self.queue_lock = threading.Lock()
+        self.written = threading.Condition(self.queue_lock)
+        self.dirty: dict[str, GroupLog] = {} # journaux avec des messages en attente
+        self.writing = False
+        self.closed = False
+
+        # le dossier n'est créé qu'au premier message écrit (GroupLog.roll)
+        for name in os.listdir(directory) if os.path.isdir(directory) else ():
+            try:
+                group = bytes.fromhex(name).decode('utf-8')
+            except ValueError:
+                continue
+            self.logs[group] = GroupLog(os.path.join(directory, name))
+        self.writer = threading.Thread(target=self.write_loop, name='offline-store', daemon=True)
+        self.writer.start()
+
+
+    # appelé sous queue_lock ; le dossier du groupe n'est créé qu'à la première écriture
+    def log(self, group: str) -> GroupLog:
+        log = self.logs.get(group)
+        if log is None:
+            # nom de dossier en hexadécimal : aucun nom de groupe ne peut sortir du dossier
+            log = self.logs[group] = GroupLog(os.path.join(self.directory, group.encode('utf-8').hex()))
+        return log
+
+
+    # excluded : pseudo du membre à qui le message ne doit pas être rejoué
+    def append(self, group: str, payload: bytes, excluded: str = None) -> int:
+        excluded = excluded.encode('utf-8') if excluded else b''
+        with self.queue_lock:
+            if self.closed:
+                raise RuntimeError("Stockage hors ligne fermé.")
+            log = self.log(group)
+            seq = log.enqueue(payload, excluded)
+            if group not in self.dirty:
+                self.dirty[group] = log
+                self.written.notify_all()
+            return seq
+
+
+    def write_loop(self) -> None:
+        while True:
+            with self.queue_lock:
+                while not self.dirty and not self.closed:
+                    self.written.wait()
+                if not self.dirty:
+                    return
+                dirty, self.dirty = self.dirty, {}
+                self.writing = True
+            try:
+                for group, log in dirty.items():
+                    self.write_pending(group, log)
+            except OSError as e:
+                chat_log.error(Category.server, "Écriture des messages hors ligne impossible : %s", e)
+            finally:
+                with self.queue_lock:
+                    self.writing = False
+                    self.written.notify_all()
+
+
+    # écrit le lot en attente d'un groupe puis applique la rétention par taille, qui ne supprime pas
+    # les segments qu'un lecteur ouvert doit encore lire : le groupe dépasse un moment max_group_bytes
+    def write_pending(self, group: str, log: GroupLog) -> None:
+        with self.lock:
+            with self.queue_lock:
+                records, log.pending = log.pending, []
+            log.write(records, self.segment_size, self.fsync)
+            keep_from = self.reading_from(group, log.next_seq)
+            while log.size > self.max_group_bytes and log.segments[0].last_seq < keep_from and log.drop_oldest():
+                pass
+
+
+    # attend que les messages numérotés jusqu'ici soient écrits
+    def flush(self) -> None:
+        with self.queue_lock:
+            while (self.dirty or self.writing) and self.writer.is_alive():
+                self.written.wait()
+
+
+    def last_seq(self, group: str) -> int:
+        with self.queue_lock:
+            log = self.logs.get(group)
+            return log.next_seq - 1 if log else 0
+
+
+    # plus ancienne séquence encore disponible
+    def first_seq(self, group: str) -> int:
+        with self.lock, self.queue_lock:
+            log = self.logs.get(group)
+            return log.first_seq if log else 1
+
+
+    # une page de messages [from_seq, until_seq], au plus limit
+    def read(self, group: str, from_seq: int, until_seq: int, limit: int = 256) -> list[tuple[int, bytes]]:
+        return [(seq, payload) for seq, payload, _ in self.scan(group, from_seq, until_seq, limit)]
+
+
+    # comme read, avec le pseudo exclu de chaque message (en octets, vide si aucun)
+    def scan(self, group: str, from_seq: int, until_seq: int, limit: int = 256) -> list[tuple[int, bytes, bytes]]:
+        with self.lock:
+            log = self.logs.get(group)
+            if log is None:
+                return []
+            with self.queue_lock:
+                return log.read(from_seq, until_seq, limit)
+
+
+    # recipient : pseudo du membre à qui les messages sont rejoués, ceux dont il était exclu sont sautés
+    def open_reader(self, group: str, from_seq: int, until_seq: Optional[int] = None, page_size: int = 256,
+                    recipient: str = None) -> 'StoreReader':
+        if until_seq is None:
+            until_seq = self.last_seq(group)
+        return StoreReader(self, group, from_seq, until_seq, page_size, recipient)
+
+
+    # supprime les segments devenus inutiles : déjà lus par tous (keep_from) ou trop vieux
+    def compact(self, group: str, keep_from: int) -> None:
+        with self.lock:
+            log = self.logs.get(group)
+            if log is None:
+                return
+
+            keep_from = self.reading_from(group, keep_from)
+            expired = time.time() - self.max_age
+            while len(log.segments) > 1:
+                oldest = log.segments[0]
+                if oldest.last_seq >= keep_from and oldest.last_time >= expired:
+                    break
+                log.drop_oldest()
+
+
+    # plus petite séquence qu'un lecteur ouvert doit encore lire (au plus keep_from)
+    def reading_from(self, group: str, keep_from: int) -> int:
+        readers = self.readers.get(group)
+        if readers:
+            keep_from = min(keep_from, *readers.values())
+        return keep_from
+
+
+    def unpin(self, group: str, reader_id: int) -> None:
+        with self.lock:
+            readers = self.readers.get(group)
+            if readers is not None:
+                readers.pop(reader_id, None)
+                if not readers:
+                    del self.readers[group]
+
+
+    # écrit ce qui reste en attente puis ferme les fichiers
+    def close(self) -> None:
+        with self.queue_lock:
+            self.closed = True
+            self.written.notify_all()
+        if self.writer is not threading.current_thread():
+            self.writer.join()
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
+
+
+
+# Parcourt un intervalle de séquences page par page : la mémoire utilisée ne dépend pas
+# de la durée d'absence. Tant qu'il est ouvert, le lecteur empêche la compaction et la rétention
+# de supprimer ce qu'il doit lire. À l'ouverture, seq part de la plus ancienne séquence encore sur disque
+# si from_seq est plus ancien : l'appelant voit ainsi ce qui a été perdu.
+# Un lecteur abandonné sans être fermé (flux jamais envoyé, connexion coupée) est libéré par le ramasse-miettes.
+class StoreReader:
+    def __init__(self, store: OfflineStore, group: str, from_seq: int, until_seq: int, page_size: int,
+                 recipient: str = None):
+        self.store = store
+        self.group = group
+        self.until_seq = until_seq
+        self.page_size = page_size
+        self.recipient = recipient.encode('utf-8') if recipient else None
+        self.id = next(store.reader_ids)
+        with store.lock:
+            self.seq = max(from_seq, store.first_seq(group))
+            if self.recipient:
+                self.skip_excluded()
+            store.readers.setdefault(group, {})[self.id] = self.seq
+        self.unpin = weakref.finalize(self, store.unpin, group, self.id)
+
+
+    # Les premiers messages dont le destinataire était exclu (ceux diffusés à sa déconnexion) sont sautés
+    # dès l'ouverture : la séquence de reprise annoncée au client les couvre, il n'y voit pas de trou.
+    def skip_excluded(self) -> None:
+        while self.seq <= self.until_seq:
+            records = self.store.scan(self.group, self.seq, self.until_seq, self.page_size)
+            for seq, _, excluded in records:
+                if excluded != self.recipient:
+                    return
+                self.seq = seq + 1
+            if not records:
+                return
+
+
+    def pages(self) -> Iterator[list[tuple[int, bytes]]]:
+        try:
+            while self.seq <= self.until_seq:
+                records = self.store.scan(self.group, self.seq, self.until_seq, self.page_size)
+                if not records:
+                    break
+                self.seq = records[-1][0] + 1
+                with self.store.lock:
+                    readers = self.store.readers.get(self.group)
+                    if readers is not None and self.id in readers:
+                        readers[self.id] = self.seq
+                page = [(seq, payload) for seq, payload, excluded in records
+                        if not excluded or excluded != self.recipient]
+                if page:
+                    yield page
+        finally:
+            self.close()
+
+
+    def close(self) -> None:
+        self.unpin()
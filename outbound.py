@@ -0,0 +1,196 @@
+import collections
+import socket
+import threading
+import time
+from typing import Iterator
+import common_lib
+
+
+POLICY_DROP = "drop"              # au-dessus de la limite, les nouvelles trames sont jetées
+POLICY_DISCONNECT = "disconnect"  # idem, puis le client est déconnecté s'il reste trop longtemps au-dessus
+
+
+# Limites de la file d'envoi de chaque connexion (en octets)
+class OutboundLimits:
+    def __init__(self, high_watermark: int = 1 << 20, low_watermark: int = 256 << 10,
+                 policy: str = POLICY_DISCONNECT, grace: float = 5.0):
+        if low_watermark > high_watermark:
+            raise ValueError("low_watermark doit être inférieur à high_watermark.")
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.policy = policy
+        self.grace = grace # secondes tolérées au-dessus de high_watermark avant déconnexion
+
+
+
+# État de contre-pression et métriques d'une file d'envoi, commun aux deux moteurs.
+# Au-delà de high_watermark le client est "lent" : ses trames sont jetées jusqu'à
+# ce que la file redescende sous low_watermark.
+class OutboundState:
+    total_dropped = 0
+    total_evicted = 0
+
+    def __init__(self, limits: OutboundLimits):
+        self.limits = limits
+        self.depth = 0          # octets en attente d'envoi
+        self.max_depth = 0
+        self.dropped = 0        # trames jetées pour ce client
+        self.paused_since: float = None
+
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_since is not None
+
+
+    def update(self, depth: int) -> None:
+        self.depth = depth
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+        if self.paused_since is None and depth >= self.limits.high_watermark:
+            self.paused_since = time.monotonic()
+        elif self.paused_since is not None and depth <= self.limits.low_watermark:
+            self.paused_since = None
+
+
+    # peut-on mettre une trame de plus dans la file ?
+    def admit(self) -> bool:
+        if self.paused_since is None:
+            return True
+        self.dropped += 1
+        OutboundState.total_dropped += 1
+        return False
+
+
+    def should_evict(self) -> bool:
+        return (self.limits.policy == POLICY_DISCONNECT
+                and self.paused_since is not None
+                and time.monotonic() - self.paused_since > self.limits.grace)
+
+
+    def __str__(self) -> str:
+        slow = ' SLOW' if self.paused else ''
+        return f'{self.depth}o (max {self.max_depth}o, dropped {self.dropped}){slow}'
+
+
+
+# Socket du moteur threadé avec une file d'envoi bornée vidée par un thread d'écriture dédié :
+# un client lent ne bloque plus ni le broadcast, ni la lecture du client qui envoie.
+class QueuedSocket:
+    def __init__(self, sckt: socket.socket, limits: OutboundLimits):
+        self.sckt = sckt
+        self.outbound = OutboundState(limits)
+        self.frames: collections.deque = collections.deque()
+        self.ready = threading.Condition()
+        self.closing = False
+
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+
+    def recv(self, size: int) -> bytes:
+        return self.sckt.recv(size)
+
+
+    def recv_into(self, buffer, size: int = 0) -> int:
+        return self.sckt.recv_into(buffer, size)
+
+
+    def send(self, data: bytes) -> int:
+        return self.sendmsg((data,))
+
+
+    def sendall(self, data: bytes) -> None:
+        self.sendmsg((data,))
+
+
+    # met une trame en file, sans jamais bloquer l'appelant
+    def sendmsg(self, buffers) -> int:
+        size = sum(len(buffer) for buffer in buffers)
+        with self.ready:
+            if self.closing:
+                raise ConnectionError("connexion fermée")
+
+            if not self.outbound.admit():
+                if self.outbound.should_evict():
+                    self.abort(evicted=True)
+                return size
+
+            self.frames.append((buffers, size))
+            self.outbound.update(self.outbound.depth + size)
+            self.ready.notify()
+        return size
+
+
+    # met en file un flux de trames produit à la demande (ex. messages manqués) :
+    # le thread d'écriture le parcourt page par page et les trames suivantes restent derrière lui
+    def send_stream(self, frames: Iterator[tuple[bytes, ...]]) -> None:
+        with self.ready:
+            if self.closing:
+                return
+            self.frames.append((frames, None))
+            self.ready.notify()
+
+
+    # fermeture propre : le thread d'écriture envoie ce qui reste puis ferme le socket
+    def close(self) -> None:
+        with self.ready:
+            self.closing = True
+            self.ready.notify()
+
+
+    # fermeture immédiate (client évincé, erreur d'écriture) : la file est abandonnée et la lecture débloquée
+    def abort(self, evicted: bool = False) -> None:
+        with self.ready:
+            if evicted and not self.closing:
+                OutboundState.total_evicted += 1
+            self.closing = True
+            self.frames.clear()
+            self.outbound.update(0)
+            self.ready.notify()
+        try:
+            self.sckt.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+    def write_stream(self, frames: Iterator[tuple[bytes, ...]]) -> None:
+        try:
+            for frame in frames:
+                if self.closing: # connexion fermée pendant le flux : inutile d'aller plus loin
+                    break
+                common_lib.write_frame(self.sckt, frame)
+        finally:
+            close = getattr(frames, 'close', None)
+            if close:
+                close()
+
+
+    def write_loop(self) -> None:
+        while True:
+            with self.ready:
+                while not self.frames and not self.closing:
+                    self.ready.wait()
+                if not self.frames:
+                    break
+                buffers, size = self.frames.popleft()
+
+            try:
+                if size is None:
+                    self.write_stream(buffers)
+                    continue
+                common_lib.write_frame(self.sckt, buffers)
+            except OSError:
+                self.abort()
+                break
+
+            with self.ready:
+                self.outbound.update(max(self.outbound.depth - size, 0))
+
+        # débloque aussi le thread de lecture encore en attente dans recv()
+        try:
+            self.sckt.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sckt.close()
@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+# Limites de débit en entrée (0 = pas de limite). Un client, ou l'ensemble des membres d'un groupe,
+# peut dépasser son débit le temps d'une rafale de `burst` secondes, puis il est ralenti.
+class RateLimits:
+    def __init__(self, client_messages: float = 50.0, client_bytes: float = 4 << 20,
+                 group_messages: float = 1000.0, group_bytes: float = 16 << 20,
+                 burst: float = 2.0, max_connections: int = 10000):
+        self.client_messages = client_messages # messages/s par client
+        self.client_bytes = client_bytes       # octets/s par client
+        self.group_messages = group_messages   # messages/s vers un même groupe, tous membres confondus
+        self.group_bytes = group_bytes         # octets/s vers un même groupe
+        self.burst = burst
+        self.max_connections = max_connections # connexions ouvertes en même temps (0 = pas de limite)
+
+
+    def client_state(self) -> 'RateState':
+        return RateState(self.client_messages, self.client_bytes, self.burst)
+
+
+    def group_state(self) -> 'RateState':
+        return RateState(self.group_messages, self.group_bytes, self.burst)
+
+
+
+# Seau à jetons : rempli à `rate` jetons par seconde, jusqu'à `rate * burst`.
+# Un message peut prendre plus de jetons qu'il n'en reste : le seau passe en négatif,
+# et charge() renvoie le temps nécessaire pour revenir à zéro.
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'last')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = rate * burst
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+
+    def charge(self, amount: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+
+# Débit d'un client ou d'un groupe, en messages et en octets, et compteurs du ralentissement subi.
+# Au-delà de la limite rien n'est jeté : la lecture du client est suspendue le temps renvoyé par charge(),
+# et TCP ralentit l'émetteur sans pénaliser les autres clients.
+class RateState:
+    total_throttled = 0    # messages ayant suspendu la lecture de leur émetteur, tous clients confondus
+    total_delay = 0.0      # secondes de lecture suspendue, tous clients confondus
+
+    def __init__(self, messages_rate: float, bytes_rate: float, burst: float):
+        self.messages = TokenBucket(messages_rate, burst)
+        self.bytes = TokenBucket(bytes_rate, burst)
+        self.throttled = 0
+        self.delay = 0.0
+        self.lock = threading.Lock() # moteur threadé : un groupe est alimenté par plusieurs threads
+
+
+    # secondes pendant lesquelles l'émetteur ne doit plus être lu (0 s'il reste sous ses limites)
+    def charge(self, size: int, now: float) -> float:
+        with self.lock:
+            delay = max(self.messages.charge(1, now), self.bytes.charge(size, now))
+            if delay > 0:
+                self.throttled += 1
+                self.delay += delay
+                RateState.total_throttled += 1
+                RateState.total_delay += delay
+        return delay
+
+
+    def __str__(self) -> str:
+        return f'throttled {self.throttled} ({self.delay:.1f}s)'
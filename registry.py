@@ -0,0 +1,165 @@
+import socket
+import threading
+import time
+from typing import Iterator, Optional
+import common_lib
+
+
+
+class Client ():
+    counter = 0
+
+    def __init__(self, socket: socket.socket):
+        self.id = Client.generate_unique_id()
+        self.nickname:str = self.id
+        self.public_key: tuple[str, str] = None
+        self.socket = socket
+        self.connected = True
+        self.missed_since: dict[str, int] = {} # groupe -> première séquence manquée (voir OfflineStore)
+        self.acked: dict[str, int] = {} # groupe -> dernière séquence reçue sans trou, selon le client (ackMessages)
+        self.groups: set[str] = set() # index inverse : noms des groupes dont le client est membre
+        self.protocol = common_lib.PROTOCOL_JSON # format des trames envoyées à ce client
+        self.groups_delta = False # reçoit l'annuaire des groupes par pages puis par changements (groupsVersion)
+        # en tant que détenteur d'une clé de groupe : demandes de clé en cours, temps de réponse moyen (s)
+        self.key_load = 0
+        self.key_latency = 0.05
+        self.rate = None # débit en entrée (ratelimit.RateState), donné par le serveur à la connexion
+        self.last_seen = time.monotonic() # dernière trame reçue de ce client
+
+
+    def __str__(self) -> str:
+        id = self.id
+        n = self.nickname
+        key = self.public_key
+        sckt = 'Have one' if self.socket else None
+        pending_msgs = list(self.missed_since.items()) if self.missed_since else None
+        connected = 'O' if self.connected else 'X'
+        out = getattr(self.socket, 'outbound', None)
+        return f'{connected} id:{id}, name:{n}, sckt:{sckt}, key:{key}, waiting_msg:{pending_msgs}, out:{out}, in:{self.rate}'
+
+
+    @staticmethod
+    def generate_unique_id() -> str:
+        Client.counter += 1
+        return f'__{Client.counter}'
+
+
+
+# Membres d'un groupe : un dict sert d'ensemble ordonné,
+# l'appartenance est en O(1) et le premier membre reste l'admin.
+class Group ():
+    def __init__(self, name: str, members: list[Client] = ()):
+        self.name = name
+        self.members: dict[Client, None] = {}
+        # membres connectés qui ont la clé du groupe (créateur, membres entrés par joinGroup, clé annoncée
+        # à la reconnexion) : seuls eux sont sollicités quand quelqu'un demande à entrer
+        self.key_holders: set[Client] = set()
+        # moteur threadé : les séquences sont attribuées et envoyées dans le même ordre à tous les membres
+        self.lock = threading.Lock()
+        for member in members:
+            self.add(member) # tient aussi à jour client.groups
+
+
+    def __iter__(self) -> Iterator[Client]:
+        return iter(self.members)
+
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+
+    def __contains__(self, client: Client) -> bool:
+        return client in self.members
+
+
+    @property
+    def admin(self) -> Optional[Client]:
+        return next(iter(self.members), None)
+
+
+    def add(self, client: Client) -> None:
+        self.members[client] = None
+        client.groups.add(self.name)
+
+
+    def remove(self, client: Client) -> None:
+        self.members.pop(client, None)
+        self.key_holders.discard(client)
+        client.groups.discard(self.name)
+        client.acked.pop(self.name, None)
+        client.missed_since.pop(self.name, None)
+
+
+    # déplace l'admin actuel à la fin du groupe, le membre suivant devient admin
+    def rotate_admin(self) -> None:
+        admin = self.admin
+        if admin is not None:
+            del self.members[admin]
+            self.members[admin] = None
+
+
+
+# Index des clients du serveur : pseudo, id et socket -> Client, tous en O(1)
+class ClientRegistry ():
+    def __init__(self):
+        self.by_id: dict[str, Client] = {}
+        self.by_nickname: dict[str, Client] = {}
+        self.by_socket: dict[object, Client] = {}
+
+
+    def __iter__(self) -> Iterator[Client]:
+        return iter(list(self.by_id.values()))
+
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+
+    def add(self, client: Client) -> None:
+        self.by_id[client.id] = client
+        self.by_nickname[client.nickname] = client
+        if client.socket is not None:
+            self.by_socket[client.socket] = client
+
+
+    # ajout en bloc (redémarrage : comptes rechargés sans socket)
+    def add_all(self, clients: list[Client]) -> None:
+        self.by_id.update((client.id, client) for client in clients)
+        self.by_nickname.update((client.nickname, client) for client in clients)
+        self.by_socket.update((client.socket, client) for client in clients if client.socket is not None)
+
+
+    def remove(self, client: Client) -> None:
+        self.by_id.pop(client.id, None)
+        if self.by_nickname.get(client.nickname) is client:
+            del self.by_nickname[client.nickname]
+        if self.by_socket.get(client.socket) is client:
+            del self.by_socket[client.socket]
+
+
+    def get(self, nickname: str) -> Optional[Client]:
+        return self.by_nickname.get(nickname)
+
+
+    def get_by_id(self, id: str) -> Optional[Client]:
+        return self.by_id.get(id)
+
+
+    def get_by_socket(self, sckt) -> Optional[Client]:
+        return self.by_socket.get(sckt)
+
+
+    # met à jour les données d'un client en gardant les index cohérents
+    def update_data(self, client: Client, nickname: str = None, public_key: tuple[str, str] = None, socket: socket.socket = None) -> None:
+        if nickname and nickname != client.nickname:
+            if self.by_nickname.get(client.nickname) is client:
+                del self.by_nickname[client.nickname]
+            client.nickname = nickname
+            self.by_nickname[nickname] = client
+        if public_key:
+            client.public_key = public_key
+        if socket:
+            if self.by_socket.get(client.socket) is client:
+                del self.by_socket[client.socket]
+            client.socket = socket
+            self.by_socket[socket] = client
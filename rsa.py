@@ -1,9 +1,27 @@
 import math
 import binascii
-from typing import TypeAlias
+import hashlib
+from typing import NamedTuple, TypeAlias
 from Cryptodome.Util.number import getPrime
 
-RsaKeypair: TypeAlias = tuple[tuple[int, int], tuple[int, int]]
+
+# Clé privée complète : en plus de (d, n), on garde p, q et les valeurs précalculées
+# du théorème des restes chinois (CRT). key[0] et key[1] restent d et n, comme l'ancien tuple (d, n).
+class RsaPrivateKey(NamedTuple):
+  d: int
+  n: int
+  p: int
+  q: int
+  dp: int   # d mod (p - 1)
+  dq: int   # d mod (q - 1)
+  qinv: int # inverse de q modulo p
+
+  @staticmethod
+  def from_primes(p: int, q: int, e: int = 65537) -> 'RsaPrivateKey':
+    d = pow(e, -1, (p - 1) * (q - 1))
+    return RsaPrivateKey(d, p * q, p, q, d % (p - 1), d % (q - 1), pow(q, -1, p))
+
+RsaKeypair: TypeAlias = tuple[tuple[int, int], RsaPrivateKey]
 
 # Prend en paramètre une taille de clé exprimée en bits, et renvoie une paire de clé publique/privée de cette taille
 def gen_rsa_keypair(bits: int) -> RsaKeypair:
@@ -14,22 +32,16 @@ def gen_rsa_keypair(bits: int) -> RsaKeypair:
     q = getPrime(size)
     while p == q: q = getPrime(size)
 
-    # Calculer le module de chiffrement n
-    n = p * q 
-
-    # Indicatrice d'Euler pour n
-    phi_n = (p - 1) * (q - 1)
-    
     # Exposant de chiffrement e (public)
     e = 65537
 
     # S'assurer que e soit bien premier avec p-1 et avec q-1
     assert((math.gcd(e, p - 1) == 1) and (math.gcd(e, q - 1) == 1))
 
-    # Calcul de l'inverse modulaire de e % phi_n
-    d = pow(e, -1, phi_n)
+    # d = inverse modulaire de e % phi_n, n = p * q, et les valeurs du CRT
+    private_key = RsaPrivateKey.from_primes(p, q, e)
 
-    return ((e, n), (d, n))
+    return ((e, private_key.n), private_key)
 
 # Chiffrement de la clé de groupe à l'aide de l'exposant de chiffrement exp et du module de chiffrement n
 # -> Retourne le chiffré en hexadécimal
@@ -52,10 +64,34 @@ def rsa_dec(cipher: str, exp: int, n: int) -> bytes:
 
   return int_decipher.to_bytes((int_decipher.bit_length() + 7) // 8, 'big')
 
+# Déchiffrement avec la clé privée complète, via le CRT (environ 3 à 4 fois plus rapide que rsa_dec)
+def rsa_dec_crt(cipher: str, private_key: RsaPrivateKey) -> bytes:
+  int_decipher = rsa_exp_crt(int(cipher, 16), private_key)
+
+  return int_decipher.to_bytes((int_decipher.bit_length() + 7) // 8, 'big')
+
+# Signature (sans remplissage) de l'empreinte SHA-256 du message -> hexadécimal
+def rsa_sign(message: bytes, private_key: RsaPrivateKey) -> str:
+  digest = int.from_bytes(hashlib.sha256(message).digest(), 'big')
+  signature = rsa_exp_crt(digest, private_key)
+  return hex(signature)[2:]
+
+def rsa_verify(message: bytes, signature: str, exp: int, n: int) -> bool:
+  digest = int.from_bytes(hashlib.sha256(message).digest(), 'big')
+  return rsa_exp(int(signature, 16), exp, n) == digest
+
 # Exponentiation modulaire à partir d'un message m, d'un exposant exp et du module de chiffrement n
 def rsa_exp(m: int, exp: int, n: int) -> int:
   return pow(m, exp, n)
 
+# m^d mod n calculé séparément modulo p et modulo q (exposants et modules deux fois plus petits),
+# puis recombiné (formule de Garner)
+def rsa_exp_crt(c: int, key: RsaPrivateKey) -> int:
+  m1 = pow(c, key.dp, key.p)
+  m2 = pow(c, key.dq, key.q)
+  h = (key.qinv * (m1 - m2)) % key.p
+  return m2 + h * key.q
+
 # Conversion de la clé publique RSA de int vers hexadécimal et vis versa...
 
 def int_rsa_key_to_hex(key: tuple[int, int]) -> tuple[str, str]:
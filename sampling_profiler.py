@@ -0,0 +1,76 @@
+import collections
+import os
+import sys
+import threading
+import time
+import chat_log
+from chat_log import Category
+
+
+# Profileur par échantillonnage, pour un serveur en marche : toutes les `interval` secondes, un thread
+# relève la pile de chaque thread (sys._current_frames) et compte les piles identiques.
+# Rien n'est instrumenté, le coût ne dépend que de la fréquence d'échantillonnage.
+# Le résultat est au format « piles repliées » (une ligne par pile : "thread;fichier:fonction;... nombre"),
+# lu directement par flamegraph.pl, speedscope ou inferno.
+class SamplingProfiler:
+    def __init__(self, directory: str = 'profiles', interval: float = 0.005):
+        self.directory = directory
+        self.interval = interval
+        self.thread: threading.Thread = None
+        self.lock = threading.Lock()
+
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+
+    # Échantillonne pendant `duration` secondes dans un thread à part ; le chemin du fichier écrit est
+    # renvoyé tout de suite (None si un profil est déjà en cours). Utilisable depuis un gestionnaire de signal.
+    def start(self, duration: float = 10.0) -> str:
+        with self.lock:
+            if self.running:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, time.strftime('server-%Y%m%d-%H%M%S.folded'))
+            self.thread = threading.Thread(target=self.run, args=(duration, path), name='sampling-profiler', daemon=True)
+            self.thread.start()
+            return path
+
+
+    def run(self, duration: float, path: str) -> None:
+        stacks = self.sample(duration)
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in stacks.most_common():
+                file.write(f'{stack} {count}\n')
+        chat_log.info(Category.server, "Profil écrit dans %s : %d échantillons, %d piles différentes",
+                      path, sum(stacks.values()), len(stacks))
+
+
+    def sample(self, duration: float) -> collections.Counter:
+        stacks = collections.Counter()
+        names = {}
+        me = threading.get_ident()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks[fold(names.get(ident, str(ident)), frame)] += 1
+            time.sleep(self.interval)
+        return stacks
+
+
+
+# pile d'appels de la racine à la feuille, séparée par des ';'
+def fold(thread_name: str, frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    names.append(thread_name.replace(' ', '_'))
+    names.reverse()
+    return ';'.join(names)
@@ -1,41 +1,120 @@
 import base64
+import functools
+import nacl.bindings
+import nacl.exceptions
 import nacl.secret
 import nacl.utils
 import binascii
 
+# un message chiffré : nonce (24 octets) + chiffré (message + 16 octets de MAC)
+NONCE_SIZE = nacl.secret.SecretBox.NONCE_SIZE
+MAC_SIZE = nacl.secret.SecretBox.MACBYTES
+OVERHEAD = NONCE_SIZE + MAC_SIZE
+KEY_SIZE = nacl.secret.SecretBox.KEY_SIZE
+
+# libsodium directement (cffi) : le nonce et le chiffré sont écrits dans le tampon de l'appelant, sans copie.
+# Sans elle (autre version de PyNaCl), les fonctions publiques de nacl.bindings, avec une copie de plus.
+try:
+    from nacl._sodium import ffi as _ffi, lib as _lib
+except ImportError:
+    _ffi = _lib = None
+
+
 def secret_box_gen() -> tuple[nacl.secret.SecretBox, bytes]:
     secret_key = nacl.utils.random(nacl.secret.SecretBox.KEY_SIZE)
     secret_box = nacl.secret.SecretBox(secret_key)
 
     return (secret_box, secret_key)
 
+# une même clé donne toujours la même boîte (rejoindre, quitter puis rejoindre un groupe)
+@functools.lru_cache(maxsize=256)
 def secret_box_gen_by_key(secret_key: bytes) -> nacl.secret.SecretBox:
     secret_box = nacl.secret.SecretBox(secret_key)
     return secret_box
 
 def encrypt(box: nacl.secret.SecretBox, msg: str) -> str:
-    enc = box.encrypt(msg.encode())
+    return base64.b64encode(encrypt_raw(box, msg)).decode('utf-8')
 
-    assert len(enc) == len(msg) + box.NONCE_SIZE + box.MACBYTES
-
-    return base64.b64encode(enc.nonce + enc.ciphertext).decode('utf-8') 
+# chiffrer un message en octets bruts (nonce + chiffré), pour le format de trame binaire
+def encrypt_raw(box: nacl.secret.SecretBox, msg: str) -> bytes:
+    return encrypt_bytes(box, msg.encode())
 
 # déchiffrer un message chiffré et encodé en Base64
 def decrypt(box: nacl.secret.SecretBox, enc_msg: str):
-    dec_bytes = base64.b64decode(enc_msg)
+    return decrypt_raw(box, base64.b64decode(enc_msg))
+
+# déchiffrer un message chiffré en octets bruts (nonce + chiffré)
+def decrypt_raw(box: nacl.secret.SecretBox, dec_bytes: bytes):
+    return decrypt_bytes(box, dec_bytes).decode()
+
 
-    nonce = dec_bytes[:box.NONCE_SIZE]  # 24 premiers octets ?
-    ciphertext = dec_bytes[box.NONCE_SIZE:]  # restant..
+# Octets en entrée, octets en sortie : pas d'encodage du texte ni de base64.
 
-    if len(nonce) != box.NONCE_SIZE:
-        raise ValueError("Nonce de taille incorrecte.")
+def encrypt_bytes(box: nacl.secret.SecretBox, data: bytes) -> bytes:
+    out = bytearray(len(data) + OVERHEAD)
+    encrypt_into(box, data, out)
+    return bytes(out)
 
+# chiffre data dans out (bytearray ou memoryview modifiable) à partir de offset ;
+# renvoie le nombre d'octets écrits, len(data) + OVERHEAD
+def encrypt_into(box: nacl.secret.SecretBox, data: bytes, out: bytearray | memoryview, offset: int = 0) -> int:
+    size = len(data) + OVERHEAD
+    if offset < 0 or len(out) - offset < size:
+        raise ValueError(f"Tampon trop petit : {size} octets nécessaires.")
+
+    key = bytes(box)
+    if _lib is not None:
+        buffer = _ffi.from_buffer('unsigned char[]', out, require_writable=True)
+        nonce = buffer + offset
+        _lib.randombytes(nonce, NONCE_SIZE)
+        if _lib.crypto_secretbox_easy(nonce + NONCE_SIZE, _ffi.from_buffer(data), len(data), nonce, key) != 0:
+            raise nacl.exceptions.CryptoError("Erreur lors du chiffrement.")
+    else:
+        nonce = nacl.utils.random(NONCE_SIZE)
+        out[offset:offset + NONCE_SIZE] = nonce
+        out[offset + NONCE_SIZE:offset + size] = nacl.bindings.crypto_secretbox_easy(bytes(data), nonce, key)
+    return size
+
+def decrypt_bytes(box: nacl.secret.SecretBox, data: bytes | memoryview) -> bytes:
+    if len(data) < OVERHEAD:
+        raise ValueError("Message chiffré trop court.")
+
+    key = bytes(box)
+    if _lib is not None:
+        size = len(data) - OVERHEAD
+        plain = _ffi.new('unsigned char[]', max(1, size))
+        cipher = _ffi.from_buffer(data)
+        if _lib.crypto_secretbox_open_easy(plain, cipher + NONCE_SIZE, size + MAC_SIZE, cipher, key) != 0:
+            raise nacl.exceptions.CryptoError("Erreur lors du déchiffrement : message altéré ou mauvaise clé.")
+        return _ffi.buffer(plain, size)[:]
+
+    view = memoryview(data)
     try:
-        dec_msg = box.decrypt(ciphertext, nonce)
+        return nacl.bindings.crypto_secretbox_open_easy(bytes(view[NONCE_SIZE:]), bytes(view[:NONCE_SIZE]), key)
     except nacl.exceptions.CryptoError as e:
         raise nacl.exceptions.CryptoError(f"Erreur lors du déchiffrement : {e}")
 
-    return dec_msg.decode()
+# chiffre une liste de messages dans un seul tampon ; les morceaux renvoyés (memoryview) partagent ce tampon
+def encrypt_many(box: nacl.secret.SecretBox, messages: list[bytes]) -> list[memoryview]:
+    out = bytearray(sum(len(data) for data in messages) + OVERHEAD * len(messages))
+    view = memoryview(out)
+    parts = []
+    offset = 0
+    for data in messages:
+        size = encrypt_into(box, data, out, offset)
+        parts.append(view[offset:offset + size])
+        offset += size
+    return parts
+
+# None à la place de chaque message illisible (altéré, ou chiffré avec une autre clé)
+def decrypt_many(box: nacl.secret.SecretBox, ciphers: list[bytes]) -> list[bytes | None]:
+    plains = []
+    for data in ciphers:
+        try:
+            plains.append(decrypt_bytes(box, data))
+        except (ValueError, nacl.exceptions.CryptoError):
+            plains.append(None)
+    return plains
 
 # Conversion de la clé de groupe chiffrée de int vers hexadécimal et vis versa...
 
@@ -43,4 +122,4 @@ def int_secret_key_to_hex(cipher: int) -> str:
     return hex(cipher)[2:]
 
 def hex_secret_key_to_int(cipher: str) -> int:
-    return int.from_bytes(binascii.unhexlify(cipher.encode("utf-8")), 'big')
\ No newline at end of file
+    return int.from_bytes(binascii.unhexlify(cipher.encode("utf-8")), 'big')
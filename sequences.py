@@ -0,0 +1,80 @@
+import threading
+
+
+# Séquences reçues par le client, par groupe : sert à écarter les doublons (message reçu en direct
+# puis rejoué après une reconnexion) et à accuser réception de façon cumulative.
+# Seule la dernière séquence reçue sans trou est retenue, plus les quelques séquences arrivées
+# en avance sur un trou ; au-delà de max_ahead, le trou est considéré comme perdu.
+class GroupSequences:
+    def __init__(self, last: dict[str, int] = None, max_ahead: int = 1024):
+        self.last: dict[str, int] = dict(last or {}) # groupe -> dernière séquence reçue sans trou
+        self.ahead: dict[str, set[int]] = {}         # groupe -> séquences reçues après un trou
+        self.max_ahead = max_ahead
+        self.changed: set[str] = set()                # groupes dont l'accusé n'est pas encore envoyé
+        self.lock = threading.Lock() # thread réseau et minuterie des accusés
+
+
+    # faux si le message a déjà été reçu
+    def accept(self, group: str, seq: int) -> bool:
+        with self.lock:
+            last = self.last.get(group)
+            if last is None:
+                # premier message du groupe : il sert de point de départ
+                self.last[group] = seq
+                self.changed.add(group)
+                return True
+            if seq <= last:
+                return False
+
+            ahead = self.ahead.setdefault(group, set())
+            if seq in ahead:
+                return False
+            ahead.add(seq)
+            if seq == last + 1:
+                self.advance(group, last)
+            elif len(ahead) > self.max_ahead:
+                # le trou ne sera pas comblé : on repart de la plus petite séquence en avance
+                self.advance(group, min(ahead) - 1)
+            return True
+
+
+    # avance la dernière séquence sans trou sur les séquences déjà reçues en avance
+    def advance(self, group: str, last: int) -> None:
+        ahead = self.ahead[group]
+        while last + 1 in ahead:
+            last += 1
+            ahead.remove(last)
+        self.last[group] = last
+        self.changed.add(group)
+
+
+    # point de départ imposé par le serveur (entrée dans un groupe, reconnexion)
+    def reset(self, group: str, last: int) -> None:
+        with self.lock:
+            self.last[group] = last
+            self.ahead.pop(group, None)
+            self.changed.add(group)
+
+
+    def forget(self, group: str) -> None:
+        with self.lock:
+            self.last.pop(group, None)
+            self.ahead.pop(group, None)
+            self.changed.discard(group)
+
+
+    def get(self, group: str) -> int | None:
+        return self.last.get(group)
+
+
+    def snapshot(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.last)
+
+
+    # dernières séquences des groupes qui ont avancé depuis le dernier appel
+    def take_changes(self) -> dict[str, int]:
+        with self.lock:
+            changes = {group: self.last[group] for group in self.changed if group in self.last}
+            self.changed.clear()
+            return changes
@@ -0,0 +1,469 @@
+import array
+import gc
+import itertools
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Iterator, Optional
+import chat_log
+from chat_log import Category
+from registry import Client, Group, ClientRegistry
+
+
+# Instantané : [en-tête][sections][crc32 de tout ce qui précède]
+# Les données sont rangées par colonnes (tous les pseudos, puis toutes les clés...) : l'écriture et la
+# relecture se font par grands blocs d'octets, sans encodeur générique ni objet par champ.
+SNAPSHOT_MAGIC = b'CHATSNAP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('>8sBQQ') # magic, version, génération, version de l'annuaire des groupes
+CRC = struct.Struct('>I')
+U32 = struct.Struct('>I')
+
+# Journal (write-ahead log) : une modification par enregistrement [opération][taille][champs],
+# chaque champ étant [taille][texte utf-8]. Un enregistrement incomplet en fin de fichier (crash) est ignoré.
+WAL_RECORD = struct.Struct('>BI')
+OP_REGISTER = 1       # pseudo, e, n : compte créé, ou clé publique changée à la reconnexion
+OP_GROUP_ADD = 2      # groupe, créateur
+OP_MEMBER_ADD = 3     # groupe, pseudo
+OP_MEMBER_REMOVE = 4  # groupe, pseudo
+OP_GROUP_REMOVE = 5   # groupe
+OP_MEMBER_TO_END = 6  # groupe, pseudo : l'admin déconnecté passe en fin de groupe
+OP_MISSED = 7         # pseudo, groupe, séquence : premier message manqué hors ligne
+OP_MISSED_CLEAR = 8   # pseudo : messages manqués rejoués
+OP_ACKED = 9          # pseudo, puis groupe, séquence pour chaque groupe : accusé de réception
+
+KEY_HEX, KEY_HEX_ODD, KEY_TEXT = range(3)
+
+
+
+# État du serveur qui doit survivre à un redémarrage : comptes (pseudo, clé publique), groupes et ordre
+# de leurs membres (le premier est l'admin), messages manqués et accusés de réception.
+# Les messages eux-mêmes sont dans l'OfflineStore.
+# Chaque modification est ajoutée au journal ; périodiquement (ou quand le journal grossit) un instantané
+# complet est écrit et les journaux plus anciens sont supprimés. Au démarrage : instantané puis journaux.
+#
+# L'instantané est pris en deux temps : une copie des colonnes (listes de références, les chaînes ne sont
+# pas copiées) dans le thread du serveur, puis l'encodage et l'écriture dans un thread à part, pendant que
+# le serveur continue sur un nouveau journal. Pas de fork() : le serveur a des threads.
+class ServerState:
+    def __init__(self, directory: str = 'server_state', interval: float = 300.0,
+                 wal_max_bytes: int = 16 << 20, fsync: bool = False):
+        self.directory = directory
+        self.interval = interval           # secondes entre deux instantanés
+        self.wal_max_bytes = wal_max_bytes # au-delà, instantané anticipé
+        self.fsync = fsync
+        self.generation = 0 # le journal wal-<génération> contient les modifications postérieures à l'instantané de même génération
+        self.wal = None
+        self.wal_size = 0
+        self.writer: threading.Thread = None
+        self.lock = threading.Lock() # moteur threadé : un thread par client
+        os.makedirs(directory, exist_ok=True)
+
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, 'snapshot')
+
+
+    def wal_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f'wal-{generation:020d}.log')
+
+
+    def wal_generations(self) -> list[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            if name.startswith('wal-') and name.endswith('.log'):
+                try:
+                    generations.append(int(name[4:-4]))
+                except ValueError:
+                    pass
+        return sorted(generations)
+
+
+    # Recharge l'état dans clients / groups : les comptes reviennent hors ligne, sans socket.
+    # Renvoie la version de l'annuaire des groupes enregistrée dans l'instantané, None s'il n'y a rien à recharger.
+    def restore(self, clients: ClientRegistry, groups: dict[str, Group]) -> Optional[int]:
+        # des centaines de milliers d'objets créés d'un coup : sans ramasse-miettes pendant ce temps,
+        # il parcourrait sinon plusieurs fois tout ce qui a déjà été rechargé
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return self.load(clients, groups)
+        finally:
+            if collecting:
+                gc.enable()
+
+
+    def load(self, clients: ClientRegistry, groups: dict[str, Group]) -> Optional[int]:
+        directory_version = None
+        data = None
+        try:
+            with open(self.snapshot_path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            pass
+
+        if data:
+            if CRC.unpack_from(data, len(data) - CRC.size)[0] != zlib.crc32(memoryview(data)[:-CRC.size]):
+                raise ValueError(f"Instantané {self.snapshot_path} corrompu.")
+            magic, version, self.generation, directory_version = SNAPSHOT_HEADER.unpack_from(data)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f"Instantané {self.snapshot_path} de format inconnu.")
+            load_snapshot(memoryview(data)[SNAPSHOT_HEADER.size:-CRC.size], clients, groups)
+
+        for generation in self.wal_generations():
+            if generation >= self.generation:
+                for op, fields in read_wal(self.wal_path(generation)):
+                    directory_version = directory_version or 0
+                    # chaque création ou suppression de groupe fait avancer l'annuaire d'une version
+                    if op in (OP_GROUP_ADD, OP_GROUP_REMOVE):
+                        directory_version += 1
+                    apply_record(op, fields, clients, groups)
+                self.generation = generation
+
+        self.open_wal()
+        return directory_version
+
+
+    def open_wal(self) -> None:
+        path = self.wal_path(self.generation)
+        self.wal = open(path, 'ab', buffering=0)
+        self.wal_size = os.path.getsize(path)
+
+
+    # ajoute une modification au journal : un seul write() par enregistrement
+    def log(self, op: int, *fields: str) -> None:
+        parts = []
+        for field in fields:
+            encoded = str(field).encode('utf-8')
+            parts.append(U32.pack(len(encoded)))
+            parts.append(encoded)
+        payload = b''.join(parts)
+        record = WAL_RECORD.pack(op, len(payload)) + payload
+        with self.lock:
+            if self.wal is None:
+                return
+            self.wal.write(record)
+            if self.fsync:
+                os.fsync(self.wal.fileno())
+            self.wal_size += len(record)
+
+
+    @property
+    def wal_full(self) -> bool:
+        return self.wal_size > self.wal_max_bytes
+
+
+    # Copie les colonnes de l'état, passe au journal suivant et écrit l'instantané dans un thread.
+    # Faux si l'instantané précédent est encore en cours d'écriture.
+    def snapshot(self, clients: ClientRegistry, groups: dict[str, Group], directory_version: int,
+                 wait: bool = False) -> bool:
+        if wait and self.writer is not None:
+            self.writer.join()
+        with self.lock:
+            if self.wal is None or (self.writer is not None and self.writer.is_alive()):
+                return False
+            columns = capture(clients, groups)
+            self.wal.close()
+            self.generation += 1
+            self.open_wal()
+            generation = self.generation
+
+        self.writer = threading.Thread(target=self.write_snapshot, args=(columns, generation, directory_version), daemon=True)
+        self.writer.start()
+        if wait:
+            self.writer.join()
+        return True
+
+
+    def write_snapshot(self, columns: tuple, generation: int, directory_version: int) -> None:
+        start = time.perf_counter()
+        try:
+            parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation, directory_version)]
+            encode_snapshot(columns, parts)
+            data = b''.join(parts)
+            data += CRC.pack(zlib.crc32(data))
+
+            # fichier temporaire puis renommage : un crash pendant l'écriture laisse l'instantané précédent
+            temp_path = self.snapshot_path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.snapshot_path)
+
+            # les journaux antérieurs sont contenus dans l'instantané
+            for old in self.wal_generations():
+                if old < generation:
+                    os.remove(self.wal_path(old))
+        except OSError as e:
+            chat_log.error(Category.server, "Écriture de l'instantané impossible : %s", e)
+            return
+        chat_log.info(Category.server, "Instantané %d écrit : %d clients, %.1f Mo en %.3fs",
+                      generation, len(columns[0]), len(data) / 1e6, time.perf_counter() - start)
+
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.join()
+        with self.lock:
+            if self.wal is not None:
+                self.wal.close()
+                self.wal = None
+
+
+
+def read_wal(path: str) -> Iterator[tuple[int, list[str]]]:
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    offset = 0
+    while offset + WAL_RECORD.size <= len(data):
+        op, lenght = WAL_RECORD.unpack_from(data, offset)
+        end = offset + WAL_RECORD.size + lenght
+        if end > len(data):
+            break
+        fields = []
+        position = offset + WAL_RECORD.size
+        while position < end:
+            size = U32.unpack_from(data, position)[0]
+            position += U32.size
+            fields.append(data[position:position + size].decode('utf-8'))
+            position += size
+        yield op, fields
+        offset = end
+
+    if offset < len(data):
+        chat_log.warning(Category.server, "Journal %s tronqué : %d octets ignorés", path, len(data) - offset)
+        with open(path, 'r+b') as file:
+            file.truncate(offset)
+
+
+def offline_client(nickname: str, public_key: tuple[str, str]) -> Client:
+    client = Client(None)
+    client.nickname = nickname
+    client.public_key = public_key
+    client.connected = False
+    return client
+
+
+# Rejoue une modification du journal. Les opérations sont idempotentes : une modification faite juste
+# avant la copie de l'instantané et journalisée juste après peut être rejouée sur un état qui la contient.
+def apply_record(op: int, fields: list[str], clients: ClientRegistry, groups: dict[str, Group]) -> None:
+    if op == OP_REGISTER:
+        nickname, e, n = fields
+        client = clients.get(nickname)
+        if client is None:
+            clients.add(offline_client(nickname, (e, n)))
+        else:
+            client.public_key = (e, n)
+        return
+
+    if op == OP_MISSED_CLEAR:
+        client = clients.get(fields[0])
+        if client is not None:
+            client.missed_since.clear()
+        return
+
+    if op == OP_ACKED:
+        client = clients.get(fields[0])
+        if client is not None:
+            for group_name, seq in zip(fields[1::2], fields[2::2]):
+                seq = int(seq)
+                if group_name in client.groups and seq > client.acked.get(group_name, -1):
+                    client.acked[group_name] = seq
+        return
+
+    if op == OP_MISSED:
+        nickname, group_name, seq = fields
+        client = clients.get(nickname)
+        if client is not None and group_name in client.groups:
+            client.missed_since.setdefault(group_name, int(seq))
+        return
+
+    group_name = fields[0]
+    if op == OP_GROUP_REMOVE:
+        groups.pop(group_name, None)
+        return
+
+    client = clients.get(fields[1])
+    if op == OP_GROUP_ADD:
+        if group_name not in groups:
+            groups[group_name] = Group(group_name)
+        if client is not None:
+            groups[group_name].add(client)
+        return
+
+    group = groups.get(group_name)
+    if group is None or client is None:
+        return
+    if op == OP_MEMBER_ADD:
+        group.add(client)
+    elif op == OP_MEMBER_REMOVE:
+        group.remove(client)
+    elif op == OP_MEMBER_TO_END and client in group:
+        del group.members[client]
+        group.members[client] = None
+
+
+
+# Copie de l'état, dans le thread du serveur : seulement des listes de références et des copies
+# superficielles des tables de séquences ; le reste est calculé par encode_snapshot, dans un autre thread.
+def capture(clients: ClientRegistry, groups: dict[str, Group]) -> tuple:
+    accounts = [client for client in clients if client.public_key is not None]
+    nicknames = [client.nickname for client in accounts]
+    keys = [client.public_key for client in accounts]
+    items = tuple(groups.items())
+    group_names = [name for name, _ in items]
+    members = [tuple(group) for _, group in items]
+    missed = [client.missed_since.copy() if client.missed_since else None for client in accounts]
+    acked = [client.acked.copy() if client.acked else None for client in accounts]
+    return accounts, nicknames, keys, group_names, members, missed, acked
+
+
+def encode_snapshot(columns: tuple, parts: list) -> None:
+    accounts, nicknames, keys, group_names, members, missed, acked = columns
+    pack_strings(nicknames, parts)
+    key_kinds = bytearray()
+    for component in range(2):
+        values = []
+        for key in keys:
+            value, kind = encode_key(key[component] if isinstance(key, (tuple, list)) and len(key) == 2 else '')
+            values.append(value)
+            key_kinds.append(kind)
+        pack_blobs(values, parts)
+    pack_blobs([bytes(key_kinds)], parts)
+    pack_strings(group_names, parts)
+
+    # membres : indices des comptes, dans l'ordre du groupe (le premier est l'admin)
+    index = {client: i for i, client in enumerate(accounts)}
+    sizes = array.array('I')
+    member_indexes = array.array('I')
+    for group_members in members:
+        group_members = [index[member] for member in group_members if member in index]
+        sizes.append(len(group_members))
+        member_indexes.extend(group_members)
+    pack_array(sizes, parts)
+    pack_array(member_indexes, parts)
+
+    # séquences : triplets (compte, groupe, séquence) en trois colonnes
+    group_index = {name: i for i, name in enumerate(group_names)}
+    for tables in (missed, acked):
+        triples = (array.array('I'), array.array('I'), array.array('Q'))
+        for i, table in enumerate(tables):
+            for group_name, seq in (table.items() if table else ()):
+                if group_name in group_index:
+                    triples[0].append(i)
+                    triples[1].append(group_index[group_name])
+                    triples[2].append(seq)
+        for column in triples:
+            pack_array(column, parts)
+
+
+def load_snapshot(data: memoryview, clients: ClientRegistry, groups: dict[str, Group]) -> None:
+    offset = 0
+    nicknames, offset = unpack_strings(data, offset)
+    keys_e, offset = unpack_blobs(data, offset)
+    keys_n, offset = unpack_blobs(data, offset)
+    (_, key_kinds), offset = unpack_blobs(data, offset)
+    group_names, offset = unpack_strings(data, offset)
+    columns = []
+    for typecode in ('I', 'I', 'I', 'I', 'Q', 'I', 'I', 'Q'):
+        column, offset = unpack_array(data, offset, typecode)
+        columns.append(column)
+    sizes, members, missed_clients, missed_groups, missed_seqs, acked_clients, acked_groups, acked_seqs = columns
+
+    count = len(nicknames)
+    keys = zip(decode_keys(*keys_e, key_kinds[:count]), decode_keys(*keys_n, key_kinds[count:]))
+    accounts = list(map(offline_client, nicknames, keys))
+    clients.add_all(accounts)
+
+    position = 0
+    for name, size in zip(group_names, sizes):
+        group = groups[name] = Group(name)
+        for member in members[position:position + size]:
+            group.add(accounts[member])
+        position += size
+
+    for client, group, seq in zip(missed_clients, missed_groups, missed_seqs):
+        accounts[client].missed_since[group_names[group]] = seq
+    for client, group, seq in zip(acked_clients, acked_groups, acked_seqs):
+        accounts[client].acked[group_names[group]] = seq
+
+
+# clé publique en hexadécimal : stockée en octets bruts (deux fois plus compact), sinon telle quelle
+def encode_key(value: str) -> tuple[bytes, int]:
+    value = str(value)
+    padded = '0' + value if len(value) % 2 else value
+    try:
+        raw = bytes.fromhex(padded)
+    except ValueError:
+        raw = None
+    if raw is None or raw.hex() != padded:
+        return value.encode('utf-8'), KEY_TEXT
+    return raw, KEY_HEX_ODD if len(value) % 2 else KEY_HEX
+
+
+# toute la colonne est convertie en hexadécimal d'un coup, puis découpée
+def decode_keys(lenghts: array.array, blob: bytes, kinds: bytes) -> list[str]:
+    keys = split(blob.hex(), lenghts, 2)
+    if kinds.count(KEY_HEX) == len(kinds):
+        return keys
+    raw = split(blob, lenghts) if KEY_TEXT in kinds else keys
+    return [key if kind == KEY_HEX else key[1:] if kind == KEY_HEX_ODD else value.decode('utf-8')
+            for key, kind, value in zip(keys, kinds, raw)]
+
+
+# découpe value en morceaux de lenghts[i] * scale éléments
+def split(value, lenghts: array.array, scale: int = 1) -> list:
+    ends = list(itertools.accumulate(lenght * scale for lenght in lenghts))
+    return [value[start:end] for start, end in zip(itertools.chain((0,), ends), ends)]
+
+
+# colonnes d'entiers : tableaux petit-boutistes copiés d'un bloc
+def pack_array(column: array.array, parts: list) -> None:
+    if sys.byteorder != 'little':
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    parts.append(U32.pack(len(column)))
+    parts.append(column.tobytes())
+
+
+def unpack_array(data: memoryview, offset: int, typecode: str) -> tuple[array.array, int]:
+    count = U32.unpack_from(data, offset)[0]
+    offset += U32.size
+    column = array.array(typecode)
+    end = offset + count * column.itemsize
+    column.frombytes(data[offset:end])
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column, end
+
+
+# colonnes d'octets : les tailles d'un bloc, puis les valeurs bout à bout
+def pack_blobs(values: list[bytes], parts: list) -> None:
+    pack_array(array.array('I', map(len, values)), parts)
+    parts.append(b''.join(values))
+
+
+# (tailles, valeurs bout à bout), position suivante
+def unpack_blobs(data: memoryview, offset: int) -> tuple[tuple[array.array, bytes], int]:
+    lenghts, offset = unpack_array(data, offset, 'I')
+    end = offset + sum(lenghts)
+    return (lenghts, bytes(data[offset:end])), end
+
+
+def pack_strings(values: list[str], parts: list) -> None:
+    pack_blobs([value.encode('utf-8') for value in values], parts)
+
+
+def unpack_strings(data: memoryview, offset: int) -> tuple[list[str], int]:
+    (lenghts, blob), offset = unpack_blobs(data, offset)
+    text = blob.decode('utf-8')
+    # texte ascii : les positions en octets sont aussi celles des caractères
+    if len(text) == len(blob):
+        return split(text, lenghts), offset
+    return [value.decode('utf-8') for value in split(blob, lenghts)], offset
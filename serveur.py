@@ -1,316 +1,868 @@
 import socket
 import threading
+import argparse
+import signal
+import itertools
+import time
 from common_lib import ServerAction, ClientAction, EntryForFormatedMessage, ErrorType
 import common_lib
-from typing import Optional
+import async_engine
+import chat_log
+from chat_log import Category
+import outbound
+import ratelimit
+from offline_store import DEFAULT_STORE_DIR, OfflineStore, StoreReader
+from registry import Client, Group, ClientRegistry
+from joins import JoinTable, PendingJoin
+from shared_files import SharedFileTable
+from group_directory import GroupDirectory
+from timer_wheel import TimerWheel
+from handler_metrics import HandlerMetrics
+from sampling_profiler import SamplingProfiler
+import server_state
+from server_state import ServerState
 
 
 
-class Client ():
-    counter = 0
+class server_socket ():
+    ENGINE_ASYNCIO = "asyncio"    # une seule boucle d'événements, sockets non bloquants
+    ENGINE_THREADED = "threaded"  # un thread par client (ancien moteur, gardé pour comparaison)
+
+    JOIN_TIMEOUT = 5.0        # secondes avant de solliciter un autre membre pour la clé du groupe
+    JOIN_RETRIES = 3          # membres sollicités (second membre compris) avant d'abandonner la demande
+    JOIN_BATCH_DELAY = 0.0    # les demandes arrivées entre-temps partent dans le même requestKey
+    HEDGE_MIN_DELAY = 0.25    # délai minimal avant de solliciter un second membre en parallèle
+    HOLDER_SAMPLE = 8         # membres connectés comparés pour choisir à qui demander la clé
+    COMPACT_INTERVAL = 30.0   # secondes entre deux compactions du journal des groupes
+    GROUPS_PAGE = 256         # groupes par page de l'annuaire
+    GROUP_MESSAGE = "groupMessage"  # clé des métriques pour les messages diffusés à un groupe
+    UNKNOWN_ACTION = "unknown"      # clé des métriques pour les actions inconnues
+
+    def __init__(self, host: str = common_lib.HOST, port: int = common_lib.PORT,
+                 engine: str = ENGINE_ASYNCIO, backlog: int = common_lib.BACKLOG,
+                 outbound_limits: outbound.OutboundLimits = None, offline_store: OfflineStore = None,
+                 max_frame_size: int = common_lib.MAX_FRAME_SIZE, rate_limits: ratelimit.RateLimits = None,
+                 heartbeat_interval: float = 15.0, heartbeat_timeout: float = 10.0, state: ServerState = None,
+                 profiler: SamplingProfiler = None, store_dir: str = DEFAULT_STORE_DIR):
+        self.host = host # localhost by default
+        self.port = port # 5555 by default
+        self.engine = engine
+        self.backlog = backlog # taille de la file des connexions en attente d'accept()
+        self.outbound_limits = outbound_limits or outbound.OutboundLimits()
+        self.max_frame_size = max_frame_size # au-delà, la connexion est coupée avant toute allocation
+        # messages destinés aux membres déconnectés, rejoués à la reconnexion (dans store_dir si aucun n'est fourni)
+        self.offline_store = offline_store or OfflineStore(store_dir)
+        # débit en entrée par client et par groupe, et nombre de connexions ouvertes
+        self.rate_limits = rate_limits or ratelimit.RateLimits()
+        self.group_rates: dict[str, ratelimit.RateState] = {}
+        self.open_connections = 0
+        self.rejected_connections = 0
+        self.connections_lock = threading.Lock()
+        # réponse aux connexions refusées, encodée une fois pour toutes (le client n'a encore rien négocié)
+        self.server_full_frame = b''.join(common_lib.encode_frame("server", "", {
+            EntryForFormatedMessage.action: ServerAction.error,
+            EntryForFormatedMessage.errorType: ErrorType.serverFull
+        }))
+        # connexion silencieuse depuis heartbeat_interval : ping ; toujours rien après heartbeat_timeout de plus :
+        # le client a disparu (sans FIN) et la connexion est coupée. Une échéance par connexion, dans une roue.
+        self.heartbeat_interval = heartbeat_interval # 0 = pas de ping
+        self.heartbeat_timeout = heartbeat_timeout
+        self.heartbeats = TimerWheel(tick=max(0.05, min(0.25, heartbeat_interval / 16)))
+        self.heartbeats_lock = threading.Lock() # moteur threadé : threads clients et minuterie
 
-    def __init__(self, socket: socket.socket):
-        self.id = Client.generate_unique_id()
-        self.nickname:str = self.id
-        self.public_key: tuple[str, str] = None
-        self.socket = socket
-        self.connected = True
-        self.pending_messages = {} #key = group name, value = list of messages
-    
+        self.server: socket.socket = None
+        self.address: tuple[str, int] = None # adresse réellement écoutée, connue une fois prêt
+        self.ready = threading.Event()
+        self.async_engine: async_engine.AsyncServerEngine = None
+        self.thread: threading.Thread = None
+
+        self.groups: dict[str, Group] = {"L3B": Group("L3B")}
+        # noms des groupes, versionnés : les clients reçoivent des pages puis seulement les changements
+        self.directory = GroupDirectory(self.groups)
+        self.clients = ClientRegistry()
+        # demandes d'entrée en attente de la clé du groupe, et requestKey en cours de regroupement
+        self.joins = JoinTable()
+        self.key_requests: dict[tuple[Client, str], list[PendingJoin]] = {}
+        self.joins_lock = threading.RLock() # moteur threadé : minuteries et threads clients concurrents
+        # fichiers proposés aux groupes (description seulement, le contenu reste chez l'expéditeur)
+        self.shared_files = SharedFileTable(common_lib.FILE_CHUNK_SIZE)
+
+        # une méthode par action reçue d'un client, et le temps passé dans chacune
+        self.handlers = {
+            ClientAction.requestConnection: self.on_request_connection,
+            ClientAction.requestJoinGroup: self.on_request_join_group,
+            ClientAction.requestAddGroup: self.on_request_add_group,
+            ClientAction.requestLeaveGroup: self.on_request_leave_group,
+            ClientAction.requestGroups: self.on_request_groups,
+            ClientAction.shareGroupKey: self.on_share_group_key,
+            ClientAction.ping: self.on_ping,
+            ClientAction.pong: self.on_pong,
+            ClientAction.ackMessages: self.on_ack_messages,
+            ClientAction.offerFile: self.offer_file,
+            ClientAction.requestFileChunks: self.request_file_chunks,
+            ClientAction.shareFileChunk: self.forward_file_chunk,
+            ClientAction.requestDisconnection: self.on_request_disconnection
+        }
+        self.handler_metrics = HandlerMetrics(threads=engine == server_socket.ENGINE_THREADED)
+        # profil à la demande d'un serveur en marche (SIGUSR1, voir main)
+        self.profiler = profiler or SamplingProfiler()
+
+        # comptes, groupes et messages manqués : instantané + journal, rechargés au démarrage (None = en mémoire seulement)
+        self.state = state
+        if state is not None:
+            self.restore_state()
+
+
+    # Redémarrage à chaud : les comptes reviennent hors ligne, les clients repassent par la reconnexion.
+    def restore_state(self):
+        start = time.perf_counter()
+        groups: dict[str, Group] = {}
+        directory_version = self.state.restore(self.clients, groups)
+        if directory_version is None:
+            # premier démarrage : l'instantané initial contient les groupes par défaut
+            self.snapshot_state(wait=True)
+            return
+        self.groups = groups
+        self.directory = GroupDirectory(groups)
+        self.directory.version = max(self.directory.version, directory_version)
+        chat_log.info(Category.server, "État restauré en %.3fs : %d comptes, %d groupes",
+                      time.perf_counter() - start, len(self.clients), len(self.groups))
 
-    def __str__(self) -> str:
-        id = self.id
-        n = self.nickname
-        key = self.public_key
-        sckt = 'Have one' if self.socket else None
-        pending_msgs = list(self.pending_messages.items()) if self.pending_messages else None
-        connected = 'O' if self.connected else 'X'
-        return f'{connected} id:{id}, name:{n}, sckt:{sckt}, key:{key}, waiting_msg:{pending_msgs}'
 
+    # journalise une modification de l'état persistant ; instantané anticipé si le journal devient gros
+    def log_state(self, op: int, *fields):
+        if self.state is None:
+            return
+        self.state.log(op, *fields)
+        if self.state.wal_full:
+            self.snapshot_state()
 
-    @staticmethod
-    def generate_unique_id() -> str:
-        Client.counter += 1
-        return f'__{Client.counter}'
 
+    def snapshot_state(self, wait: bool = False):
+        self.state.snapshot(self.clients, self.groups, self.directory.version, wait)
 
-    @staticmethod
-    def get_client(nickname: str, clientsList: list[Optional['Client']]) -> Optional['Client']:
-        for client in clientsList:
-            if client.nickname == nickname:
-                return client
-        
-        # should not happen
-        return None
 
+    # dernier instantané à l'arrêt : le prochain démarrage n'a pas de journal à rejouer
+    def close_state(self):
+        if self.state is not None and self.state.wal is not None:
+            self.snapshot_state(wait=True)
+            self.state.close()
 
-    def update_data(self, nickname: str = None, public_key: tuple[str, str] = None, socket: socket.socket = None) -> None:
-        if nickname:
-            self.nickname = nickname
-        if public_key:
-            self.public_key = public_key
-        if socket:
-            self.socket = socket
 
+    def snapshot_tick(self):
+        if not self.ready.is_set():
+            return
+        self.snapshot_state()
+        self.call_later(self.state.interval, self.snapshot_tick)
 
 
-class server_socket ():
-    def __init__(self, host: str = common_lib.HOST, port: int = common_lib.PORT):
-        self.host = host # localhost by default
-        self.port = port # 5555 by default
+    # liste complète des clients : coûteuse (O(n) à chaque connexion), seulement en debug
+    def show_clients(self):
+        if not chat_log.enabled(Category.clients, chat_log.DEBUG):
+            return
+        lines = [f'{i:>3} | {client}' for i, client in enumerate(self.clients, 1)]
+        lines.append(str(self.outbound_metrics()))
+        lines.append(str(self.rate_metrics()))
+        lines.append(str(self.handler_metrics.summary()))
+        chat_log.debug(Category.clients, "%s", "\n".join(lines))
+
+
+    # temps passé par action depuis le démarrage (SIGUSR2, voir main)
+    def log_handler_metrics(self):
+        lines = [f"{action:>24} | {stats}" for action, stats in self.handler_metrics.summary().items()]
+        chat_log.info(Category.server, "Messages traités depuis %.0fs :\n%s",
+                      time.monotonic() - self.handler_metrics.since, "\n".join(lines))
+
+
+    # métriques des files d'envoi : profondeur totale/max, clients lents, trames jetées, évictions
+    def outbound_metrics(self) -> dict:
+        states = [client.socket.outbound for client in self.clients
+                  if client.connected and hasattr(client.socket, 'outbound')]
+        return {
+            'queued_bytes': sum(state.depth for state in states),
+            'max_queue_bytes': max((state.depth for state in states), default=0),
+            'slow_consumers': sum(1 for state in states if state.paused),
+            'dropped_frames': outbound.OutboundState.total_dropped,
+            'evicted': outbound.OutboundState.total_evicted,
+        }
 
-        self.server: socket.socket = None
 
-        self.groups: dict[str | Client] = {"L3B": []}
-        self.clients: list[Client] = []
-        # dictionnaire pour garder les callbacks par groupe
-        self.group_key_response_callbacks = {}
+    # métriques du débit en entrée : messages ralentis, temps de lecture suspendue, connexions refusées
+    def rate_metrics(self) -> dict:
+        return {
+            'open_connections': self.open_connections,
+            'rejected_connections': self.rejected_connections,
+            'throttled_messages': ratelimit.RateState.total_throttled,
+            'throttle_seconds': round(ratelimit.RateState.total_delay, 3),
+            'throttled_groups': sum(1 for rate in self.group_rates.values() if rate.throttled),
+        }
+
 
+    # Une connexion de plus est-elle acceptée ? Au-delà de max_connections, elle est refusée
+    # avant de créer quoi que ce soit (ni client, ni thread, ni file d'envoi).
+    def admit_connection(self) -> bool:
+        with self.connections_lock:
+            limit = self.rate_limits.max_connections
+            if limit and self.open_connections >= limit:
+                self.rejected_connections += 1
+                admitted = False
+            else:
+                self.open_connections += 1
+                admitted = True
+        if not admitted:
+            chat_log.warning(Category.conn, "Connexion refusée : %d connexions ouvertes", self.open_connections)
+        return admitted
+
+
+    def connection_closed(self):
+        with self.connections_lock:
+            self.open_connections -= 1
+
+
+    # Détection des connexions mortes. L'échéance d'une connexion n'est pas déplacée à chaque trame reçue :
+    # quand elle tombe, on regarde depuis quand le client est silencieux et on en replace une seule.
+    def watch_connection(self, sckt, delay: float):
+        if self.heartbeat_interval:
+            with self.heartbeats_lock:
+                self.heartbeats.schedule(delay, self.check_alive, sckt)
+
+
+    def heartbeat_tick(self):
+        with self.heartbeats_lock:
+            self.heartbeats.advance()
+        if self.ready.is_set():
+            self.call_later(self.heartbeats.tick, self.heartbeat_tick)
+
+
+    # appelée par la roue (verrou déjà pris)
+    def check_alive(self, sckt):
+        client = self.clients.get_by_socket(sckt)
+        if client is None or not client.connected:
+            return # connexion déjà fermée, ou reprise par une reconnexion (nouveau socket, nouvelle échéance)
+
+        idle = time.monotonic() - client.last_seen
+        deadline = self.heartbeat_interval + self.heartbeat_timeout
+        if idle >= deadline:
+            chat_log.info(Category.conn, "%s silencieux depuis %.1f s : connexion coupée", client.nickname, idle)
+            sckt.abort() # le moteur s'occupe ensuite de la déconnexion (on_connection_lost)
+            return
 
-    def show_clients(self):
-        for i, client in enumerate(self.clients, 1):
-            print(f'{i:>3} | {client}')
+        if idle >= self.heartbeat_interval:
+            self.send_message(sckt, {EntryForFormatedMessage.action: ServerAction.ping})
+            self.heartbeats.schedule(deadline - idle, self.check_alive, sckt)
+        else:
+            self.heartbeats.schedule(self.heartbeat_interval - idle, self.check_alive, sckt)
+
+
+    # Compte un message reçu dans le débit de son émetteur et, s'il s'adresse à un groupe, dans celui du groupe.
+    # Renvoie le temps pendant lequel le moteur doit cesser de lire ce socket (0 sous les limites).
+    def charge(self, sckt, size: int, msg: dict) -> float:
+        now = time.monotonic()
+        client = self.clients.get_by_socket(sckt)
+        if client is not None:
+            client.last_seen = now # toute trame prouve que le client est encore là
+        delay = client.rate.charge(size, now) if client is not None and client.rate is not None else 0.0
+
+        target = msg.get(EntryForFormatedMessage.target)
+        if target != 'server' and target in self.groups:
+            group_rate = self.group_rates.get(target)
+            if group_rate is None:
+                group_rate = self.group_rates.setdefault(target, self.rate_limits.group_state())
+            delay = max(delay, group_rate.charge(size, now))
+        return delay
 
 
     # Envoie un message à tous les clients du groupe ciblé
+    # Chaque message reçoit le numéro de séquence suivant du groupe et est écrit une fois sur disque :
+    # un membre qui se reconnecte ne reçoit que ce qui lui manque (voir replay_missed_messages).
+    # La trame est encodée une seule fois par format puis écrite telle quelle sur chaque socket ;
+    # les membres déconnectés retiennent seulement la première séquence manquée.
     def broadcast(self, entries: dict, sender = "server", target: str = "default", ignore: socket.socket = None):
-        for client in self.groups[target]:
-            if ignore is client.socket:
-                continue
-            if not client.connected:
-                client.pending_messages.setdefault(target, []).append(entries)
+        group = self.groups.get(target)
+        if group is None:
+            return
+        with group.lock:
+            entries = dict(entries)
+            entries[EntryForFormatedMessage.seq] = seq = self.offline_store.last_seq(target) + 1
+            # le journal utilise le format binaire, plus compact
+            frames = {common_lib.PROTOCOL_BINARY: common_lib.encode_frame(sender, target, entries, common_lib.PROTOCOL_BINARY)}
+            # le membre ignoré en direct ne se verra pas non plus rejouer ce message
+            ignored = self.clients.get_by_socket(ignore) if ignore is not None else None
+            self.offline_store.append(target, frames[common_lib.PROTOCOL_BINARY][1], ignored.nickname if ignored else None)
+
+            for client in tuple(group):
+                if ignore is client.socket:
+                    continue
+
+                if not client.connected:
+                    if target not in client.missed_since:
+                        client.missed_since[target] = seq
+                        self.log_state(server_state.OP_MISSED, client.nickname, target, seq)
+                    continue
+
+                frame = frames.get(client.protocol)
+                if frame is None:
+                    frame = frames[client.protocol] = common_lib.encode_frame(sender, target, entries, client.protocol)
+                common_lib.send_frame(client.socket, frame)
+
+
+    # Séquence à partir de laquelle rejouer un groupe à un membre qui se reconnecte :
+    # celle qu'il annonce (lastSeqs), sinon la première qu'il a manquée hors ligne.
+    def replay_from(self, client: Client, group_name: str, last_seqs: dict) -> int:
+        last = last_seqs.get(group_name)
+        if isinstance(last, int):
+            return last + 1
+        return client.missed_since.get(group_name, self.offline_store.last_seq(group_name) + 1)
+
+
+    # Rejoue les messages manqués par page, au rythme où le client les lit.
+    # Le coût ne dépend que du nombre de messages manqués, pas de la taille du journal.
+    def replay_missed_messages(self, client: Client, readers: dict[str, StoreReader]):
+        if client.missed_since:
+            self.log_state(server_state.OP_MISSED_CLEAR, client.nickname)
+        client.missed_since = {}
+
+        # les séquences ajoutées après l'ouverture des lecteurs arrivent déjà en direct
+        for reader in readers.values():
+            if reader.seq > reader.until_seq:
+                reader.close()
                 continue
+            client.socket.send_stream(self.stored_frames(reader, client.protocol))
+
+
+    # trames stockées (format binaire), converties si le client utilise le JSON
+    def stored_frames(self, reader, protocol: str):
+        for page in reader.pages():
+            for _, body in page:
+                if protocol != common_lib.PROTOCOL_BINARY:
+                    body = common_lib.encode_full_message(common_lib.decode_full_message(body), protocol)
+                yield (len(body).to_bytes(4, byteorder='big'), body)
+
+
+    # supprime du disque ce que plus aucun membre n'attend : déjà reçu par tous ceux qui accusent réception,
+    # et par les membres hors ligne
+    def compact_offline_store(self, group_name: str):
+        group = self.groups.get(group_name)
+        keep_from = self.offline_store.last_seq(group_name) + 1
+        for member in tuple(group or ()):
+            acked = member.acked.get(group_name)
+            if acked is not None:
+                keep_from = min(keep_from, acked + 1)
+            keep_from = min(keep_from, member.missed_since.get(group_name, keep_from))
+        self.offline_store.compact(group_name, keep_from)
+
+
+    # compaction périodique plutôt qu'à chaque reconnexion : une vague de reconnexions
+    # ne parcourt pas les membres de chaque groupe pour chaque client
+    def compact_tick(self):
+        if not self.ready.is_set():
+            return
+        for group_name in tuple(self.groups):
+            self.compact_offline_store(group_name)
+        self.call_later(self.COMPACT_INTERVAL, self.compact_tick)
 
-            self.send_message(client.socket, entries, sender, target)
+
+    # accusé cumulatif : {groupe: dernière séquence reçue sans trou}, un enregistrement du journal par accusé
+    def record_acks(self, client: Client, last_seqs):
+        if client is None or not isinstance(last_seqs, dict):
+            return
+        changed = []
+        for group_name, seq in last_seqs.items():
+            if group_name in client.groups and isinstance(seq, int) and seq > client.acked.get(group_name, -1):
+                client.acked[group_name] = seq
+                changed += (group_name, seq)
+        if changed:
+            self.log_state(server_state.OP_ACKED, client.nickname, *changed)
 
 
-    # Recevoir les messages de clients connectés
+    # Recevoir les messages d'un client connecté (moteur threadé : un thread par client)
     def handle(self, client: Client):
-        while client.connected:
+        sckt = client.socket
+        reader = common_lib.FrameReader(self.max_frame_size)
+        while True:
             try:
-                msg = common_lib.receive_message(client.socket)
-                target = msg[EntryForFormatedMessage.target]
-
-                if target == 'server':
-                    self.handle_action_from_client(msg)
-                else:
-                    content = msg[EntryForFormatedMessage.content]
-                    sender = msg[EntryForFormatedMessage.sender]
-                    self.broadcast({EntryForFormatedMessage.content: content}, sender, target)
+                frame = reader.read_frame(sckt)
+                msg = common_lib.decode_full_message(frame)
+                common_lib.show_message(msg, "MESSAGE RECEIVED")
+                delay = self.charge(sckt, len(frame), msg)
+                self.handle_message(msg, sckt)
+                if delay > 0:
+                    # client trop rapide : son thread cesse de lire, TCP le ralentit
+                    time.sleep(delay)
 
             except:
-                client.connected = False
-                client.socket.close()
-                entries = {
-                    EntryForFormatedMessage.action: ServerAction.info,
-                    EntryForFormatedMessage.content: f"{client.nickname} has left group"}
-                self.broadcast(entries, target=target)
+                self.on_connection_lost(sckt)
+                self.connection_closed()
                 break
 
 
+    # Traite un message reçu, quel que soit le moteur utilisé
+    # Aiguillage des messages reçus : une méthode par action adressée au serveur (self.handlers),
+    # les autres messages sont diffusés au groupe ciblé. Chaque appel est chronométré par type.
+    # sckt : connexion d'où vient le message, pour les actions qui ne doivent pas se fier au champ sender.
+    def handle_message(self, msg: dict, sckt=None):
+        target = msg[EntryForFormatedMessage.target]
+
+        if target == 'server':
+            action = msg[EntryForFormatedMessage.action]
+            handler = self.handlers.get(action)
+            if handler is None:
+                action, handler = self.UNKNOWN_ACTION, self.on_unknown_action
+        else:
+            action, handler = self.GROUP_MESSAGE, self.on_group_message
+
+        stats = self.handler_metrics.stats(action)
+        start = time.perf_counter_ns()
+        try:
+            handler(msg, sckt)
+        except BaseException:
+            stats.record_error()
+            raise
+        finally:
+            stats.record(time.perf_counter_ns() - start)
+
+
+    def on_group_message(self, msg: dict, sckt=None):
+        content = msg[EntryForFormatedMessage.content]
+        sender = msg[EntryForFormatedMessage.sender]
+        self.broadcast({EntryForFormatedMessage.content: content}, sender, msg[EntryForFormatedMessage.target])
+
+
+    # Nouvelle connexion : crée le client et lui donne un pseudo temporaire
+    def on_client_connected(self, sckt) -> Client:
+        new_client = Client(sckt)
+        new_client.rate = self.rate_limits.client_state()
+        self.clients.add(new_client)
+        self.watch_connection(sckt, self.heartbeat_interval)
+
+        #send a temporary nickname
+        tempNickname = new_client.id
+        giveTempNickname = {
+            EntryForFormatedMessage.action: ServerAction.giveTempNickname,
+            EntryForFormatedMessage.nickname: tempNickname,
+            EntryForFormatedMessage.protocols: common_lib.SUPPORTED_PROTOCOLS
+        }
+        self.send_message(new_client.socket, giveTempNickname)
+
+        self.show_clients()
+        return new_client
+
+
+    # Connexion perdue sans requestDisconnection (crash du client, coupure réseau...)
+    def on_connection_lost(self, sckt):
+        # lors d'une reconnexion, le socket est repris par le compte existant
+        client = self.clients.get_by_socket(sckt)
+        if client is None or not client.connected:
+            return
+
+        client.connected = False
+        self.drop_key_holder(client)
+        sckt.close()
+        self.broadcast_deconnection(client)
+
+
     def receive(self):
         while True:
             socket, address = self.server.accept()
-            print(f"Connected with {str(address)}\n")
+            if not self.admit_connection():
+                self.reject_connection(socket)
+                continue
+            chat_log.info(Category.conn, "Connected with %s", address)
 
-            new_client = Client(socket)
-            self.clients.append(new_client)
+            # les envois passent par une file bornée vidée par un thread d'écriture
+            queued_socket = outbound.QueuedSocket(socket, self.outbound_limits)
+            new_client = self.on_client_connected(queued_socket)
 
-            thread = threading.Thread(target=self.handle, args=(new_client,))
+            thread = threading.Thread(target=self.handle, args=(new_client,), daemon=True)
             thread.start()
 
-            #send a temporary nickname
-            tempNickname = new_client.id
-            giveTempNickname = {
-                EntryForFormatedMessage.action: ServerAction.giveTempNickname,
-                EntryForFormatedMessage.nickname: tempNickname
+
+    # refus rapide : une trame déjà encodée, sans attendre que le client la lise
+    def reject_connection(self, sckt: socket.socket):
+        try:
+            sckt.setblocking(False)
+            sckt.send(self.server_full_frame)
+        except OSError:
+            pass
+        sckt.close()
+
+
+    def on_request_connection(self, message: dict, sckt=None):
+        sender = message[EntryForFormatedMessage.sender]
+        public_key = message[EntryForFormatedMessage.publicKey]
+        nickname = message[EntryForFormatedMessage.nickname]
+        client_connecting = self.clients.get(sender)
+
+        # format de trame demandé par le client (les anciens clients n'en demandent pas)
+        protocol = message.get(EntryForFormatedMessage.protocol, common_lib.PROTOCOL_JSON)
+        if protocol not in common_lib.SUPPORTED_PROTOCOLS:
+            protocol = common_lib.PROTOCOL_JSON
+
+        #search for client with the same nickname
+        firstConnection = self.clients.get(nickname) is None
+
+        #valideConnection
+        # les clients récents reçoivent l'annuaire des groupes par pages, puis ses changements
+        groups_delta = EntryForFormatedMessage.groupsVersion in message
+
+        if firstConnection:
+            self.clients.update_data(client_connecting, nickname, public_key)
+            self.log_state(server_state.OP_REGISTER, nickname, *public_key)
+            client_connecting.protocol = protocol
+            client_connecting.groups_delta = groups_delta
+
+            #confirme connection, and share groups list
+            acceptConnection = {
+                EntryForFormatedMessage.action: ServerAction.acceptConnection,
+                EntryForFormatedMessage.nickname: nickname,
+                EntryForFormatedMessage.protocol: protocol
             }
-            self.send_message(new_client.socket, giveTempNickname)
+            acceptConnection.update(self.groups_listing(groups_delta))
+            self.send_message(client_connecting.socket, acceptConnection)
+            self.show_clients()
 
+        #valide reconnection
+        else:
+            existing_account = self.clients.get(nickname)
+            #already connected
+            if existing_account.connected:
+                refuseConnection = {
+                    EntryForFormatedMessage.action: ServerAction.error,
+                    EntryForFormatedMessage.errorType: ErrorType.alreadyConnected
+                }
+                self.send_message(client_connecting.socket, refuseConnection)
+                return
+
+            # update the existing account with the temporary data of the joining client
+            rejoining_client = self.clients.get(sender)
+            self.clients.remove(rejoining_client)
+
+            self.clients.update_data(existing_account, nickname, public_key, rejoining_client.socket)
+            self.log_state(server_state.OP_REGISTER, nickname, *public_key)
+            existing_account.protocol = protocol
+            existing_account.groups_delta = groups_delta
+            # compte rechargé au démarrage (voir restore_state) : pas encore de limite de débit
+            if existing_account.rate is None:
+                existing_account.rate = rejoining_client.rate
+
+            # dernières séquences reçues par le client, par groupe (absent pour les anciens clients) :
+            # seul l'écart est rejoué, et le client apprend d'où repart chaque groupe
+            last_seqs = message.get(EntryForFormatedMessage.lastSeqs)
+            if not isinstance(last_seqs, dict):
+                last_seqs = {}
+            self.record_acks(existing_account, last_seqs)
+            # le client a pu perdre des clés de groupe : il n'est sollicité que pour celles qu'il annonce,
+            # et les groupes dont il n'a plus la clé ne sont pas rejoués (les anciens clients n'annoncent rien)
+            self.drop_key_holder(existing_account)
+            held_keys = message.get(EntryForFormatedMessage.heldKeys)
+            replayed = tuple(existing_account.groups)
+            if isinstance(held_keys, list):
+                held_keys = {group_name for group_name in held_keys if isinstance(group_name, str)}
+                replayed = [group_name for group_name in replayed if group_name in held_keys]
+                for group_name in replayed:
+                    self.groups[group_name].key_holders.add(existing_account)
+            # lecteurs ouverts avant la réponse : la rétention ne peut plus supprimer ce qu'ils vont rejouer,
+            # et le client apprend la séquence réelle de reprise (après une rétention, des messages sont perdus)
+            readers = {group_name: self.offline_store.open_reader(group_name, self.replay_from(existing_account, group_name, last_seqs),
+                                                                  recipient=nickname)
+                       for group_name in replayed}
+
+            acceptReconnection = {
+                EntryForFormatedMessage.action: ServerAction.acceptReconnection,
+                EntryForFormatedMessage.nickname: nickname,
+                EntryForFormatedMessage.protocol: protocol,
+                EntryForFormatedMessage.lastSeqs: {group_name: reader.seq - 1 for group_name, reader in readers.items()}
+            }
+            acceptReconnection.update(self.groups_listing(groups_delta))
+            self.send_message(existing_account.socket, acceptReconnection)
+            existing_account.connected = True
+            self.replay_missed_messages(existing_account, readers)
             self.show_clients()
 
 
-    def handle_action_from_client(self, message: dict):
-        action = message[EntryForFormatedMessage.action]
-
-        match action:
-            case ClientAction.requestConnection:
-                sender = message[EntryForFormatedMessage.sender]
-                public_key = message[EntryForFormatedMessage.publicKey]
-                nickname = message[EntryForFormatedMessage.nickname]
-                client_connecting = Client.get_client(sender, self.clients)
-
-                #search for client with the same nickname
-                firstConnection = True
-                for client in self.clients:
-                    if nickname == client.nickname:
-                        firstConnection = False
-                
-                #valideConnection
-                if firstConnection:
-                    client_connecting.update_data(nickname, public_key)
-
-                    #confirme connection, and share groups list
-                    acceptConnection = {
-                        EntryForFormatedMessage.action: ServerAction.acceptConnection,
-                        EntryForFormatedMessage.nickname: nickname,
-                        EntryForFormatedMessage.groupsList: f"{list(self.groups.keys())}"
-                    }
-                    self.send_message(client_connecting.socket, acceptConnection)
-                    self.show_clients()
-                
-                #valide reconnection
-                else:
-                    existing_account = Client.get_client(nickname, self.clients)
-                    #already connected
-                    if existing_account.connected:
-                        refuseConnection = {
-                            EntryForFormatedMessage.action: ServerAction.error,
-                            EntryForFormatedMessage.errorType: ErrorType.alreadyConnected
-                        }
-                        self.send_message(client_connecting.socket, refuseConnection)
-                        return
-
-                    # update the existing account with the temporary data of the joining client
-                    rejoining_client = Client.get_client(sender, self.clients)
-                    existing_account.update_data(nickname, public_key, rejoining_client.socket)
-                    existing_account.connected = True
-
-                    self.clients.remove(rejoining_client)
-
-                    #TODO: Il faut aussi envoyer les messages en attentes
-                    acceptReconnection = {
-                        EntryForFormatedMessage.action: ServerAction.acceptReconnection,
-                        EntryForFormatedMessage.nickname: nickname,
-                        EntryForFormatedMessage.groupsList: f"{list(self.groups.keys())}"
-                    }
-                    self.send_message(client_connecting.socket, acceptReconnection)
-                    self.show_clients()
-
-            case ClientAction.requestJoinGroup:
-                group_name = message[EntryForFormatedMessage.groupName]
-                requester_name = message[EntryForFormatedMessage.sender]
-                
-                self.join_group(requester_name, group_name)
-
-            case ClientAction.requestAddGroup:
-                group_name = message[EntryForFormatedMessage.groupName]
-                creator_name = message[EntryForFormatedMessage.sender]
-
-                # check if the group name already exists
-                if group_name in self.groups:
-                    group_name_taken = {             
-                        EntryForFormatedMessage.action: ServerAction.error,
-                        EntryForFormatedMessage.errorType: ErrorType.groupNameTaken,
-                        EntryForFormatedMessage.groupName: group_name
-                    }
-                    self.send_message(client.socket, group_name_taken)
-                    return
+    def on_request_join_group(self, message: dict, sckt=None):
+        group_name = message[EntryForFormatedMessage.groupName]
+        requester_name = message[EntryForFormatedMessage.sender]
 
-                self.add_group(group_name, creator_name)
+        self.join_group(requester_name, group_name)
 
-            case ClientAction.requestLeaveGroup:
-                groupName = message[EntryForFormatedMessage.groupName]
-                senderName = message[EntryForFormatedMessage.sender]
-                client = Client.get_client(senderName, self.clients)
 
-                #remove client
-                self.groups[groupName].remove(client)
-                leaveGroup = {
-                    EntryForFormatedMessage.action: ServerAction.leaveGroup,
-                    EntryForFormatedMessage.groupName: groupName}
-                self.send_message(client.socket, leaveGroup)
+    def on_request_add_group(self, message: dict, sckt=None):
+        group_name = message[EntryForFormatedMessage.groupName]
+        creator_name = message[EntryForFormatedMessage.sender]
 
-                #broadcast that someone leave
-                clientHasLeave = {
-                    EntryForFormatedMessage.action: ServerAction.info,
-                    EntryForFormatedMessage.content: f'{senderName} has leave'}
-                self.broadcast(clientHasLeave, target=groupName)
+        # check if the group name already exists
+        if group_name in self.groups:
+            group_name_taken = {             
+                EntryForFormatedMessage.action: ServerAction.error,
+                EntryForFormatedMessage.errorType: ErrorType.groupNameTaken,
+                EntryForFormatedMessage.groupName: group_name
+            }
+            self.send_message(self.clients.get(creator_name).socket, group_name_taken)
+            return
 
-            case ClientAction.shareGroupKey:
-                group_name = message[EntryForFormatedMessage.groupName]                
-                nickname, groupKey = message[EntryForFormatedMessage.groupKey]
+        self.add_group(group_name, creator_name)
 
-                # retrouver le client pour qui la clé est destinée
-                target_client = Client.get_client(nickname, self.clients)
 
-                # faire appel à la fonction de callback correspondant au groupe dans le dictionnaire key_response_callbacks
-                # lors d'une prochaine demande pour rejoindre le groupe [group_name] : un nouveau callback écrasera l'ancien dans le dictionnaire
-                callback = self.group_key_response_callbacks[group_name]
-                callback(groupKey, target_client)
+    def on_request_leave_group(self, message: dict, sckt=None):
+        groupName = message[EntryForFormatedMessage.groupName]
+        senderName = message[EntryForFormatedMessage.sender]
+        client = self.clients.get(senderName)
+
+        group = self.groups.get(groupName)
+        if group is None or client not in group:
+            return
+
+        #remove client
+        group.remove(client)
+        self.log_state(server_state.OP_MEMBER_REMOVE, groupName, senderName)
+        leaveGroup = {
+            EntryForFormatedMessage.action: ServerAction.leaveGroup,
+            EntryForFormatedMessage.groupName: groupName}
+        self.send_message(client.socket, leaveGroup)
+
+        #broadcast that someone leave
+        clientHasLeave = {
+            EntryForFormatedMessage.action: ServerAction.info,
+            EntryForFormatedMessage.content: f'{senderName} has leave'}
+        self.broadcast(clientHasLeave, target=groupName)
+
+        # plus aucun membre : personne ne peut plus fournir la clé, le groupe disparaît de l'annuaire
+        if not group:
+            self.remove_group(groupName)
+
+
+    def on_request_groups(self, message: dict, sckt=None):
+        client = self.clients.get(message[EntryForFormatedMessage.sender])
+        after = message.get(EntryForFormatedMessage.offset)
+        count = message.get(EntryForFormatedMessage.count)
+        if client is None or not isinstance(after, int) or not isinstance(count, int):
+            return
+        names, cursor, version = self.directory.page(after, max(1, min(count, self.GROUPS_PAGE)))
+        self.send_message(client.socket, {
+            EntryForFormatedMessage.action: ServerAction.groupsPage,
+            EntryForFormatedMessage.groupsList: names,
+            EntryForFormatedMessage.offset: cursor,
+            EntryForFormatedMessage.groupsVersion: version
+        })
+
+
+    def on_share_group_key(self, message: dict, sckt=None):
+        group_name = message[EntryForFormatedMessage.groupName]
+        sender = self.clients.get(message[EntryForFormatedMessage.sender])
+        self.handle_group_keys(message, sender, group_name)
+
+
+    def on_ping(self, message: dict, sckt=None):
+        client = self.clients.get(message[EntryForFormatedMessage.sender])
+        if client is not None:
+            self.send_message(client.socket, {EntryForFormatedMessage.action: ServerAction.pong})
 
-            case ClientAction.requestDisconnection:
-                sender = message[EntryForFormatedMessage.sender]
-                client = Client.get_client(sender, self.clients)
-                client.connected = False
 
-                disconnect = {
-                    EntryForFormatedMessage.action: ServerAction.disconnect}
-                self.send_message(client.socket, disconnect)
+    def on_pong(self, message: dict, sckt=None):
+        pass # last_seen déjà mis à jour à la réception
 
-                client.socket.close()
-                self.broadcast_deconnection(client)
 
-                self.handle_admin_deconnection(client)
+    def on_ack_messages(self, message: dict, sckt=None):
+        client = self.clients.get(message[EntryForFormatedMessage.sender])
+        self.record_acks(client, message.get(EntryForFormatedMessage.lastSeqs))
 
-                self.show_clients()
 
-            case _:
-                print(f"Client tried this action: [{action}], but as no effect, because is undefined.")
+    def on_request_disconnection(self, message: dict, sckt=None):
+        sender = message[EntryForFormatedMessage.sender]
+        client = self.clients.get(sender)
+        client.connected = False
+        self.drop_key_holder(client)
 
+        disconnect = {
+            EntryForFormatedMessage.action: ServerAction.disconnect}
+        self.send_message(client.socket, disconnect)
 
+        client.socket.close()
+        self.broadcast_deconnection(client)
+
+        self.handle_admin_deconnection(client)
+
+        self.show_clients()
+
+
+    def on_unknown_action(self, message: dict, sckt=None):
+        chat_log.warning(Category.server, "Client tried this action: [%s], but as no effect, because is undefined.",
+                         message[EntryForFormatedMessage.action])
+
+
+    # bloque jusqu'à stop() ; port=0 pour laisser le système choisir un port libre
     def start(self):
+        if self.engine == server_socket.ENGINE_ASYNCIO:
+            self.async_engine = async_engine.AsyncServerEngine(self)
+            self.async_engine.run()
+            return
+
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server.bind((self.host, self.port))
-        self.server.listen(10)
-
-        print("The server is ready.")
+        self.server.listen(self.backlog)
+
+        self.on_ready(self.server.getsockname()[:2])
+        try:
+            self.receive()
+        except OSError:
+            # socket d'écoute fermé par stop()
+            if self.ready.is_set():
+                raise
+
+
+    # démarre le serveur dans un thread et attend qu'il écoute : renvoie (hôte, port)
+    def start_in_background(self, timeout: float = 5.0) -> tuple[str, int]:
+        self.thread = threading.Thread(target=self.start, daemon=True)
+        self.thread.start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError("Le serveur n'a pas démarré.")
+        return self.address
+
+
+    def on_ready(self, address: tuple[str, int]):
+        self.address = address
+        self.ready.set()
+        chat_log.info(Category.server, "The server is ready (%s) on %s:%s.", self.engine, *address)
         self.show_clients()
-        self.receive()
+        if self.heartbeat_interval:
+            self.call_later(self.heartbeats.tick, self.heartbeat_tick)
+        self.call_later(self.COMPACT_INTERVAL, self.compact_tick)
+        if self.state is not None:
+            self.call_later(self.state.interval, self.snapshot_tick)
+
+
+    # arrête d'écouter, coupe toutes les connexions et ferme le stockage hors ligne
+    def stop(self, timeout: float = 5.0):
+        if not self.ready.is_set():
+            return
+        self.ready.clear()
+
+        if self.engine == server_socket.ENGINE_ASYNCIO:
+            self.async_engine.stop()
+        else:
+            # shutdown réveille le thread bloqué dans accept(), close seul ne suffit pas sous Linux
+            try:
+                self.server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server.close()
+            self.close_connections()
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        self.offline_store.close()
+        self.close_state()
+
+
+    def close_connections(self):
+        for client in self.clients:
+            if client.connected:
+                # marqué déconnecté d'abord : la fermeture ne diffuse rien aux autres membres
+                client.connected = False
+                client.socket.abort()
 
 
     def send_message(self, client: socket.socket, entries: dict, sender = "server", target = ""):
-        common_lib.send_message(client, sender, target, entries)
+        # chaque client reçoit les trames dans le format négocié à sa connexion
+        owner = self.clients.get_by_socket(client)
+        protocol = owner.protocol if owner else common_lib.PROTOCOL_JSON
+        common_lib.send_message(client, sender, target, entries, protocol)
 
 
     def add_group(self, group_name: str, creator_name: str):
-        client = Client.get_client(creator_name, self.clients)
+        client = self.clients.get(creator_name)
 
         # create the group with his creator
-        self.groups[group_name] = [client]
+        group = Group(group_name)
+        group.add(client)
+        group.key_holders.add(client) # il crée la clé
+        self.groups[group_name] = group
+        self.log_state(server_state.OP_GROUP_ADD, group_name, creator_name)
 
         # make the creator join the group
         makeJoin = {
             EntryForFormatedMessage.action: ServerAction.joinGroup,
-            EntryForFormatedMessage.groupName: group_name}
+            EntryForFormatedMessage.groupName: group_name,
+            EntryForFormatedMessage.seq: self.offline_store.last_seq(group_name)}
         self.send_message(client.socket, makeJoin)
-        
-        # broadcast all the groups
-        share_groups = {
-            EntryForFormatedMessage.action: ServerAction.shareGroups,
-            EntryForFormatedMessage.groupsList: f"{list(self.groups.keys())}"
+
+        # annoncer le nouveau groupe à tous les clients
+        with self.directory.lock:
+            version = self.directory.add(group_name)
+            self.announce_groups(version, added=[group_name])
+
+
+    def remove_group(self, group_name: str):
+        self.groups.pop(group_name, None)
+        self.log_state(server_state.OP_GROUP_REMOVE, group_name)
+        with self.directory.lock:
+            version = self.directory.remove(group_name)
+            self.announce_groups(version, removed=[group_name])
+
+
+    # liste des groupes pour acceptConnection / acceptReconnection : la première page de l'annuaire,
+    # ou la liste complète pour les anciens clients
+    def groups_listing(self, groups_delta: bool) -> dict:
+        if not groups_delta:
+            return {EntryForFormatedMessage.groupsList: list(self.directory)}
+        names, cursor, version = self.directory.page(0, self.GROUPS_PAGE)
+        return {
+            EntryForFormatedMessage.groupsList: names,
+            EntryForFormatedMessage.offset: cursor,
+            EntryForFormatedMessage.groupsVersion: version
         }
 
+
+    # Prévient les clients connectés d'un changement de l'annuaire : seulement le changement
+    # (une trame encodée une fois par format), la liste complète pour les anciens clients.
+    # Appelé sous self.directory.lock : les changements partent dans l'ordre des versions.
+    def announce_groups(self, version: int, added: list[str] = (), removed: list[str] = ()):
+        changes = {
+            EntryForFormatedMessage.action: ServerAction.groupsChanged,
+            EntryForFormatedMessage.groupsVersion: version,
+            EntryForFormatedMessage.groupsAdded: list(added),
+            EntryForFormatedMessage.groupsRemoved: list(removed)
+        }
+        share_groups = None
+        frames = {}
         for client in self.clients:
-            self.send_message(client.socket, share_groups)
-    
-    # enregistrer une fonction de rappel lors d'une demande de clé de groupe
-    def register_callback_for_groupkey_response(self, group_name: str, callback: callable):
-        # enregistrer le callback pour un groupe donné
-        self.group_key_response_callbacks[group_name] = callback
+            # les clients pas encore connectés recevront la liste avec acceptConnection
+            if not client.connected or client.public_key is None:
+                continue
+            if client.groups_delta:
+                key = (ServerAction.groupsChanged, client.protocol)
+                entries = changes
+            elif added:
+                # les anciens clients ne savent qu'ajouter des groupes, à partir de la liste complète
+                key = (ServerAction.shareGroups, client.protocol)
+                if share_groups is None:
+                    share_groups = {
+                        EntryForFormatedMessage.action: ServerAction.shareGroups,
+                        EntryForFormatedMessage.groupsList: list(self.directory)
+                    }
+                entries = share_groups
+            else:
+                continue
 
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = common_lib.encode_frame("server", "", entries, client.protocol)
+            common_lib.send_frame(client.socket, frame)
+    
     # transmets la clé de groupe envoyé par l'admin vers le client à l'origine de la demande
     def handle_key_from_admin(self, group_key: str, client: Client, group_name: str):
-        print(f'callback de partage de clé pour le groupe {group_name} !')
-        print(f'clé de groupe reçue : {group_key}')
-        print(f'client à l\'origine de la demande : {client.nickname}')
+        chat_log.debug(Category.groups, "callback de partage de clé pour le groupe %s, demandé par %s", group_name, client.nickname)
 
         # ajouter le client à l'origine de la demande parmi les membres du groupe
-        group = self.groups[group_name]
-        already_in_group = any(member.nickname == client.nickname for member in group)
-
-        if not already_in_group:
-            self.groups[group_name].append(client)
+        group = self.groups.get(group_name)
+        if group is None:
+            return
+        if client not in group:
+            group.add(client)
+            self.log_state(server_state.OP_MEMBER_ADD, group_name, client.nickname)
+        group.key_holders.add(client)
 
         # broadcast that client has join
         broadcast_msg = {
@@ -320,17 +872,19 @@ class server_socket ():
         self.broadcast(broadcast_msg, target = group_name, ignore=client.socket)
 
         # make the client join the group with group key
+        # le nouveau membre ne reçoit que les messages suivant cette séquence
         make_join_msg = {
             EntryForFormatedMessage.action: ServerAction.joinGroup,
             EntryForFormatedMessage.groupName: group_name,
-            EntryForFormatedMessage.groupKey: group_key
+            EntryForFormatedMessage.groupKey: group_key,
+            EntryForFormatedMessage.seq: self.offline_store.last_seq(group_name)
         }
         self.send_message(client.socket, make_join_msg)
 
 
     def join_group(self, requester_name: str, group_name: str):
-        client = Client.get_client(requester_name, self.clients)
-        members: list[Client] = self.groups[group_name]
+        client = self.clients.get(requester_name)
+        members: Group = self.groups.get(group_name)
 
         # return an error if a participant requests to join an empty group
         if not members:
@@ -339,32 +893,269 @@ class server_socket ():
                 EntryForFormatedMessage.errorType: ErrorType.emptyGroup
             })
             return
-            
-        # determine if the client is already a member
-        in_group = any(member.nickname == requester_name for member in members)
 
+        with self.joins_lock:
+            pending = self.joins.add(client, group_name)
+        # une demande est déjà en cours pour ce client : elle sera relancée si besoin
+        if pending is not None:
+            self.ask_key_holder(pending)
+
+
+    # Choisit parmi quelques membres connectés qui ont la clé (group.key_holders) celui qui répondra
+    # le plus vite : le moins de demandes en cours, pondéré par son temps de réponse habituel.
+    # Les membres déjà sollicités pour cette demande ne sont repris que si repeat est vrai.
+    def choose_key_holder(self, pending: PendingJoin, repeat: bool) -> Client:
+        group = self.groups.get(pending.group_name)
+        holders = tuple(group.key_holders) if group is not None else ()
+        candidates = (member for member in holders
+                      if member.connected and member is not pending.requester and (repeat or member not in pending.asked))
+        return min(itertools.islice(candidates, self.HOLDER_SAMPLE),
+                   key=lambda member: (member.key_load + 1) * member.key_latency, default=None)
+
+
+    # Sollicite un membre pour la clé. Les demandes destinées au même membre pour le même groupe
+    # sont regroupées dans un seul requestKey.
+    def ask_key_holder(self, pending: PendingJoin, hedge: bool = False):
+        holder = self.choose_key_holder(pending, repeat=False)
+        if holder is None and not hedge:
+            holder = self.choose_key_holder(pending, repeat=True)
+        if holder is None:
+            if not hedge:
+                self.fail_join(pending, ErrorType.emptyGroup)
+            return
+
+        with self.joins_lock:
+            if self.joins.get(pending.id) is not pending:
+                return
+            pending.attempts += 1
+            if holder not in pending.asked:
+                holder.key_load += 1
+            pending.asked[holder] = time.monotonic()
+            batch = self.key_requests.setdefault((holder, pending.group_name), [])
+            batch.append(pending)
+            if len(batch) == 1:
+                self.call_later(self.JOIN_BATCH_DELAY, self.flush_key_requests, holder, pending.group_name)
+
+        # sans réponse rapide du premier membre, un second est sollicité en parallèle
+        if pending.attempts == 1:
+            hedge_delay = min(max(self.HEDGE_MIN_DELAY, 3 * holder.key_latency), self.JOIN_TIMEOUT / 2)
+            self.call_later(hedge_delay, self.hedge_join, pending.id)
+        self.call_later(self.JOIN_TIMEOUT, self.check_join, pending.id, pending.attempts)
+
+
+    def flush_key_requests(self, holder: Client, group_name: str):
+        with self.joins_lock:
+            batch = self.key_requests.pop((holder, group_name), [])
+            requesters = [(pending.id, pending.requester.nickname, pending.requester.public_key)
+                          for pending in batch if self.joins.get(pending.id) is pending]
+        if requesters:
+            self.send_message(holder.socket, {
+                EntryForFormatedMessage.action: ServerAction.requestKey,
+                EntryForFormatedMessage.groupName: group_name,
+                EntryForFormatedMessage.keyRequesters: requesters
+            })
+
+
+    def hedge_join(self, request_id: int):
+        with self.joins_lock:
+            pending = self.joins.get(request_id)
+        if pending is not None and pending.attempts == 1 and pending.requester.connected:
+            chat_log.debug(Category.groups, "clé pour %s (groupe %s) : second membre sollicité", pending.requester.nickname, pending.group_name)
+            self.ask_key_holder(pending, hedge=True)
+
+
+    # pas de réponse à temps : on sollicite un autre membre, ou on abandonne
+    def check_join(self, request_id: int, attempt: int):
+        with self.joins_lock:
+            pending = self.joins.get(request_id)
+            if pending is None or pending.attempts != attempt:
+                return
+
+        # les membres restés muets sont considérés comme lents pour les prochains choix
+        now = time.monotonic()
+        for holder, asked_at in pending.asked.items():
+            holder.key_latency = max(holder.key_latency, now - asked_at)
+
+        if not pending.requester.connected:
+            self.finish_join(pending)
+        elif pending.attempts > self.JOIN_RETRIES:
+            self.fail_join(pending, ErrorType.joinTimeout)
+        else:
+            chat_log.info(Category.groups, "pas de clé pour %s (groupe %s) : nouvelle tentative", pending.requester.nickname, pending.group_name)
+            self.ask_key_holder(pending)
+
+
+    # un membre qui se déconnecte (ou se reconnecte sans ses clés) n'est plus sollicité pour la clé
+    def drop_key_holder(self, client: Client):
+        for group_name in tuple(client.groups):
+            group = self.groups.get(group_name)
+            if group is not None:
+                group.key_holders.discard(client)
+
+
+    # retire la demande, les membres sollicités n'ont plus à y répondre
+    def finish_join(self, pending: PendingJoin):
+        with self.joins_lock:
+            if self.joins.get(pending.id) is not pending:
+                return False
+            self.joins.remove(pending)
+            for holder in pending.asked:
+                holder.key_load -= 1
+            return True
+
+
+    def fail_join(self, pending: PendingJoin, error_type: str):
+        self.finish_join(pending)
+        self.send_message(pending.requester.socket, {
+            EntryForFormatedMessage.action: ServerAction.error,
+            EntryForFormatedMessage.errorType: error_type,
+            EntryForFormatedMessage.groupName: pending.group_name
+        })
+
+
+    # réponse d'un membre : une clé chiffrée par demande, [(numéro de la demande, clé), ...].
+    # La première réponse valide l'emporte, les suivantes (membre sollicité en parallèle) sont ignorées.
+    def handle_group_keys(self, message: dict, sender: Client, group_name: str):
+        group = self.groups.get(group_name)
+        # seul un membre du groupe peut fournir sa clé
+        if group is None or sender not in group:
+            chat_log.warning(Category.groups, "clé du groupe %s envoyée par un non-membre", group_name)
+            return
+
+        # le membre sollicité n'a pas la clé : il n'est plus sollicité, ses demandes passent à un autre membre
+        if message.get(EntryForFormatedMessage.errorType) == ErrorType.groupKeyUnavailable:
+            chat_log.info(Category.groups, "%s n'a pas la clé du groupe %s", sender.nickname, group_name)
+            group.key_holders.discard(sender)
+            with self.joins_lock:
+                waiting = [pending for pending in self.joins.by_id.values()
+                           if pending.group_name == group_name and sender in pending.asked]
+            for pending in waiting:
+                self.ask_key_holder(pending)
+            return
 
-        admin = members[0]
-        keyRequester = (client.nickname, client.public_key)
+        group_keys = message.get(EntryForFormatedMessage.groupKeys)
+        if group_keys is None:
+            # ancien format : une seule clé, (pseudo du demandeur, clé)
+            nickname, group_key = message[EntryForFormatedMessage.groupKey]
+            with self.joins_lock:
+                pending = self.joins.get_by_requester(nickname, group_name)
+            group_keys = [(pending.id, group_key)] if pending else []
+
+        now = time.monotonic()
+        for request_id, group_key in group_keys:
+            with self.joins_lock:
+                pending = self.joins.get(request_id)
+            if pending is None or pending.group_name != group_name:
+                continue # déjà servie par un autre membre, ou abandonnée
+
+            asked_at = pending.asked.get(sender)
+            if asked_at is not None:
+                # moyenne glissante du temps de réponse de ce membre
+                sender.key_latency = 0.8 * sender.key_latency + 0.2 * (now - asked_at)
+            if self.finish_join(pending) and pending.requester.connected:
+                self.handle_key_from_admin(group_key, pending.requester, group_name)
+
+
+    # Fichiers : l'offre est diffusée au groupe (et gardée pour les membres hors ligne), puis chaque membre
+    # intéressé tire les morceaux chiffrés un petit nombre à la fois (FILE_WINDOW). Chaque morceau est une
+    # trame ordinaire adressée au seul demandeur : rien n'est gardé en mémoire, et les messages du groupe
+    # s'intercalent entre les morceaux au lieu d'attendre la fin d'un gros envoi.
+    # L'expéditeur et le demandeur sont reconnus à leur connexion, jamais au champ sender du message :
+    # personne ne peut proposer un fichier, en fournir les morceaux ou les demander à la place d'un autre.
+    def offer_file(self, message: dict, sckt=None):
+        owner = self.clients.get_by_socket(sckt)
+        group_name = message[EntryForFormatedMessage.groupName]
+        group = self.groups.get(group_name)
+        if owner is None or group is None or owner not in group:
+            chat_log.warning(Category.groups, "fichier proposé au groupe %s par un non-membre", group_name)
+            return
 
-        # envoyer une requete à l'admin pour demande la clé de groupe
-        self.send_message(admin.socket, {
-            EntryForFormatedMessage.action: ServerAction.requestKey,
+        shared = self.shared_files.add(message[EntryForFormatedMessage.fileId], owner, group_name,
+                                       message[EntryForFormatedMessage.fileSize], message[EntryForFormatedMessage.chunkSize])
+        if shared is None:
+            chat_log.warning(Category.groups, "offre de fichier invalide de %s", owner.nickname)
+            return
+
+        chat_log.info(Category.groups, "%s propose un fichier de %d octets au groupe %s", owner.nickname, shared.size, group_name)
+        self.broadcast({
+            EntryForFormatedMessage.action: ServerAction.fileOffer,
             EntryForFormatedMessage.groupName: group_name,
-            EntryForFormatedMessage.keyRequester: keyRequester
+            EntryForFormatedMessage.nickname: owner.nickname,
+            EntryForFormatedMessage.fileId: shared.id,
+            EntryForFormatedMessage.fileSize: shared.size,
+            EntryForFormatedMessage.chunkSize: shared.chunk_size,
+            EntryForFormatedMessage.content: message[EntryForFormatedMessage.content] # nom du fichier, chiffré
+        }, target=group_name, ignore=owner.socket)
+
+
+    # un membre demande count morceaux à partir de offset : transmis à l'expéditeur
+    def request_file_chunks(self, message: dict, sckt=None):
+        requester = self.clients.get_by_socket(sckt)
+        file_id = message[EntryForFormatedMessage.fileId]
+        shared = self.shared_files.get(file_id)
+        group = self.groups.get(shared.group_name) if shared else None
+        if requester is None:
+            return
+
+        if group is None or requester not in group or not shared.owner.connected:
+            self.send_message(requester.socket, {
+                EntryForFormatedMessage.action: ServerAction.error,
+                EntryForFormatedMessage.errorType: ErrorType.fileUnavailable,
+                EntryForFormatedMessage.fileId: file_id
+            })
+            return
+
+        offset = message[EntryForFormatedMessage.offset]
+        count = min(message[EntryForFormatedMessage.count], common_lib.FILE_WINDOW)
+        if not 0 <= offset < shared.size or count < 1:
+            return
+
+        self.send_message(shared.owner.socket, {
+            EntryForFormatedMessage.action: ServerAction.fileChunksRequested,
+            EntryForFormatedMessage.fileId: file_id,
+            EntryForFormatedMessage.nickname: requester.nickname,
+            EntryForFormatedMessage.offset: offset,
+            EntryForFormatedMessage.count: count
         })
 
-        # enregistrer une fonction de rappel pour traiter la réponse de l'admin
-        self.register_callback_for_groupkey_response(
-            group_name,
-            lambda key, client : self.handle_key_from_admin(key, client, group_name)
-        )
+
+    # un morceau envoyé par l'expéditeur du fichier, pour un seul membre
+    def forward_file_chunk(self, message: dict, sckt=None):
+        owner = self.clients.get_by_socket(sckt)
+        shared = self.shared_files.get(message[EntryForFormatedMessage.fileId])
+        if shared is None or owner is None or shared.owner is not owner:
+            chat_log.warning(Category.groups, "morceau de fichier envoyé par un autre client que son expéditeur")
+            return
+
+        requester = self.clients.get(message[EntryForFormatedMessage.nickname])
+        group = self.groups.get(shared.group_name)
+        if requester is None or not requester.connected or group is None or requester not in group:
+            return
+
+        self.send_message(requester.socket, {
+            EntryForFormatedMessage.action: ServerAction.fileChunk,
+            EntryForFormatedMessage.fileId: shared.id,
+            EntryForFormatedMessage.offset: message[EntryForFormatedMessage.offset],
+            EntryForFormatedMessage.content: message[EntryForFormatedMessage.content]
+        }, target=shared.group_name)
+
+
+    # exécute callback(*args) après delay secondes, dans le thread du moteur (asyncio) ou un thread à part
+    def call_later(self, delay: float, callback, *args):
+        if self.engine == server_socket.ENGINE_ASYNCIO:
+            self.async_engine.loop.call_later(delay, callback, *args)
+            return
+        timer = threading.Timer(delay, callback, args)
+        timer.daemon = True
+        timer.start()
 
     def handle_admin_deconnection(self, client: Client):
-        # vérifie si le client déconnecté est l'admin (index 0) dans un groupe et le déplace à la fin de la liste.
-        for group_name, members in self.groups.items():
-            if members and members[0] == client:
-                members.append(members.pop(0))  # déplacer l'admin à la fin du groupe
+        # vérifie si le client déconnecté est l'admin (premier membre) d'un de ses groupes et le déplace à la fin.
+        for group_name in tuple(client.groups):
+            members = self.groups[group_name]
+            if members.admin is client:
+                members.rotate_admin()  # déplacer l'admin à la fin du groupe
+                self.log_state(server_state.OP_MEMBER_TO_END, group_name, client.nickname)
 
                 broadcast_admin_changed = {
                     EntryForFormatedMessage.action: ServerAction.info,
@@ -373,15 +1164,87 @@ class server_socket ():
                 self.broadcast(broadcast_admin_changed, target=group_name, ignore=client.socket)
 
     def broadcast_deconnection(self, client: Client):
-        # parcourir les groupes auxquels appartient le client
-        for group_name, members in self.groups.items():
-            if client in members:
-                # diffuser uniquement aux membres de ce groupe
-                entries = {
-                    EntryForFormatedMessage.action: ServerAction.info,
-                    EntryForFormatedMessage.content: f"{client.nickname} left group."
-                }
-                self.broadcast(entries, target=group_name, ignore=client.socket)
+        # parcourir uniquement les groupes auxquels appartient le client (index inverse)
+        for group_name in tuple(client.groups):
+            # diffuser uniquement aux membres de ce groupe
+            entries = {
+                EntryForFormatedMessage.action: ServerAction.info,
+                EntryForFormatedMessage.content: f"{client.nickname} left group."
+            }
+            self.broadcast(entries, target=group_name, ignore=client.socket)
 
-server = server_socket()
-server.start()
\ No newline at end of file
+# kill -USR1 <pid> : profil de `profile_seconds` secondes ; kill -USR2 <pid> : temps passé par action.
+# Les signaux sont bloqués dans tous les threads (block_signals, avant d'en créer) et attendus par un thread
+# dédié : rien ne s'exécute au milieu du code interrompu, qui peut tenir un verrou (chat_log, threading...).
+DIAGNOSTIC_SIGNALS = {getattr(signal, 'SIGUSR1', None), getattr(signal, 'SIGUSR2', None)} - {None}
+
+def block_signals() -> bool:
+    if not DIAGNOSTIC_SIGNALS or not hasattr(signal, 'pthread_sigmask'):
+        return False # Windows
+    signal.pthread_sigmask(signal.SIG_BLOCK, DIAGNOSTIC_SIGNALS)
+    return True
+
+
+def watch_signals(server: server_socket, profile_seconds: float):
+    def wait_signals():
+        while True:
+            if signal.sigwait(DIAGNOSTIC_SIGNALS) == signal.SIGUSR1:
+                path = server.profiler.start(profile_seconds)
+                chat_log.info(Category.server, "Profil en cours (%ss) : %s", profile_seconds, path or "déjà en cours")
+            else:
+                server.log_handler_metrics()
+    threading.Thread(target=wait_signals, name='signals', daemon=True).start()
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Serveur du mini-chat sécurisé")
+    parser.add_argument("--host", default=common_lib.HOST)
+    parser.add_argument("--port", type=int, default=common_lib.PORT)
+    parser.add_argument("--engine", choices=[server_socket.ENGINE_ASYNCIO, server_socket.ENGINE_THREADED], default=server_socket.ENGINE_ASYNCIO)
+    parser.add_argument("--backlog", type=int, default=common_lib.BACKLOG)
+    parser.add_argument("--out-high", type=int, default=1 << 20, help="octets en file au-delà desquels un client est considéré lent")
+    parser.add_argument("--out-low", type=int, default=256 << 10, help="octets en file en dessous desquels un client lent est rétabli")
+    parser.add_argument("--slow-policy", choices=[outbound.POLICY_DROP, outbound.POLICY_DISCONNECT], default=outbound.POLICY_DISCONNECT)
+    parser.add_argument("--slow-grace", type=float, default=5.0, help="secondes tolérées au-dessus de --out-high avant déconnexion")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="dossier des messages en attente pour les clients déconnectés")
+    parser.add_argument("--store-max-mb", type=int, default=256, help="taille maximale conservée par groupe (Mo)")
+    parser.add_argument("--store-max-days", type=float, default=30, help="âge maximal des messages conservés (jours)")
+    parser.add_argument("--max-frame", type=int, default=common_lib.MAX_FRAME_SIZE, help="taille maximale d'une trame reçue (octets)")
+    parser.add_argument("--rate-client-msgs", type=float, default=50, help="messages/s par client (0 = sans limite)")
+    parser.add_argument("--rate-client-bytes", type=float, default=4 << 20, help="octets/s par client (0 = sans limite)")
+    parser.add_argument("--rate-group-msgs", type=float, default=1000, help="messages/s vers un même groupe (0 = sans limite)")
+    parser.add_argument("--rate-group-bytes", type=float, default=16 << 20, help="octets/s vers un même groupe (0 = sans limite)")
+    parser.add_argument("--rate-burst", type=float, default=2.0, help="secondes de débit tolérées en rafale au-dessus des limites")
+    parser.add_argument("--max-connections", type=int, default=10000, help="connexions ouvertes en même temps (0 = sans limite)")
+    parser.add_argument("--heartbeat", type=float, default=15.0, help="secondes de silence avant d'envoyer un ping à un client (0 = jamais)")
+    parser.add_argument("--heartbeat-timeout", type=float, default=10.0, help="secondes accordées pour répondre au ping avant de couper la connexion")
+    parser.add_argument("--state-dir", default="", help="dossier de l'instantané et du journal de l'état du serveur (vide, par défaut = pas de persistance)")
+    parser.add_argument("--state-interval", type=float, default=300.0, help="secondes entre deux instantanés de l'état du serveur")
+    parser.add_argument("--state-fsync", action="store_true", help="fsync après chaque modification journalisée (plus lent, survit à une coupure de courant)")
+    parser.add_argument("--profile-dir", default="profiles", help="dossier des profils écrits sur SIGUSR1 (piles repliées, pour flamegraph.pl ou speedscope)")
+    parser.add_argument("--profile-seconds", type=float, default=10.0, help="durée d'échantillonnage d'un profil déclenché par SIGUSR1")
+    parser.add_argument("--log", default="", help='niveaux de journalisation, ex. "net=debug/100,clients=debug,*=warning" (complète CHAT_LOG)')
+    args = parser.parse_args(argv)
+    signals = block_signals()
+
+    chat_log.configure(args.log)
+    limits = outbound.OutboundLimits(args.out_high, args.out_low, args.slow_policy, args.slow_grace)
+    store = OfflineStore(args.store_dir, max_group_bytes=args.store_max_mb << 20, max_age=args.store_max_days * 24 * 3600)
+    rate_limits = ratelimit.RateLimits(args.rate_client_msgs, args.rate_client_bytes, args.rate_group_msgs, args.rate_group_bytes,
+                                       args.rate_burst, args.max_connections)
+    state = ServerState(args.state_dir, args.state_interval, fsync=args.state_fsync) if args.state_dir else None
+    server = server_socket(args.host, args.port, args.engine, args.backlog, limits, store, args.max_frame, rate_limits,
+                           args.heartbeat, args.heartbeat_timeout, state, SamplingProfiler(args.profile_dir))
+    if signals:
+        watch_signals(server, args.profile_seconds)
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+        server.close_state()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import collections
+import threading
+from typing import Optional
+from registry import Client
+
+
+
+# Un fichier proposé à un groupe. Le serveur n'en garde que la description :
+# le contenu reste chez l'expéditeur et ne fait que transiter, morceau par morceau, vers chaque membre qui le demande.
+class SharedFile ():
+    def __init__(self, id: str, owner: Client, group_name: str, size: int, chunk_size: int):
+        self.id = id
+        self.owner = owner
+        self.group_name = group_name
+        self.size = size
+        self.chunk_size = chunk_size
+
+
+
+# Fichiers proposés, par identifiant. Au-delà de max_per_owner fichiers pour un même expéditeur,
+# les plus anciens sont oubliés : la table reste bornée même si un client en propose sans fin.
+class SharedFileTable ():
+    def __init__(self, max_chunk_size: int, max_per_owner: int = 64):
+        self.max_chunk_size = max_chunk_size
+        self.max_per_owner = max_per_owner
+        self.by_id: dict[str, SharedFile] = {}
+        self.by_owner: dict[Client, collections.deque] = {}
+        self.lock = threading.Lock() # moteur threadé : un thread par client
+
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+
+    # None si la description est invalide ou si l'identifiant appartient déjà à un autre client
+    def add(self, id: str, owner: Client, group_name: str, size: int, chunk_size: int) -> Optional[SharedFile]:
+        if not isinstance(id, str) or not id or not isinstance(size, int) or size < 0:
+            return None
+        if not isinstance(chunk_size, int) or not 0 < chunk_size <= self.max_chunk_size:
+            return None
+
+        with self.lock:
+            existing = self.by_id.get(id)
+            if existing is not None and existing.owner is not owner:
+                return None
+
+            shared = self.by_id[id] = SharedFile(id, owner, group_name, size, chunk_size)
+            if existing is None:
+                owned = self.by_owner.setdefault(owner, collections.deque())
+                owned.append(id)
+                if len(owned) > self.max_per_owner:
+                    self.by_id.pop(owned.popleft(), None)
+            return shared
+
+
+    def get(self, id: str) -> Optional[SharedFile]:
+        return self.by_id.get(id)
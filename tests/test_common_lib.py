@@ -0,0 +1,129 @@
+import socket
+import pytest
+import common_lib
+from common_lib import EntryForFormatedMessage, ClientAction, ServerAction
+
+
+def round_trip(msg: dict) -> dict:
+    return common_lib.decode_full_message(common_lib.encode_full_message(msg, common_lib.PROTOCOL_BINARY))
+
+
+def test_binary_round_trip_of_protocol_messages():
+    msg = {
+        EntryForFormatedMessage.sender: "alice",
+        EntryForFormatedMessage.target: "server",
+        EntryForFormatedMessage.action: ClientAction.requestConnection,
+        EntryForFormatedMessage.nickname: "élodie",
+        EntryForFormatedMessage.publicKey: ('10001', 'c0ffee' * 40),
+        EntryForFormatedMessage.lastSeqs: {'g': 12, 'h': 0},
+        EntryForFormatedMessage.groupsVersion: 3,
+        EntryForFormatedMessage.protocol: common_lib.PROTOCOL_BINARY,
+    }
+    assert round_trip(msg) == {**msg, EntryForFormatedMessage.publicKey: ['10001', 'c0ffee' * 40]}
+
+
+def test_binary_values():
+    msg = {
+        EntryForFormatedMessage.content: b'\x00\xff' * 300, # longueur sur 5 octets
+        EntryForFormatedMessage.seq: -(1 << 70),
+        EntryForFormatedMessage.offset: 0,
+        EntryForFormatedMessage.count: 2.5,
+        EntryForFormatedMessage.groupsList: ["a", "", None, True, False],
+        EntryForFormatedMessage.errorType: "pas un atome",
+        "inconnue": {"clé": [1, 2]},
+    }
+    assert round_trip(msg) == msg
+
+
+def test_hex_keys_travel_as_bytes_and_come_back_identical():
+    keys = ['abc', '0abc', 'ABC', 'xyz', '']
+    msg = {EntryForFormatedMessage.groupKeys: [(1, key) for key in keys]}
+    assert round_trip(msg)[EntryForFormatedMessage.groupKeys] == [[1, key] for key in keys]
+
+    hex_key = 'ab' * 256
+    binary = common_lib.encode_full_message({EntryForFormatedMessage.groupKey: hex_key}, common_lib.PROTOCOL_BINARY)
+    assert len(binary) < len(hex_key) // 2 + 10
+
+
+def test_actions_are_one_byte_atoms():
+    msg = {EntryForFormatedMessage.action: ServerAction.requestKey}
+    assert len(common_lib.encode_full_message(msg, common_lib.PROTOCOL_BINARY)) == 5
+    assert round_trip(msg) == msg
+
+
+def test_json_and_binary_frames_decode_alike():
+    entries = {EntryForFormatedMessage.action: ServerAction.info, EntryForFormatedMessage.content: "bonjour"}
+    for protocol in (common_lib.PROTOCOL_JSON, common_lib.PROTOCOL_BINARY):
+        header, body = common_lib.encode_frame("server", "g", entries, protocol)
+        assert int.from_bytes(header, 'big') == len(body)
+        message = common_lib.decode_full_message(body)
+        assert message[EntryForFormatedMessage.sender] == "server"
+        assert message[EntryForFormatedMessage.target] == "g"
+        assert message[EntryForFormatedMessage.content] == "bonjour"
+
+
+def test_groups_list_is_parsed_from_both_formats():
+    groups = ["a", "b c"]
+    json_msg = common_lib.decode_full_message(common_lib.encode_full_message({EntryForFormatedMessage.groupsList: groups}))
+    assert common_lib.parse_groups_list(json_msg[EntryForFormatedMessage.groupsList]) == groups
+    assert common_lib.parse_groups_list(round_trip({EntryForFormatedMessage.groupsList: groups})[EntryForFormatedMessage.groupsList]) == groups
+
+
+def frames_of(*bodies: bytes) -> bytes:
+    return b''.join(len(body).to_bytes(4, 'big') + body for body in bodies)
+
+
+def feed(reader: common_lib.FrameReader, data: bytes, chunk: int) -> list[bytes]:
+    frames = []
+    start = 0
+    while start < len(data):
+        # comme recv_into : au plus la place libre du tampon
+        buffer = reader.get_buffer()
+        piece = data[start:start + min(chunk, len(buffer))]
+        buffer[:len(piece)] = piece
+        reader.buffer_updated(len(piece))
+        start += len(piece)
+        frames += [bytes(frame) for frame in reader.frames()]
+    return frames
+
+
+def test_frame_reader_reassembles_frames_split_anywhere():
+    bodies = [b'a', b'', b'x' * 1000, b'fin']
+    for chunk in (1, 3, 7, 4096):
+        assert feed(common_lib.FrameReader(buffer_size=16), frames_of(*bodies), chunk) == bodies
+
+
+def test_frame_reader_grows_for_a_big_frame_then_shrinks():
+    reader = common_lib.FrameReader(max_frame_size=1 << 16, buffer_size=64)
+    assert feed(reader, frames_of(b'y' * 50000), 8192) == [b'y' * 50000]
+    reader.get_buffer()
+    assert len(reader.buffer) == 64
+
+
+def test_frame_reader_keeps_its_buffer_for_unaligned_frames():
+    reader = common_lib.FrameReader(buffer_size=1024)
+    buffer = reader.buffer
+    bodies = [bytes([i % 256]) * 97 for i in range(5000)] # trames de 101 octets, à cheval sur le bord du tampon
+    assert feed(reader, frames_of(*bodies), 1000) == bodies
+    assert reader.buffer is buffer
+    assert len(reader.buffer) == 1024
+
+
+def test_frame_reader_refuses_frames_over_the_limit():
+    reader = common_lib.FrameReader(max_frame_size=100)
+    assert feed(reader, frames_of(b'z' * 100), 50) == [b'z' * 100]
+    with pytest.raises(common_lib.FrameTooLarge):
+        # refusé dès l'en-tête, avant de recevoir (ou d'allouer) le corps
+        feed(reader, (101).to_bytes(4, 'big'), 4)
+
+
+def test_read_frame_on_a_socket():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(frames_of(b'un', b'deux'))
+        left.shutdown(socket.SHUT_WR)
+        reader = common_lib.FrameReader()
+        assert bytes(reader.read_frame(right)) == b'un'
+        assert bytes(reader.read_frame(right)) == b'deux'
+        with pytest.raises(ConnectionError):
+            reader.read_frame(right)
@@ -0,0 +1,160 @@
+import os
+import pytest
+import secret_box
+import serveur
+from common_lib import ClientAction, EntryForFormatedMessage, ErrorType, ServerAction
+from file_transfer import Download, Upload
+from offline_store import OfflineStore
+from registry import Client, Group
+from shared_files import SharedFileTable
+from tests.test_key_holders import FakeSocket
+
+
+def transfer(upload: Upload, download: Download, box) -> None:
+    request = download.next_request()
+    while request is not None:
+        for offset, cipher in upload.chunks(box, *request):
+            download.write(box, offset, bytes(cipher))
+        request = download.next_request()
+
+
+def test_upload_then_download(tmp_path):
+    box, _ = secret_box.secret_box_gen()
+    data = os.urandom(10 * 16 + 5)
+    (tmp_path / 'source').write_bytes(data)
+    upload = Upload('f', str(tmp_path / 'source'), 'g', chunk_size=16)
+    download = Download('f', str(tmp_path / 'copy'), upload.size, 16, window=4)
+    transfer(upload, download, box)
+    assert download.done
+    download.finish()
+    assert (tmp_path / 'copy').read_bytes() == data
+    assert not os.path.exists(download.part_path)
+
+
+def test_moved_or_replayed_chunk_is_refused(tmp_path):
+    box, _ = secret_box.secret_box_gen()
+    (tmp_path / 'source').write_bytes(b'a' * 16 + b'b' * 16)
+    upload = Upload('f', str(tmp_path / 'source'), 'g', chunk_size=16)
+    download = Download('f', str(tmp_path / 'copy'), upload.size, 16)
+    first = bytes(next(upload.chunks(box, 0, 1))[1])
+    assert download.write(box, 0, first)
+    # le premier morceau présenté comme le second : l'en-tête chiffré trahit sa vraie position
+    with pytest.raises(ValueError):
+        download.write(box, 16, first)
+    assert not download.write(box, 0, first) # doublon : ignoré
+    assert download.received == 16
+    download.close()
+
+
+def test_download_resumes_from_the_complete_chunks_of_the_part_file(tmp_path):
+    box, _ = secret_box.secret_box_gen()
+    data = os.urandom(64)
+    (tmp_path / 'source').write_bytes(data)
+    (tmp_path / 'copy.part').write_bytes(data[:40]) # deux morceaux complets et un morceau entamé
+    upload = Upload('f', str(tmp_path / 'source'), 'g', chunk_size=16)
+    download = Download('f', str(tmp_path / 'copy'), 64, 16, window=4)
+    assert download.received == 32
+    assert download.next_request() == (32, 2)
+    download.restart()
+    transfer(upload, download, box)
+    download.finish()
+    assert (tmp_path / 'copy').read_bytes() == data
+
+
+def test_requests_keep_a_window_of_chunks_in_flight(tmp_path):
+    download = Download('f', str(tmp_path / 'copy'), 16 * 20, 16, window=8)
+    assert download.next_request() == (0, 8)
+    assert download.next_request() is None # 8 en route
+    download.received = 16 * 4
+    assert download.next_request() == (16 * 8, 4)
+    download.restart()
+    assert download.requested == 16 * 4
+    download.close()
+
+
+
+def owner(nickname: str) -> Client:
+    client = Client(None)
+    client.nickname = nickname
+    return client
+
+
+def test_shared_files_are_bounded_per_owner():
+    table = SharedFileTable(max_chunk_size=1024, max_per_owner=2)
+    alice, bob = owner('alice'), owner('bob')
+    for id in ('a1', 'a2', 'a3'):
+        assert table.add(id, alice, 'g', 100, 64) is not None
+    assert table.add('b1', bob, 'g', 100, 64) is not None
+    assert table.get('a1') is None and table.get('a3').owner is alice
+    assert len(table) == 3
+    # une nouvelle offre du même fichier ne compte pas deux fois
+    assert table.add('a3', alice, 'g', 200, 64).size == 200
+    assert table.get('a2') is not None
+
+
+def test_shared_files_refuse_invalid_or_foreign_offers():
+    table = SharedFileTable(max_chunk_size=1024)
+    alice, bob = owner('alice'), owner('bob')
+    assert table.add('', alice, 'g', 100, 64) is None
+    assert table.add('f', alice, 'g', -1, 64) is None
+    assert table.add('f', alice, 'g', 100, 0) is None
+    assert table.add('f', alice, 'g', 100, 2048) is None
+    assert table.add('f', alice, 'g', 100, 64) is not None
+    assert table.add('f', bob, 'g', 100, 64) is None # identifiant déjà pris par un autre client
+    assert table.get('f').owner is alice
+
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = serveur.server_socket(port=0, offline_store=OfflineStore(str(tmp_path / 'store')))
+    group = server.groups['g'] = Group('g')
+    for nickname in ('alice', 'bob', 'mallory', 'eve'):
+        client = Client(FakeSocket())
+        client.nickname = nickname
+        server.clients.add(client)
+        if nickname != 'eve':
+            group.add(client)
+    yield server
+    server.offline_store.close()
+
+
+def send(server, nickname: str, action: str, entries: dict, sender: str = None):
+    server.handle_message({
+        EntryForFormatedMessage.sender: sender or nickname, EntryForFormatedMessage.target: "server",
+        EntryForFormatedMessage.action: action, **entries
+    }, server.clients.get(nickname).socket)
+
+
+def received(server, nickname: str, action: str) -> list[dict]:
+    return [message for message in server.clients.get(nickname).socket.messages()
+            if message.get(EntryForFormatedMessage.action) == action]
+
+
+def test_file_owner_is_the_connection_not_the_sender_field(server):
+    send(server, 'alice', ClientAction.offerFile, {
+        EntryForFormatedMessage.groupName: 'g', EntryForFormatedMessage.fileId: 'f',
+        EntryForFormatedMessage.fileSize: 100, EntryForFormatedMessage.chunkSize: 64,
+        EntryForFormatedMessage.content: 'nom'})
+    assert server.shared_files.get('f').owner is server.clients.get('alice')
+    assert len(received(server, 'bob', ServerAction.fileOffer)) == 1
+
+    chunk = {EntryForFormatedMessage.fileId: 'f', EntryForFormatedMessage.nickname: 'bob',
+             EntryForFormatedMessage.offset: 0, EntryForFormatedMessage.content: 'morceau'}
+    send(server, 'mallory', ClientAction.shareFileChunk, chunk, sender='alice')
+    assert received(server, 'bob', ServerAction.fileChunk) == []
+    send(server, 'alice', ClientAction.shareFileChunk, chunk)
+    assert len(received(server, 'bob', ServerAction.fileChunk)) == 1
+
+
+def test_chunk_requests_name_the_real_requester(server):
+    server.shared_files.add('f', server.clients.get('alice'), 'g', 100, 64)
+    window = {EntryForFormatedMessage.fileId: 'f', EntryForFormatedMessage.offset: 0, EntryForFormatedMessage.count: 2}
+    send(server, 'mallory', ClientAction.requestFileChunks, window, sender='bob')
+    (request,) = received(server, 'alice', ServerAction.fileChunksRequested)
+    assert request[EntryForFormatedMessage.nickname] == 'mallory'
+
+    send(server, 'eve', ClientAction.requestFileChunks, window, sender='bob')
+    assert received(server, 'alice', ServerAction.fileChunksRequested) == []
+    (error,) = received(server, 'eve', ServerAction.error)
+    assert error[EntryForFormatedMessage.errorType] == ErrorType.fileUnavailable
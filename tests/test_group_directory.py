@@ -0,0 +1,58 @@
+from group_directory import GroupDirectory
+
+
+def read_all(directory: GroupDirectory, limit: int) -> list[str]:
+    names, cursor = [], 0
+    while cursor is not None:
+        page, cursor, _ = directory.page(cursor, limit)
+        names += page
+    return names
+
+
+def test_pages_follow_insertion_order():
+    directory = GroupDirectory([f'g{i}' for i in range(10)])
+    first, cursor, version = directory.page(0, 4)
+    assert first == ['g0', 'g1', 'g2', 'g3'] and cursor == 4 and version == 10
+    assert read_all(directory, 4) == [f'g{i}' for i in range(10)]
+    assert directory.page(0, 10) == ([f'g{i}' for i in range(10)], None, 10)
+
+
+def test_removal_during_paging_does_not_shift_pages():
+    directory = GroupDirectory([f'g{i}' for i in range(10)])
+    first, cursor, _ = directory.page(0, 4)
+    directory.remove('g1')
+    directory.remove('g5')
+    second, cursor, version = directory.page(cursor, 4)
+    assert second == ['g4', 'g6', 'g7', 'g8']
+    assert version == 12
+    assert directory.page(cursor, 4)[0] == ['g9']
+
+
+def test_versions_and_readding():
+    directory = GroupDirectory()
+    assert directory.add('a') == 1
+    assert directory.add('b') == 2
+    assert directory.remove('missing') == 2
+    assert directory.remove('a') == 3
+    assert directory.add('a') == 4
+    assert 'a' in directory and len(directory) == 2
+    assert read_all(directory, 1) == ['b', 'a']
+
+
+def test_removed_entries_are_compacted():
+    directory = GroupDirectory([f'g{i}' for i in range(6)])
+    for name in ('g0', 'g1', 'g2'):
+        directory.remove(name)
+    assert len(directory.order) == 6
+    directory.remove('g3')
+    assert [name for _, name in directory.order] == ['g4', 'g5']
+    assert directory.removed == 0
+    assert read_all(directory, 1) == ['g4', 'g5']
+
+
+def test_trailing_removed_groups_end_paging():
+    directory = GroupDirectory(['a', 'b', 'c'])
+    directory.remove('c')
+    names, cursor, _ = directory.page(0, 2)
+    assert names == ['a', 'b'] and cursor == 2
+    assert directory.page(cursor, 2)[:2] == ([], None)
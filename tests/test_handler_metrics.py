@@ -0,0 +1,62 @@
+import pytest
+from handler_metrics import ActionStats, HandlerMetrics
+
+HUGE = (1 << 64) - 1 # plus grande durée en nanosecondes sur 64 bits
+
+
+def test_durations_land_in_power_of_two_buckets():
+    stats = ActionStats()
+    for elapsed_ns in (0, 500, 1500, 3000, 3999, 100_000, HUGE):
+        stats.record(elapsed_ns)
+    assert stats.calls == 7
+    assert stats.buckets[0] == 2  # < 1 µs, zéro compris
+    assert stats.buckets[1] == 1  # [1, 2[ µs
+    assert stats.buckets[2] == 2  # [2, 4[ µs
+    assert stats.buckets[7] == 1  # 100 µs : [64, 128[
+    assert stats.buckets[(HUGE // 1000).bit_length()] == 1
+    assert stats.max_ns == HUGE
+
+
+def test_percentiles_are_bucket_bounds_capped_by_the_maximum():
+    stats = ActionStats()
+    for _ in range(98):
+        stats.record(3000)
+    stats.record(100_000)
+    stats.record(150_000)
+    assert stats.percentile(0.5) == 4
+    assert stats.percentile(0.99) == 128
+    # la case du maximum va jusqu'à 256 µs, mais rien n'a dépassé 150 µs
+    assert stats.percentile(1.0) == 150.0
+
+    summary = stats.summary()
+    assert summary['calls'] == 100 and summary['errors'] == 0
+    assert summary['p50_us'] == 4 and summary['p99_us'] == 128 and summary['max_us'] == 150.0
+    assert summary['mean_us'] == pytest.approx((98 * 3 + 100 + 150) / 100, abs=0.1)
+
+
+def test_zero_and_empty():
+    stats = ActionStats()
+    assert stats.summary() == {'calls': 0, 'errors': 0, 'mean_us': 0.0, 'p50_us': 0,
+                               'p99_us': 0, 'max_us': 0.0, 'total_ms': 0.0}
+    stats.record(0)
+    assert stats.percentile(0.5) == 0.0
+    assert stats.percentile(0.99) == 0.0
+
+
+def test_huge_duration_is_reported_as_the_maximum():
+    stats = ActionStats()
+    stats.record(1000)
+    stats.record(HUGE)
+    assert stats.percentile(0.99) == round(HUGE / 1000, 1)
+
+
+def test_metrics_per_action_most_expensive_first():
+    for threads in (True, False):
+        metrics = HandlerMetrics(threads=threads)
+        assert metrics.stats('ping') is metrics.stats('ping')
+        metrics.stats('ping').record(1000)
+        metrics.stats('groupMessage').record(50_000)
+        metrics.stats('groupMessage').record_error()
+        summary = metrics.summary()
+        assert list(summary) == ['groupMessage', 'ping']
+        assert summary['groupMessage']['errors'] == 1
@@ -0,0 +1,75 @@
+from history_store import HistoryStore
+
+
+def plain(cipher):
+    return cipher.upper()
+
+
+def test_ring_keeps_only_the_last_messages():
+    history = HistoryStore(ring_size=5)
+    for i in range(3):
+        history.append('g', 'alice', f'old {i}', f'old {i}')
+    assert [content for _, _, content in history.recent('g', plain)] == ['OLD 0', 'OLD 1', 'OLD 2']
+    for i in range(10):
+        history.append('g', 'bob', f'new {i}', f'new {i}')
+    recent = history.recent('g', plain)
+    # anneau déjà ouvert : les messages arrivés ensuite y sont en clair, les plus anciens en sortent
+    assert [content for _, _, content in recent] == [f'new {i}' for i in range(5, 10)]
+    assert history.recent('h', plain) == []
+    history.close()
+
+
+def test_paging_goes_back_to_the_start_of_the_conversation(tmp_path):
+    path = str(tmp_path / 'history.db')
+    history = HistoryStore(path, ring_size=4)
+    ids = [history.append('g', 'alice', '', f'm{i}') for i in range(10)]
+    history.append('other', 'bob', '', 'ailleurs')
+    history.close()
+
+    # relu depuis le disque : les plus anciens, page par page, chacune dans l'ordre d'arrivée
+    history = HistoryStore(path, ring_size=4)
+    recent = history.recent('g', plain)
+    assert [content for _, _, content in recent] == ['M6', 'M7', 'M8', 'M9']
+    pages = []
+    before = recent[0][0]
+    while True:
+        page = history.page('g', before, 4, plain)
+        if not page:
+            break
+        pages.append([content for _, _, content in page])
+        before = page[0][0]
+    assert pages == [['M2', 'M3', 'M4', 'M5'], ['M0', 'M1']]
+    assert before == ids[0]
+    history.close()
+
+
+def test_unreadable_messages_are_kept_in_place():
+    history = HistoryStore()
+    history.append('g', 'alice', '', 'ok')
+    history.append('g', 'alice', '', 'bad')
+
+    def decrypt(cipher):
+        if cipher == 'bad':
+            raise ValueError()
+        return cipher
+
+    assert [content for _, _, content in history.recent('g', decrypt)] == ['ok', '[message illisible]']
+
+
+def test_seqs_and_group_keys_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'history.db')
+    history = HistoryStore(path)
+    history.append('g', 'alice', '', 'm', seq=7)
+    history.save_seqs({'h': 3})
+    history.save_group_key('g', 'owner', 'key-g')
+    history.save_group_key('h', 'other owner', 'key-h')
+    history.close()
+
+    history = HistoryStore(path)
+    assert history.last_seqs() == {'g': 7, 'h': 3}
+    assert history.group_keys('owner') == {'g': 'key-g'}
+    history.forget_seq('h')
+    history.forget_group_key('g')
+    assert history.last_seqs() == {'g': 7}
+    assert history.group_keys('owner') == {}
+    history.close()
@@ -0,0 +1,42 @@
+from joins import JoinTable
+from registry import Client
+
+
+def client(nickname: str) -> Client:
+    member = Client(None)
+    member.nickname = nickname
+    return member
+
+
+def test_requests_get_distinct_ids():
+    table = JoinTable()
+    alice, bob = client('alice'), client('bob')
+    first = table.add(alice, 'g')
+    second = table.add(bob, 'g')
+    third = table.add(alice, 'h')
+    assert len({first.id, second.id, third.id}) == 3
+    assert len(table) == 3
+    assert table.get(second.id) is second
+    assert table.get_by_requester('alice', 'h') is third
+
+
+def test_one_request_per_client_and_group():
+    table = JoinTable()
+    alice = client('alice')
+    pending = table.add(alice, 'g')
+    assert table.add(alice, 'g') is None
+    table.remove(pending)
+    assert table.get(pending.id) is None
+    again = table.add(alice, 'g')
+    assert again is not None and again.id != pending.id
+
+
+def test_removing_a_stale_request_keeps_the_current_one():
+    table = JoinTable()
+    alice = client('alice')
+    pending = table.add(alice, 'g')
+    table.remove(pending)
+    current = table.add(alice, 'g')
+    table.remove(pending)
+    assert table.get_by_requester('alice', 'g') is current
+    assert len(table) == 1
@@ -0,0 +1,138 @@
+import pytest
+import common_lib
+import serveur
+from common_lib import ClientAction, EntryForFormatedMessage, ErrorType, ServerAction
+from offline_store import OfflineStore
+from registry import Client, Group
+
+
+# socket d'un client : garde les trames que le serveur lui envoie
+class FakeSocket:
+    def __init__(self):
+        self.reader = common_lib.FrameReader()
+
+    def sendmsg(self, buffers) -> int:
+        data = b''.join(buffers)
+        buffer = self.reader.get_buffer(len(data))
+        buffer[:len(data)] = data
+        self.reader.buffer_updated(len(data))
+        return len(data)
+
+    def messages(self) -> list[dict]:
+        return [common_lib.decode_full_message(frame) for frame in self.reader.frames()]
+
+
+# les minuteries du serveur ne partent que quand le test le décide
+class Timers:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, delay: float, callback, *args):
+        self.calls.append((delay, callback, args))
+
+    def run(self, name: str) -> list[float]:
+        due = [call for call in self.calls if call[1].__name__ == name]
+        self.calls = [call for call in self.calls if call[1].__name__ != name]
+        for _, callback, args in due:
+            callback(*args)
+        return [delay for delay, _, _ in due]
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = serveur.server_socket(port=0, offline_store=OfflineStore(str(tmp_path / 'store')))
+    server.call_later = Timers()
+    group = server.groups['g'] = Group('g')
+    for nickname in ('slow', 'fast', 'dave'):
+        client = Client(FakeSocket())
+        client.nickname = nickname
+        client.public_key = ('10001', 'ab')
+        server.clients.add(client)
+        if nickname != 'dave':
+            group.add(client)
+            group.key_holders.add(client)
+    # le membre habituellement le plus rapide est sollicité en premier... et ne répond pas
+    server.clients.get('slow').key_latency = 0.01
+    server.clients.get('fast').key_latency = 0.2
+    yield server
+    server.offline_store.close()
+
+
+def key_requests(server, nickname: str) -> list:
+    messages = server.clients.get(nickname).socket.messages()
+    return [message[EntryForFormatedMessage.keyRequesters] for message in messages
+            if message.get(EntryForFormatedMessage.action) == ServerAction.requestKey]
+
+
+def share_key(server, nickname: str, entries: dict):
+    server.handle_message({
+        EntryForFormatedMessage.sender: nickname, EntryForFormatedMessage.target: "server",
+        EntryForFormatedMessage.action: ClientAction.shareGroupKey, EntryForFormatedMessage.groupName: 'g',
+        **entries
+    })
+
+
+def joins(server, nickname: str) -> list[str]:
+    return [message[EntryForFormatedMessage.groupKey] for message in server.clients.get(nickname).socket.messages()
+            if message.get(EntryForFormatedMessage.action) == ServerAction.joinGroup]
+
+
+def test_hedge_asks_a_second_holder_and_the_first_answer_wins(server):
+    server.join_group('dave', 'g')
+    server.call_later.run('flush_key_requests')
+    (requesters,) = key_requests(server, 'slow')
+    request_id = requesters[0][0]
+    assert requesters[0][1] == 'dave'
+    assert key_requests(server, 'fast') == []
+
+    # pas de réponse : second membre sollicité après le délai de couverture
+    assert server.call_later.run('hedge_join') == [server.HEDGE_MIN_DELAY]
+    server.call_later.run('flush_key_requests')
+    assert key_requests(server, 'fast')[0][0][0] == request_id
+
+    share_key(server, 'fast', {EntryForFormatedMessage.groupKeys: [(request_id, 'from-fast')]})
+    share_key(server, 'slow', {EntryForFormatedMessage.groupKeys: [(request_id, 'from-slow')]})
+    assert joins(server, 'dave') == ['from-fast']
+    dave = server.clients.get('dave')
+    assert dave in server.groups['g'] and dave in server.groups['g'].key_holders
+    assert len(server.joins) == 0
+    assert server.clients.get('slow').key_load == 0 and server.clients.get('fast').key_load == 0
+
+    # l'échéance de la demande servie ne relance rien
+    server.call_later.run('check_join')
+    assert key_requests(server, 'slow') == [] and key_requests(server, 'fast') == []
+
+
+def test_no_hedge_once_answered(server):
+    server.join_group('dave', 'g')
+    server.call_later.run('flush_key_requests')
+    request_id = key_requests(server, 'slow')[0][0][0]
+    share_key(server, 'slow', {EntryForFormatedMessage.groupKeys: [(request_id, 'from-slow')]})
+    server.call_later.run('hedge_join')
+    server.call_later.run('flush_key_requests')
+    assert key_requests(server, 'fast') == []
+    assert joins(server, 'dave') == ['from-slow']
+
+
+def test_holder_without_the_key_reroutes_the_join(server):
+    server.join_group('dave', 'g')
+    server.call_later.run('flush_key_requests')
+    request_id = key_requests(server, 'slow')[0][0][0]
+
+    share_key(server, 'slow', {EntryForFormatedMessage.groupKeys: [],
+                               EntryForFormatedMessage.errorType: ErrorType.groupKeyUnavailable})
+    assert server.clients.get('slow') not in server.groups['g'].key_holders
+    server.call_later.run('flush_key_requests')
+    assert key_requests(server, 'fast')[0][0][0] == request_id
+
+    share_key(server, 'fast', {EntryForFormatedMessage.groupKeys: [(request_id, 'from-fast')]})
+    assert joins(server, 'dave') == ['from-fast']
+
+
+def test_join_fails_without_any_holder(server):
+    server.groups['g'].key_holders.clear()
+    server.join_group('dave', 'g')
+    errors = [message[EntryForFormatedMessage.errorType] for message in server.clients.get('dave').socket.messages()
+              if message.get(EntryForFormatedMessage.action) == ServerAction.error]
+    assert errors == [ErrorType.emptyGroup]
+    assert len(server.joins) == 0
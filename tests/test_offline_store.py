@@ -0,0 +1,211 @@
+import gc
+import os
+import serveur
+from common_lib import EntryForFormatedMessage, ServerAction
+from offline_store import OfflineStore
+from registry import Client, Group
+from tests.test_key_holders import FakeSocket
+
+
+def make_store(tmp_path, **kwargs) -> OfflineStore:
+    return OfflineStore(str(tmp_path / 'store'), **kwargs)
+
+
+def test_append_numbers_messages_per_group(tmp_path):
+    store = make_store(tmp_path)
+    assert [store.append('a', b'1'), store.append('a', b'2'), store.append('b', b'3')] == [1, 2, 1]
+    assert store.last_seq('a') == 2
+    assert store.last_seq('inconnu') == 0
+    assert store.read('a', 1, 2) == [(1, b'1'), (2, b'2')]
+    store.close()
+
+
+def test_messages_survive_a_restart(tmp_path):
+    store = make_store(tmp_path, segment_size=64)
+    for i in range(20):
+        store.append('g', b'message %d' % i)
+    store.close()
+
+    store = make_store(tmp_path, segment_size=64)
+    assert store.last_seq('g') == 20
+    assert store.read('g', 19, 20) == [(19, b'message 18'), (20, b'message 19')]
+    assert store.append('g', b'suite') == 21
+    store.close()
+
+
+def test_torn_record_is_truncated_on_load(tmp_path):
+    store = make_store(tmp_path)
+    store.append('g', b'complet')
+    store.append('g', b'coupe')
+    store.flush()
+    path = store.logs['g'].segments[-1].path
+    store.close()
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) - 2)
+
+    store = make_store(tmp_path)
+    assert store.last_seq('g') == 1
+    assert store.append('g', b'apres') == 2
+    assert store.read('g', 1, 2) == [(1, b'complet'), (2, b'apres')]
+    store.close()
+
+
+def test_reader_pages_through_a_range(tmp_path):
+    store = make_store(tmp_path, segment_size=100)
+    for i in range(50):
+        store.append('g', bytes([i]))
+    pages = list(store.open_reader('g', 10, 45, page_size=16).pages())
+    assert [len(page) for page in pages] == [16, 16, 4]
+    assert [seq for page in pages for seq, _ in page] == list(range(10, 46))
+    assert not store.readers
+    store.close()
+
+
+def test_compact_keeps_what_members_still_need(tmp_path):
+    store = make_store(tmp_path, segment_size=100)
+    for i in range(50):
+        store.append('g', b'x' * 20)
+    store.flush()
+    store.compact('g', 30)
+    first = store.first_seq('g')
+    assert 1 < first <= 30
+    assert store.read('g', 30, 30)[0][0] == 30
+    store.close()
+
+
+def test_retention_drops_oldest_segments(tmp_path):
+    store = make_store(tmp_path, segment_size=100, max_group_bytes=500)
+    for i in range(100):
+        store.append('g', b'x' * 20)
+    store.flush()
+    assert store.logs['g'].size <= 500 + 100
+    assert store.first_seq('g') > 1
+    assert store.last_seq('g') == 100
+    store.close()
+
+
+def test_open_reader_pins_segments_against_retention(tmp_path):
+    store = make_store(tmp_path, segment_size=100, max_group_bytes=500)
+    for i in range(10):
+        store.append('g', b'%02d' % i + b'x' * 18)
+    reader = store.open_reader('g', 1)
+    for i in range(100):
+        store.append('g', b'x' * 20)
+    store.flush()
+
+    assert store.first_seq('g') == 1
+    replayed = [payload[:2] for page in reader.pages() for _, payload in page]
+    assert replayed == [b'%02d' % i for i in range(10)]
+
+    # lecteur fermé : la rétention reprend
+    store.append('g', b'x' * 20)
+    store.flush()
+    assert store.first_seq('g') > 1
+    store.close()
+
+
+def test_reader_starts_at_first_stored_seq(tmp_path):
+    store = make_store(tmp_path, segment_size=100, max_group_bytes=500)
+    for i in range(100):
+        store.append('g', b'x' * 20)
+    store.flush()
+    reader = store.open_reader('g', 1)
+    assert reader.seq == store.first_seq('g') > 1
+    reader.close()
+    store.close()
+
+
+def test_abandoned_reader_is_unpinned(tmp_path):
+    store = make_store(tmp_path)
+    store.append('g', b'x')
+    reader = store.open_reader('g', 1)
+    assert store.readers['g']
+    del reader
+    gc.collect()
+    assert not store.readers
+    store.close()
+
+
+def test_unwritten_messages_are_readable(tmp_path):
+    store = make_store(tmp_path)
+    with store.lock:
+        # le thread d'écriture attend : les messages restent en mémoire
+        for i in range(5):
+            store.append('g', bytes([i]))
+        assert store.logs['g'].pending
+    assert store.read('g', 2, 4) == [(2, b'\x01'), (3, b'\x02'), (4, b'\x03')]
+    store.close()
+    assert OfflineStore(str(tmp_path / 'store')).read('g', 1, 5)[-1] == (5, b'\x04')
+
+
+def test_directory_is_created_on_first_write(tmp_path):
+    store = make_store(tmp_path)
+    assert store.read('g', 1, 1) == []
+    assert not os.path.exists(tmp_path / 'store')
+    store.append('g', b'x')
+    store.flush()
+    assert os.path.isdir(tmp_path / 'store')
+    store.close()
+
+
+def test_reader_skips_messages_its_recipient_was_excluded_from(tmp_path):
+    store = make_store(tmp_path)
+    store.append('g', b'alice left', 'alice')
+    store.append('g', b'admin changed', 'alice')
+    store.append('g', b'hello')
+    store.append('g', b'alice offers a file', 'alice')
+    store.append('g', b'bye', 'bob')
+    store.close()
+
+    store = make_store(tmp_path) # relu depuis le disque
+    reader = store.open_reader('g', 1, recipient='alice')
+    # les premiers messages exclus sont sautés dès l'ouverture : la reprise annoncée les couvre
+    assert reader.seq == 3
+    assert [payload for page in reader.pages() for _, payload in page] == [b'hello', b'bye']
+    bob = [payload for page in store.open_reader('g', 1, recipient='bob').pages() for _, payload in page]
+    assert bob == [b'alice left', b'admin changed', b'hello', b'alice offers a file']
+    assert len(store.read('g', 1, 5)) == 5
+    store.close()
+
+
+def test_reader_skipping_everything_ends_after_the_range(tmp_path):
+    store = make_store(tmp_path)
+    with store.lock: # messages encore en attente d'écriture
+        store.append('g', b'a', 'alice')
+        store.append('g', b'b', 'alice')
+    reader = store.open_reader('g', 1, recipient='alice')
+    assert reader.seq == 3 > reader.until_seq
+    assert list(reader.pages()) == []
+    store.close()
+
+
+def test_server_creates_no_store_directory_until_a_message_is_kept(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = serveur.server_socket(port=0)
+    assert os.listdir(tmp_path) == []
+    server.offline_store.close()
+
+    server = serveur.server_socket(port=0, store_dir=str(tmp_path / 'messages'))
+    assert server.offline_store.directory == str(tmp_path / 'messages')
+    server.offline_store.close()
+
+
+def test_broadcast_records_the_ignored_member(tmp_path):
+    server = serveur.server_socket(port=0, store_dir=str(tmp_path / 'store'))
+    group = server.groups['g'] = Group('g')
+    for nickname in ('alice', 'bob'):
+        client = Client(FakeSocket())
+        client.nickname = nickname
+        server.clients.add(client)
+        group.add(client)
+    alice = server.clients.get('alice')
+    notice = {EntryForFormatedMessage.action: ServerAction.info, EntryForFormatedMessage.content: 'alice left group.'}
+    server.broadcast(notice, target='g', ignore=alice.socket)
+    server.broadcast({EntryForFormatedMessage.content: 'hello'}, sender='bob', target='g')
+
+    assert alice.socket.messages()[0][EntryForFormatedMessage.content] == 'hello'
+    assert [excluded for _, _, excluded in server.offline_store.scan('g', 1, 2)] == [b'alice', b'']
+    reader = server.offline_store.open_reader('g', 1, recipient='alice')
+    assert reader.seq == 2
+    reader.close()
+    server.offline_store.close()
@@ -0,0 +1,194 @@
+import threading
+import time
+import async_engine
+import outbound
+from outbound import OutboundLimits, OutboundState, QueuedSocket
+
+
+def limits(policy: str = outbound.POLICY_DROP, grace: float = 5.0) -> OutboundLimits:
+    return OutboundLimits(high_watermark=100, low_watermark=40, policy=policy, grace=grace)
+
+
+def test_pause_at_high_and_resume_at_low():
+    state = OutboundState(limits())
+    state.update(99)
+    assert not state.paused and state.admit()
+    state.update(100)
+    assert state.paused
+    state.update(41)
+    assert state.paused # hystérésis : pas encore sous low_watermark
+    state.update(40)
+    assert not state.paused
+    assert state.max_depth == 100
+
+
+def test_drops_are_counted_while_paused():
+    dropped = OutboundState.total_dropped
+    state = OutboundState(limits())
+    state.update(150)
+    assert not state.admit() and not state.admit()
+    assert state.dropped == 2
+    assert OutboundState.total_dropped == dropped + 2
+    assert not state.should_evict() # politique drop : jamais de déconnexion
+
+
+def test_eviction_only_after_the_grace_period():
+    state = OutboundState(limits(outbound.POLICY_DISCONNECT, grace=5.0))
+    state.update(150)
+    assert not state.should_evict()
+    state.paused_since -= 6
+    assert state.should_evict()
+    state.update(0)
+    assert not state.should_evict()
+
+
+
+# socket dont l'écriture reste bloquée tant que `gate` n'est pas ouverte (client qui ne lit pas)
+class SlowSocket:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.sent = []
+        self.closed = threading.Event()
+
+    def sendmsg(self, buffers) -> int:
+        self.gate.wait()
+        self.sent.append(b''.join(buffers))
+        return sum(len(buffer) for buffer in buffers)
+
+    def sendall(self, data: bytes) -> None:
+        self.sendmsg((data,))
+
+    def shutdown(self, how) -> None:
+        self.gate.set()
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+def test_queued_socket_drops_then_evicts_a_slow_client():
+    sckt = SlowSocket()
+    queued = QueuedSocket(sckt, limits(outbound.POLICY_DISCONNECT, grace=5.0))
+    evicted = OutboundState.total_evicted
+    for _ in range(4):
+        queued.sendmsg((b'x' * 30,)) # la première est prise par le thread d'écriture, bloqué
+    assert queued.outbound.paused
+    queued.sendmsg((b'y' * 30,))
+    assert queued.outbound.dropped == 1
+
+    queued.outbound.paused_since -= 6
+    queued.sendmsg((b'z',))
+    assert queued.closing and OutboundState.total_evicted == evicted + 1
+    assert sckt.closed.wait(2)
+    assert b'y' * 30 not in sckt.sent and b'z' not in sckt.sent
+
+
+def test_queued_socket_sends_frames_behind_a_stream_in_order():
+    sckt = SlowSocket()
+    queued = QueuedSocket(sckt, limits())
+    queued.sendmsg((b'a',))
+    queued.send_stream(iter([(b's1',), (b's2',)]))
+    queued.sendmsg((b'b',))
+    assert queued.outbound.depth == 2 # le flux ne compte pas dans la file
+    sckt.gate.set()
+    deadline = time.monotonic() + 2
+    while queued.outbound.depth and time.monotonic() < deadline:
+        time.sleep(0.001)
+    queued.close()
+    assert sckt.closed.wait(2)
+    assert sckt.sent == [b'a', b's1', b's2', b'b']
+
+
+
+# transport asyncio dont le tampon d'écriture ne se vide que quand le test le décide
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.size = 0
+        self.closing = False
+        self.aborted = False
+
+    def set_write_buffer_limits(self, high: int, low: int) -> None:
+        self.limits = (high, low)
+
+    def writelines(self, buffers) -> None:
+        data = b''.join(buffers)
+        self.written.append(data)
+        self.size += len(data)
+
+    def get_write_buffer_size(self) -> int:
+        return self.size
+
+    def is_closing(self) -> bool:
+        return self.closing
+
+    def close(self) -> None:
+        self.closing = True
+
+    def abort(self) -> None:
+        self.closing = self.aborted = True
+
+
+def test_async_connection_follows_the_transport_buffer():
+    transport = FakeTransport()
+    connection = async_engine.AsyncConnection(transport, limits())
+    assert transport.limits == (100, 40)
+    connection.sendmsg((b'x' * 60,))
+    connection.sendmsg((b'x' * 60,))
+    assert connection.outbound.paused
+    connection.sendmsg((b'dropped',))
+    assert connection.outbound.dropped == 1 and len(transport.written) == 2
+
+    transport.size = 0 # le client a tout lu
+    connection.pump()
+    assert not connection.outbound.paused
+    connection.sendmsg((b'again',))
+    assert transport.written[-1] == b'again'
+
+
+def test_async_connection_evicts_after_the_grace_period():
+    transport = FakeTransport()
+    connection = async_engine.AsyncConnection(transport, limits(outbound.POLICY_DISCONNECT))
+    connection.sendmsg((b'x' * 150,))
+    connection.sendmsg((b'y',))
+    assert not transport.aborted
+    connection.outbound.paused_since -= 6
+    connection.sendmsg((b'z',))
+    assert transport.aborted
+
+
+def test_async_connection_keeps_frames_behind_a_stream():
+    transport = FakeTransport()
+    connection = async_engine.AsyncConnection(transport, limits())
+    connection.writing_paused = True # tampon plein : pause_writing() appelé par la boucle
+    connection.send_stream(iter([(b's1',), (b's2',)]))
+    connection.sendmsg((b'live',))
+    connection.send_stream(iter([(b't1',)]))
+    connection.sendmsg((b'last',))
+    assert transport.written == []
+    assert connection.pending_bytes == 8 and connection.outbound.depth == 8
+
+    connection.writing_paused = False # resume_writing()
+    connection.pump()
+    assert transport.written == [b's1', b's2', b'live', b't1', b'last']
+    assert connection.stream is None and not connection.pending and connection.pending_bytes == 0
+
+
+def test_dropped_streams_are_closed():
+    closed = []
+
+    def frames(name):
+        try:
+            yield (name,)
+            yield (name,)
+        finally:
+            closed.append(name)
+
+    connection = async_engine.AsyncConnection(FakeTransport(), limits())
+    connection.writing_paused = True
+    first = frames(b'a')
+    connection.send_stream(first)
+    next(first) # flux entamé
+    connection.send_stream(frames(b'b'))
+    connection.drop_streams()
+    assert closed == [b'a']
+    assert connection.stream is None and not connection.pending
@@ -0,0 +1,45 @@
+import pytest
+from ratelimit import RateLimits, RateState, TokenBucket
+
+
+def test_burst_then_delay():
+    bucket = TokenBucket(10, 2)
+    bucket.last = 0.0
+    for _ in range(20):
+        assert bucket.charge(1, 0.0) == 0.0
+    assert bucket.charge(1, 0.0) == pytest.approx(0.1)
+    assert bucket.charge(4, 0.0) == pytest.approx(0.5)
+
+
+def test_refill_is_capped_at_the_burst():
+    bucket = TokenBucket(10, 2)
+    bucket.last = 0.0
+    bucket.charge(20, 0.0)
+    assert bucket.charge(5, 0.5) == 0.0
+    assert bucket.tokens == pytest.approx(0.0)
+    bucket.charge(0, 100.0)
+    assert bucket.tokens == pytest.approx(20)
+
+
+def test_zero_rate_is_unlimited():
+    bucket = TokenBucket(0, 2)
+    assert bucket.charge(1e9, 0.0) == 0.0
+
+
+def test_state_takes_the_longest_delay_and_counts_it():
+    state = RateState(100, 1000, 1)
+    state.messages.last = state.bytes.last = 0.0
+    throttled, delay = RateState.total_throttled, RateState.total_delay
+    assert state.charge(500, 0.0) == 0.0
+    assert state.charge(1000, 0.0) == pytest.approx(0.5)
+    assert state.throttled == 1 and state.delay == pytest.approx(0.5)
+    assert RateState.total_throttled == throttled + 1
+    assert RateState.total_delay == pytest.approx(delay + 0.5)
+
+
+def test_limits_build_client_and_group_states():
+    limits = RateLimits(client_messages=5, client_bytes=0, group_messages=50, burst=1)
+    client = limits.client_state()
+    assert client.messages.capacity == 5
+    assert client.charge(1 << 30, client.bytes.last) == 0.0
+    assert limits.group_state().messages.rate == 50
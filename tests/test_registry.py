@@ -0,0 +1,62 @@
+from registry import Client, ClientRegistry, Group
+
+
+def assert_indexed(clients: ClientRegistry, *members: Client):
+    assert clients.by_id == {client.id: client for client in members}
+    assert clients.by_nickname == {client.nickname: client for client in members}
+    assert clients.by_socket == {client.socket: client for client in members if client.socket is not None}
+
+
+def test_nickname_and_socket_changes_leave_no_stale_entry():
+    clients = ClientRegistry()
+    alice, bob = Client('socket-a'), Client('socket-b')
+    clients.add(alice)
+    clients.add(bob)
+    temporary = alice.nickname
+
+    clients.update_data(alice, nickname='alice', public_key=('3', 'ab'))
+    assert clients.get(temporary) is None and clients.get('alice') is alice
+    assert alice.public_key == ('3', 'ab')
+
+    clients.update_data(alice, socket='socket-a2')
+    assert clients.get_by_socket('socket-a') is None and clients.get_by_socket('socket-a2') is alice
+    assert_indexed(clients, alice, bob)
+
+    clients.remove(alice)
+    assert clients.get('alice') is None and clients.get_by_id(alice.id) is None
+    assert clients.get_by_socket('socket-a2') is None
+    assert_indexed(clients, bob)
+    assert list(clients) == [bob] and len(clients) == 1
+
+
+def test_stale_client_does_not_remove_the_one_that_took_its_place():
+    clients = ClientRegistry()
+    old, new = Client('socket'), Client('socket')
+    old.nickname = new.nickname = 'alice'
+    clients.add(old)
+    clients.add(new) # reconnexion : même pseudo, même socket repris
+    clients.remove(old)
+    assert clients.get('alice') is new and clients.get_by_socket('socket') is new
+
+    # renommer l'ancien ne doit pas non plus effacer l'entrée du nouveau
+    clients.update_data(old, nickname='old')
+    assert clients.get('alice') is new
+
+
+def test_bulk_add_skips_clients_without_socket():
+    clients = ClientRegistry()
+    offline = Client(None)
+    clients.add_all([offline, Client('socket')])
+    assert None not in clients.by_socket
+    assert clients.get(offline.nickname) is offline
+
+
+def test_group_keeps_the_client_index_in_sync():
+    alice, bob = Client(None), Client(None)
+    group = Group('g', [alice])
+    group.add(bob)
+    assert group.admin is alice and alice.groups == bob.groups == {'g'}
+    group.rotate_admin()
+    assert list(group) == [bob, alice]
+    group.remove(alice)
+    assert alice.groups == set() and alice not in group
@@ -0,0 +1,47 @@
+import os
+import pytest
+import rsa
+
+
+@pytest.fixture(scope='module')
+def keypair():
+    return rsa.gen_rsa_keypair(1024)
+
+
+def test_crt_matches_plain_exponentiation(keypair):
+    (e, n), private_key = keypair
+    for c in (0, 1, 2, n - 1, int.from_bytes(os.urandom(100), 'big') % n):
+        assert rsa.rsa_exp_crt(c, private_key) == pow(c, private_key.d, n)
+
+
+def test_private_key_is_still_a_d_n_tuple(keypair):
+    (e, n), private_key = keypair
+    d, n2 = private_key[:2]
+    assert (d, n2) == (private_key.d, n)
+    assert d * e % ((private_key.p - 1) * (private_key.q - 1)) == 1
+    assert rsa.RsaPrivateKey.from_primes(private_key.p, private_key.q, e) == private_key
+
+
+def test_group_key_round_trip(keypair):
+    (e, n), private_key = keypair
+    group_key = os.urandom(32)
+    cipher = rsa.rsa_enc(group_key, e, n)
+    assert rsa.rsa_dec_crt(cipher, private_key) == group_key.lstrip(b'\0')
+    # ancien appel : (d, n) pris dans la clé privée comme dans l'ancien tuple
+    assert rsa.rsa_dec(cipher, private_key[0], private_key[1]) == group_key.lstrip(b'\0')
+    with pytest.raises(ValueError):
+        rsa.rsa_enc(n.to_bytes(128, 'big'), e, n)
+
+
+def test_signature(keypair):
+    (e, n), private_key = keypair
+    signature = rsa.rsa_sign(b'message', private_key)
+    assert rsa.rsa_verify(b'message', signature, e, n)
+    assert not rsa.rsa_verify(b'autre message', signature, e, n)
+
+
+def test_hex_helpers(keypair):
+    public_key, _ = keypair
+    hex_key = rsa.int_rsa_key_to_hex(public_key)
+    assert hex_key == (hex(public_key[0])[2:], hex(public_key[1])[2:])
+    assert rsa.hex_rsa_key_to_int(hex_key) == public_key
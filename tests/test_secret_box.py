@@ -0,0 +1,37 @@
+import pytest
+import secret_box
+
+
+def test_round_trips():
+    box, key = secret_box.secret_box_gen()
+    assert secret_box.secret_box_gen_by_key(key) is secret_box.secret_box_gen_by_key(key)
+    assert secret_box.decrypt(box, secret_box.encrypt(box, "héllo")) == "héllo"
+    assert secret_box.decrypt_raw(box, secret_box.encrypt_raw(box, "")) == ""
+    cipher = secret_box.encrypt_bytes(box, b'\x00\xff' * 100)
+    assert len(cipher) == 200 + secret_box.OVERHEAD
+    assert secret_box.decrypt_bytes(box, memoryview(cipher)) == b'\x00\xff' * 100
+
+
+def test_encrypt_into_writes_at_offset():
+    box, _ = secret_box.secret_box_gen()
+    out = bytearray(b'head' + bytes(5 + secret_box.OVERHEAD) + b'tail')
+    size = secret_box.encrypt_into(box, b'hello', out, 4)
+    assert size == 5 + secret_box.OVERHEAD
+    assert out[:4] == b'head' and out[-4:] == b'tail'
+    assert secret_box.decrypt_bytes(box, bytes(out[4:4 + size])) == b'hello'
+
+
+def test_encrypt_into_refuses_a_short_buffer():
+    box, _ = secret_box.secret_box_gen()
+    with pytest.raises(ValueError):
+        secret_box.encrypt_into(box, b'hello', bytearray(secret_box.OVERHEAD + 4))
+
+
+def test_batch_gives_none_for_unreadable_messages():
+    box, _ = secret_box.secret_box_gen()
+    other, _ = secret_box.secret_box_gen()
+    parts = secret_box.encrypt_many(box, [b'a', b'', b'ccc'])
+    tampered = bytearray(parts[2])
+    tampered[-1] ^= 1
+    ciphers = [parts[0], parts[1], bytes(tampered), secret_box.encrypt_bytes(other, b'x'), b'short']
+    assert secret_box.decrypt_many(box, ciphers) == [b'a', b'', None, None, None]
@@ -0,0 +1,60 @@
+from sequences import GroupSequences
+
+
+def test_duplicates_are_rejected():
+    sequences = GroupSequences({'g': 5})
+    assert not sequences.accept('g', 4)
+    assert not sequences.accept('g', 5)
+    assert sequences.accept('g', 6)
+    assert not sequences.accept('g', 6)
+    assert sequences.get('g') == 6
+
+
+def test_first_message_of_an_unknown_group_is_the_start():
+    sequences = GroupSequences()
+    assert sequences.accept('g', 42)
+    assert sequences.get('g') == 42
+    assert sequences.take_changes() == {'g': 42}
+
+
+def test_gap_holds_the_ack_until_filled():
+    sequences = GroupSequences({'g': 1})
+    assert sequences.accept('g', 3)
+    assert sequences.accept('g', 4)
+    assert not sequences.accept('g', 4)
+    assert sequences.get('g') == 1
+    assert sequences.accept('g', 2)
+    assert sequences.get('g') == 4
+    assert sequences.ahead['g'] == set()
+
+
+def test_gap_is_given_up_past_max_ahead():
+    sequences = GroupSequences({'g': 0}, max_ahead=3)
+    for seq in (2, 3, 4):
+        sequences.accept('g', seq)
+    assert sequences.get('g') == 0
+    sequences.accept('g', 6)
+    assert sequences.get('g') == 4
+    assert sequences.ahead['g'] == {6}
+
+
+def test_reset_and_forget():
+    sequences = GroupSequences({'g': 10, 'h': 3})
+    sequences.accept('g', 12)
+    sequences.reset('g', 20)
+    assert sequences.get('g') == 20 and 'g' not in sequences.ahead
+    assert not sequences.accept('g', 12)
+    sequences.forget('h')
+    assert sequences.get('h') is None
+    assert sequences.snapshot() == {'g': 20}
+
+
+def test_changes_are_taken_once():
+    sequences = GroupSequences({'g': 1, 'h': 1})
+    sequences.accept('g', 2)
+    sequences.accept('h', 3) # trou : pas d'accusé à envoyer
+    assert sequences.take_changes() == {'g': 2}
+    assert sequences.take_changes() == {}
+    sequences.accept('h', 2)
+    sequences.forget('g')
+    assert sequences.take_changes() == {'h': 3}
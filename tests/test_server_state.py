@@ -0,0 +1,116 @@
+import os
+import pytest
+import server_state
+from server_state import ServerState
+from registry import ClientRegistry
+
+
+def restore(directory) -> tuple[ClientRegistry, dict, int]:
+    clients, groups = ClientRegistry(), {}
+    state = ServerState(str(directory))
+    version = state.restore(clients, groups)
+    state.close()
+    return clients, groups, version
+
+
+def members(groups: dict, name: str) -> list[str]:
+    return [client.nickname for client in groups[name]]
+
+
+def test_first_start_has_nothing_to_restore(tmp_path):
+    state = ServerState(str(tmp_path))
+    assert state.restore(ClientRegistry(), {}) is None
+    assert os.path.exists(state.wal_path(0))
+    state.close()
+
+
+def test_wal_replay(tmp_path):
+    state = ServerState(str(tmp_path))
+    state.restore(ClientRegistry(), {})
+    for nickname in ('alice', 'bob', 'carol'):
+        state.log(server_state.OP_REGISTER, nickname, '10001', 'ab' * 8)
+    state.log(server_state.OP_GROUP_ADD, 'g', 'alice')
+    state.log(server_state.OP_MEMBER_ADD, 'g', 'bob')
+    state.log(server_state.OP_MEMBER_ADD, 'g', 'carol')
+    state.log(server_state.OP_MEMBER_TO_END, 'g', 'alice')
+    state.log(server_state.OP_GROUP_ADD, 'h', 'bob')
+    state.log(server_state.OP_GROUP_REMOVE, 'h')
+    state.log(server_state.OP_MISSED, 'carol', 'g', '7')
+    state.log(server_state.OP_ACKED, 'bob', 'g', '12')
+    state.log(server_state.OP_ACKED, 'bob', 'g', '9') # plus ancien : ignoré
+    state.log(server_state.OP_REGISTER, 'carol', '3', 'cd')
+    state.close()
+
+    clients, groups, version = restore(tmp_path)
+    assert version == 3
+    assert list(groups) == ['g']
+    assert members(groups, 'g') == ['bob', 'carol', 'alice']
+    assert clients.get('alice').public_key == ('10001', 'ab' * 8)
+    assert clients.get('carol').public_key == ('3', 'cd')
+    assert clients.get('carol').missed_since == {'g': 7}
+    assert clients.get('bob').acked == {'g': 12}
+    assert not clients.get('bob').connected
+
+
+def test_snapshot_then_wal(tmp_path):
+    clients, groups = ClientRegistry(), {}
+    state = ServerState(str(tmp_path))
+    state.restore(clients, groups)
+    for nickname, key in (('alice', ('10001', 'abc')), ('bob', ('3', 'not hex')), ('élodie', ('10001', '0f' * 4))):
+        server_state.apply_record(server_state.OP_REGISTER, [nickname, *key], clients, groups)
+    server_state.apply_record(server_state.OP_GROUP_ADD, ['g', 'bob'], clients, groups)
+    server_state.apply_record(server_state.OP_MEMBER_ADD, ['g', 'élodie'], clients, groups)
+    server_state.apply_record(server_state.OP_MEMBER_ADD, ['g', 'alice'], clients, groups)
+    clients.get('alice').acked['g'] = 40
+    clients.get('élodie').missed_since['g'] = 35
+    assert state.snapshot(clients, groups, 5, wait=True)
+    assert state.generation == 1
+    assert not os.path.exists(state.wal_path(0))
+
+    # journalisé après l'instantané
+    state.log(server_state.OP_MEMBER_REMOVE, 'g', 'bob')
+    state.log(server_state.OP_ACKED, 'alice', 'g', '41')
+    state.log(server_state.OP_MISSED_CLEAR, 'élodie')
+    state.close()
+
+    restored, groups, version = restore(tmp_path)
+    assert version == 5
+    assert members(groups, 'g') == ['élodie', 'alice']
+    assert restored.get('alice').public_key == ('10001', 'abc')
+    assert restored.get('bob').public_key == ('3', 'not hex')
+    assert restored.get('élodie').public_key == ('10001', '0f' * 4)
+    assert restored.get('alice').acked == {'g': 41}
+    assert restored.get('élodie').missed_since == {}
+
+
+def test_corrupted_snapshot_is_refused(tmp_path):
+    clients, groups = ClientRegistry(), {}
+    state = ServerState(str(tmp_path))
+    state.restore(clients, groups)
+    server_state.apply_record(server_state.OP_REGISTER, ['alice', '10001', 'ab'], clients, groups)
+    state.snapshot(clients, groups, 1, wait=True)
+    state.close()
+
+    with open(state.snapshot_path, 'r+b') as file:
+        file.seek(server_state.SNAPSHOT_HEADER.size + 2)
+        byte = file.read(1)
+        file.seek(-1, os.SEEK_CUR)
+        file.write(bytes([byte[0] ^ 0xff]))
+    with pytest.raises(ValueError):
+        ServerState(str(tmp_path)).restore(ClientRegistry(), {})
+
+
+def test_torn_wal_tail_is_truncated(tmp_path):
+    state = ServerState(str(tmp_path))
+    state.restore(ClientRegistry(), {})
+    state.log(server_state.OP_REGISTER, 'alice', '10001', 'ab')
+    state.log(server_state.OP_REGISTER, 'bob', '10001', 'cd')
+    state.close()
+    path = state.wal_path(0)
+    complete = os.path.getsize(path)
+    with open(path, 'ab') as file:
+        file.write(server_state.WAL_RECORD.pack(server_state.OP_REGISTER, 100) + b'\x00\x00')
+
+    clients, _, _ = restore(tmp_path)
+    assert [client.nickname for client in clients] == ['alice', 'bob']
+    assert os.path.getsize(path) == complete
@@ -0,0 +1,58 @@
+from timer_wheel import TimerWheel
+
+
+def run(wheel: TimerWheel, ticks: int) -> int:
+    return wheel.advance(wheel.origin + ticks * wheel.tick)
+
+
+def test_fires_on_its_tick():
+    wheel = TimerWheel(tick=0.1, slots=8, levels=2)
+    fired = []
+    wheel.schedule(0.25, fired.append, 'a') # arrondi à 3 ticks
+    wheel.schedule(0, fired.append, 'b')    # au moins un tick
+    assert run(wheel, 1) == 1 and fired == ['b']
+    assert run(wheel, 2) == 0
+    assert run(wheel, 3) == 1 and fired == ['b', 'a']
+    assert len(wheel) == 0
+
+
+def test_cancelled_timer_is_skipped_but_counted_until_its_slot():
+    wheel = TimerWheel(tick=1, slots=8, levels=2)
+    fired = []
+    timer = wheel.schedule(2, fired.append, 'x')
+    timer.cancel()
+    assert len(wheel) == 1
+    assert run(wheel, 2) == 0
+    assert fired == [] and len(wheel) == 0
+
+
+def test_cascade_from_higher_levels():
+    wheel = TimerWheel(tick=1, slots=4, levels=3)
+    fired = []
+    for delay in (3, 4, 7, 9, 17, 40):
+        wheel.schedule(delay, fired.append, delay)
+    for tick in range(1, 41):
+        run(wheel, tick)
+        assert fired == [delay for delay in (3, 4, 7, 9, 17, 40) if delay <= tick]
+    assert len(wheel) == 0
+
+
+def test_schedule_from_a_later_tick():
+    wheel = TimerWheel(tick=1, slots=4, levels=3)
+    fired = []
+    run(wheel, 6)
+    wheel.schedule(11, fired.append, 'late')
+    run(wheel, 16)
+    assert fired == []
+    run(wheel, 17)
+    assert fired == ['late']
+
+
+def test_delay_beyond_the_span_is_clamped():
+    wheel = TimerWheel(tick=1, slots=4, levels=2)
+    fired = []
+    wheel.schedule(1000, fired.append, 'far')
+    run(wheel, wheel.span - 2)
+    assert fired == []
+    run(wheel, wheel.span - 1)
+    assert fired == ['far']
@@ -0,0 +1,76 @@
+import pytest
+
+tkinter = pytest.importorskip("tkinter") # client.py importe tkinter, sans ouvrir de fenêtre ici
+from client import UiDispatcher
+
+
+# remplace la fenêtre : note les appels reçus du dispatcher
+class FakeUi:
+    def __init__(self):
+        self.calls = []
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+    def on_messages(self, messages):
+        self.calls.append(('on_messages', [args[-1] for args in messages]))
+
+    def __getattr__(self, event):
+        return lambda *args: self.calls.append((event, *args))
+
+
+def test_consecutive_messages_are_rendered_together():
+    ui = FakeUi()
+    dispatcher = UiDispatcher(ui)
+    for text in ('a', 'b', 'c'):
+        dispatcher.post('on_message', 'g', None, 'alice', text)
+    dispatcher.post('on_group_joined', 'h')
+    dispatcher.post('on_message', 'g', None, 'bob', 'd')
+
+    assert dispatcher.run_batch()
+    assert ui.calls == [('on_messages', ['a', 'b', 'c']), ('on_group_joined', 'h'), ('on_messages', ['d'])]
+
+
+def test_repeated_refreshes_run_once_at_the_end_of_the_batch():
+    ui = FakeUi()
+    dispatcher = UiDispatcher(ui)
+    for _ in range(5):
+        dispatcher.post('on_groups_updated')
+        dispatcher.post('on_own_message')
+    dispatcher.post('on_logged_in', 'alice')
+
+    dispatcher.run_batch()
+    assert ui.calls == [('on_logged_in', 'alice'), ('on_groups_updated',), ('on_own_message',)]
+
+
+def test_batch_stops_at_its_time_budget():
+    ui = FakeUi()
+    dispatcher = UiDispatcher(ui)
+    dispatcher.BUDGET = 0
+    dispatcher.post('on_logged_in', 'alice')
+    dispatcher.run_batch()
+    assert ui.calls == [] and len(dispatcher.events) == 1
+
+
+def test_drain_reschedules_until_disconnected():
+    ui = FakeUi()
+    dispatcher = UiDispatcher(ui)
+    dispatcher.post('on_message', 'g', None, 'alice', 'a')
+    dispatcher.drain()
+    assert ui.scheduled == [dispatcher.drain]
+
+    dispatcher.post('on_disconnected')
+    dispatcher.post('on_logged_in', 'bob')
+    dispatcher.drain()
+    assert ui.scheduled == [dispatcher.drain]
+    assert ui.calls[-1] == ('on_disconnected',)
+
+
+def test_display_error_does_not_stop_the_queue():
+    ui = FakeUi()
+    ui.on_group_left = lambda name: 1 / 0
+    dispatcher = UiDispatcher(ui)
+    dispatcher.post('on_group_left', 'g')
+    dispatcher.drain()
+    assert ui.scheduled == [dispatcher.drain]
@@ -0,0 +1,100 @@
+import math
+import time
+
+
+class Timer:
+    __slots__ = ('expires', 'callback', 'args', 'cancelled')
+
+    def __init__(self, expires: int, callback, args: tuple):
+        self.expires = expires # en nombre de ticks
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+    # annulation paresseuse : le minuteur reste dans son emplacement et sera ignoré
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+
+# Roue de minuteurs hiérarchique : `levels` roues de `slots` emplacements.
+# Le niveau 0 couvre les `slots` prochains ticks, le niveau 1 les `slots` blocs de `slots` ticks suivants, etc.
+# Ajouter ou annuler un minuteur est en O(1) ; à chaque tick on ne parcourt que l'emplacement courant,
+# et de temps en temps un emplacement d'un niveau supérieur redescendu d'un cran : le coût ne dépend
+# pas du nombre de minuteurs en attente (100 000 connexions ne coûtent pas plus cher que 10).
+# Pas de verrou : à utiliser depuis un seul thread, ou sous le verrou de l'appelant.
+class TimerWheel:
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.blocks = [slots ** level for level in range(levels + 1)] # ticks couverts par un emplacement de chaque niveau
+        self.span = self.blocks[levels] # au-delà, l'échéance est ramenée au bout de la roue
+        self.origin = time.monotonic()
+        self.current = 0 # ticks déjà traités
+        self.count = 0   # minuteurs en attente, annulés compris
+
+
+    def __len__(self) -> int:
+        return self.count
+
+
+    # appelle callback(*args) dans delay secondes (arrondi au tick supérieur), lors d'un appel à advance()
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        ticks = math.ceil(delay / self.tick)
+        if ticks < 1:
+            ticks = 1
+        elif ticks >= self.span:
+            ticks = self.span - 1
+        timer = Timer(self.current + ticks, callback, args)
+        self.count += 1
+        if ticks < self.slots: # cas le plus courant : directement dans la roue du niveau 0
+            self.wheels[0][timer.expires % self.slots].append(timer)
+        else:
+            self.insert(timer)
+        return timer
+
+
+    def insert(self, timer: Timer) -> None:
+        delta = timer.expires - self.current
+        if delta < self.slots:
+            self.wheels[0][timer.expires % self.slots].append(timer)
+            return
+        level = 1
+        while level < self.levels - 1 and delta >= self.blocks[level + 1]:
+            level += 1
+        self.wheels[level][(timer.expires // self.blocks[level]) % self.slots].append(timer)
+
+
+    # fait avancer la roue jusqu'à l'instant `now` (time.monotonic) et déclenche les minuteurs échus
+    def advance(self, now: float = None) -> int:
+        if now is None:
+            now = time.monotonic()
+        target = int((now - self.origin) / self.tick)
+        fired = 0
+        while self.current < target:
+            self.current += 1
+
+            # début d'un bloc d'un niveau supérieur : ses minuteurs redescendent vers les niveaux inférieurs
+            for level in range(self.levels - 1, 0, -1):
+                block = self.blocks[level]
+                if self.current % block == 0:
+                    wheel = self.wheels[level]
+                    index = (self.current // block) % self.slots
+                    timers, wheel[index] = wheel[index], []
+                    for timer in timers:
+                        self.insert(timer)
+
+            wheel = self.wheels[0]
+            index = self.current % self.slots
+            if not wheel[index]:
+                continue
+            timers, wheel[index] = wheel[index], []
+            self.count -= len(timers)
+            for timer in timers:
+                if not timer.cancelled:
+                    fired += 1
+                    timer.callback(*timer.args)
+        return fired